@@ -0,0 +1,82 @@
+"""
+Micro-benchmark of FacaCalc.addImagesByChunkName against a simulated chunk.
+
+Compares the previous implementation (one addPhotos call per survey followed by
+a scan over all cameras of the chunk) with the current one.
+Runs offline against the simulated backend (faca_sim).
+
+Usage (from the FACA directory):
+    py .\\benchmarks\\bench_add_images.py --cameras 50000 --surveys 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import TimedAddPhotos, getFacaCalc
+from faca_calc import FacaCalc
+import faca_sim
+
+
+def legacyAddImagesByChunkName(f: FacaCalc, chunk, imagesDict: dict) -> None:
+    # FacaCalc.addImagesByChunkName before it was made linear.
+    for chunkName, images in imagesDict.items():
+        cameraGroup = f.addLabeledCameraGroup(chunk, chunkName)
+        chunk.addPhotos(images, load_xmp_accuracy=False)
+        for camera in chunk.cameras:
+            if not camera.group:
+                camera.group = cameraGroup
+
+
+def getImagesDict(cameras: int, surveys: int) -> dict[str, list[str]]:
+    perSurvey = cameras // surveys
+    return {
+        f"survey_{s}": [
+            os.path.join("images", f"survey_{s}", f"IMG_{i:05d}.JPG")
+            for i in range(perSurvey)
+        ]
+        for s in range(surveys)
+    }
+
+
+def timeIt(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main(cameras: int, surveys: int) -> None:
+    with tempfile.TemporaryDirectory() as outDir:
+        f = getFacaCalc(outDir)
+        imagesDict = getImagesDict(cameras, surveys)
+
+        legacyChunk = faca_sim.Document().addChunk()
+        legacyAddPhotos = TimedAddPhotos(legacyChunk)
+        legacyTime = timeIt(legacyAddImagesByChunkName, f, legacyChunk, imagesDict)
+        chunk = faca_sim.Document().addChunk()
+        addPhotos = TimedAddPhotos(chunk)
+        currentTime = timeIt(f.addImagesByChunkName, chunk, imagesDict)
+
+        # both implementations must produce the same grouping
+        for legacyCamera, camera in zip(legacyChunk.cameras, chunk.cameras):
+            assert legacyCamera.group.label == camera.group.label
+
+    # only FACA's own overhead, without the time spent in the simulated addPhotos
+    legacyTime -= legacyAddPhotos.seconds
+    currentTime -= addPhotos.seconds
+    print(f"{len(chunk.cameras)} cameras in {surveys} surveys")
+    print(f"legacy:  {legacyTime:8.3f} s ({legacyAddPhotos.calls} addPhotos calls)")
+    print(f"current: {currentTime:8.3f} s ({addPhotos.calls} addPhotos calls)")
+    print(f"speed-up: {legacyTime / currentTime:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cameras", type=int, default=50000)
+    parser.add_argument("--surveys", type=int, default=8)
+    args = parser.parse_args()
+    main(args.cameras, args.surveys)
@@ -0,0 +1,296 @@
+"""
+Benchmarks of FACA's own orchestration code at increasing scale.
+
+Runs offline against the simulated backend (faca_sim), so the times are
+FACA's Python overhead plus the (small) cost of the simulation. Every
+benchmark runs --repeat times, the fastest run counts.
+
+    discovery        FacaCalc.getImagesByChunkName on an empty image tree (cold cache)
+    discoveryCached  the same again with cached directory listings
+    grouping         FacaCalc.addImagesByChunkName, without the time spent in addPhotos
+    accuracy         FacaCalc.setImageAccuracy
+    cloneAndPrune    FacaCalc.CloneChunkNewLabels + removeCameraGroupsUnequalChunkName
+    uiCounts         FacaUi._get_subdir_and_image_counts (cold cache)
+    iniParsing       FacaMain.getSettingsFromIniSection for every section of faca.ini
+
+Results are written to --output. Every result is compared to --baseline
+(default: the committed benchmarks/baseline.json) and results more than
+--threshold slower are flagged as regressions (exit code 1).
+--save-baseline stores the results as new baseline instead of comparing.
+Baselines are machine specific, create one before changing the code.
+
+Usage (from the FACA directory):
+    py .\\benchmarks\\bench_suite.py --save-baseline
+    py .\\benchmarks\\bench_suite.py
+    py .\\benchmarks\\bench_suite.py --baseline other_baseline.json
+"""
+
+import argparse
+import configparser
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from faca_calc import FacaCalc
+from faca_index import imageIndex
+from faca_log import Logger
+from faca_main import FacaMain
+import faca_sim
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+INI_FILE = os.path.join(os.path.dirname(BENCH_DIR), "faca.ini")
+
+
+class TimedAddPhotos:
+    """Wraps chunk.addPhotos and counts the calls and seconds spent in it."""
+
+    def __init__(self, chunk):
+        self.addPhotos = chunk.addPhotos
+        self.calls = 0
+        self.seconds = 0.0
+        chunk.addPhotos = self
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        self.addPhotos(*args, **kwargs)
+        self.calls += 1
+        self.seconds += time.perf_counter() - start
+
+
+def createImageTree(folder: str, images: int, surveys: int) -> dict[str, list[str]]:
+    """Creates empty .jpg files for images images in surveys survey directories."""
+    imagesDict = {}
+    for s in range(surveys):
+        surveyDir = os.path.join(folder, f"survey_{s:02d}", "DCIM")
+        os.makedirs(surveyDir)
+        imagesDict[f"survey_{s:02d}"] = []
+        for i in range(images // surveys):
+            path = os.path.join(surveyDir, f"IMG_{i:06d}.JPG")
+            open(path, "w").close()
+            imagesDict[f"survey_{s:02d}"].append(path)
+    return imagesDict
+
+
+def getFacaCalc(outDir: str, cameraAccuracy: str = "None") -> FacaCalc:
+    logger = Logger()
+    logger.setupBuffer()
+    return FacaCalc(
+        logger=logger,
+        project_name="bench.psx",
+        input_image_dir="images",
+        output_dir=outDir,
+        alignment_accuracy=1,
+        camera_accuracy=cameraAccuracy,
+        keypoint_limit=40000,
+        tiepoint_limit=4000,
+        criterions="None",
+        criterion_values="0",
+        depth_map_quality=4,
+        depth_map_filtering="AggressiveFiltering",
+        output_epsg_code=32632,
+        backend="simulated",
+        progress_history=os.path.join(outDir, "progress_history.json"),
+    )
+
+
+def getAlignedChunk(f: FacaCalc, imagesDict: dict):
+    doc = faca_sim.Document()
+    chunk = doc.addChunk()
+    chunk.label = "Original"
+    f.addImagesByChunkName(chunk, imagesDict)
+    chunk.matchPhotos()
+    chunk.alignCameras()
+    return chunk
+
+
+def benchDiscovery(f: FacaCalc, folder: str, imagesDict: dict) -> float:
+    imageIndex._cache.clear()
+    start = time.perf_counter()
+    f.getImagesByChunkName(folder, list(imagesDict))
+    return time.perf_counter() - start
+
+
+def benchDiscoveryCached(f: FacaCalc, folder: str, imagesDict: dict) -> float:
+    f.getImagesByChunkName(folder, list(imagesDict))
+    start = time.perf_counter()
+    f.getImagesByChunkName(folder, list(imagesDict))
+    return time.perf_counter() - start
+
+
+def benchGrouping(f: FacaCalc, folder: str, imagesDict: dict) -> float:
+    chunk = faca_sim.Document().addChunk()
+    addPhotos = TimedAddPhotos(chunk)
+    start = time.perf_counter()
+    f.addImagesByChunkName(chunk, imagesDict)
+    return time.perf_counter() - start - addPhotos.seconds
+
+
+def benchAccuracy(f: FacaCalc, folder: str, imagesDict: dict) -> float:
+    chunk = faca_sim.Document().addChunk()
+    chunk.addPhotos([i for images in imagesDict.values() for i in images])
+    f.cameraAccuracy = "10,10,100"
+    start = time.perf_counter()
+    f.setImageAccuracy(chunk)
+    return time.perf_counter() - start
+
+
+def benchCloneAndPrune(f: FacaCalc, folder: str, imagesDict: dict) -> float:
+    chunk = getAlignedChunk(f, imagesDict)
+    start = time.perf_counter()
+    newChunks = f.CloneChunkNewLabels(chunk, list(imagesDict))
+    f.removeCameraGroupsUnequalChunkName(newChunks)
+    return time.perf_counter() - start
+
+
+def benchUiCounts(f: FacaCalc, folder: str, imagesDict: dict) -> float:
+    from faca_ui import FacaUi
+
+    imageIndex._cache.clear()
+    start = time.perf_counter()
+    FacaUi._get_subdir_and_image_counts(None, folder)
+    return time.perf_counter() - start
+
+
+def benchIniParsing() -> float:
+    m = FacaMain.__new__(FacaMain)  # skip __init__, which starts a run
+    ini = configparser.ConfigParser()
+    ini.read(INI_FILE)
+    sections = ini.sections()
+    start = time.perf_counter()
+    for section in sections:
+        m.getSettingsFromIniSection(INI_FILE, section)
+    return time.perf_counter() - start
+
+
+SCALED_BENCHMARKS = {
+    "discovery": benchDiscovery,
+    "discoveryCached": benchDiscoveryCached,
+    "grouping": benchGrouping,
+    "accuracy": benchAccuracy,
+    "cloneAndPrune": benchCloneAndPrune,
+    "uiCounts": benchUiCounts,
+}
+
+
+def runBenchmarks(
+    scales: list[int], surveys: list[int], repeat: int, only: list[str]
+) -> dict[str, float]:
+    """Returns the fastest seconds of every benchmark, e.g. 'grouping[images=1000,surveys=2]'."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpDir:
+        f = getFacaCalc(os.path.join(tmpDir, "out"))
+        for images in scales:
+            for surveyCount in surveys:
+                folder = os.path.join(tmpDir, f"images_{images}_{surveyCount}")
+                imagesDict = createImageTree(folder, images, surveyCount)
+                for name, bench in SCALED_BENCHMARKS.items():
+                    if only and name not in only:
+                        continue
+                    key = f"{name}[images={images},surveys={surveyCount}]"
+                    results[key] = min(
+                        bench(f, folder, imagesDict) for _ in range(repeat)
+                    )
+                    print(f"{key:50} {results[key]:10.4f} s", flush=True)
+                shutil.rmtree(folder)
+    if not only or "iniParsing" in only:
+        results["iniParsing"] = min(benchIniParsing() for _ in range(repeat))
+        print(f"{'iniParsing':50} {results['iniParsing']:10.4f} s")
+    return results
+
+
+def compareToBaseline(
+    results: dict[str, float],
+    baseline: dict[str, float],
+    threshold: float,
+    minSeconds: float,
+) -> list[str]:
+    """Returns the benchmarks more than threshold (relative) and minSeconds slower than baseline."""
+    regressions = []
+    for key, seconds in results.items():
+        if key not in baseline:
+            continue
+        ratio = seconds / baseline[key] if baseline[key] else float("inf")
+        if ratio > 1 + threshold and seconds - baseline[key] > minSeconds:
+            regressions.append(key)
+            print(
+                f"REGRESSION {key}: {baseline[key]:.4f} s -> {seconds:.4f} s ({ratio:.2f}x)"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scales", default="1000,10000,100000", help="image counts")
+    parser.add_argument("--surveys", default="2,20", help="survey counts")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", default="", help="comma separated benchmark names")
+    parser.add_argument(
+        "--output", default=os.path.join(BENCH_DIR, "bench_results.json")
+    )
+    parser.add_argument(
+        "--baseline",
+        default=BASELINE,
+        help="baseline json to compare to, empty to skip the comparison",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store the results as benchmarks/baseline.json",
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.25, help="relative slow-down flagged"
+    )
+    parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=0.001,
+        help="absolute slow-down below which differences count as noise",
+    )
+    args = parser.parse_args()
+
+    results = runBenchmarks(
+        [int(s) for s in args.scales.split(",")],
+        [int(s) for s in args.surveys.split(",")],
+        args.repeat,
+        [o.strip() for o in args.only.split(",") if o.strip()],
+    )
+    report = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    outputs = [args.output]
+    if args.save_baseline:
+        outputs.append(BASELINE)
+    for output in outputs:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+
+    if args.baseline and not args.save_baseline:
+        if not os.path.isfile(args.baseline):
+            print(f"Baseline {args.baseline} not found, nothing compared.")
+            return 0
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compareToBaseline(
+            results, baseline, args.threshold, args.min_seconds
+        )
+        if regressions:
+            print(f"{len(regressions)} regressions above {args.threshold:.0%}.")
+            return 1
+        print(f"No regressions above {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+"""
+Photogrammetry backends of FACA.
+
+FacaCalc only talks to the module returned by getBackend (FacaCalc.ms).
+A backend is a module with the subset of the Metashape Python API FACA uses:
+
+    version
+    Document: chunks, addChunk, append, remove, open, save
+    Chunk: label, cameras, camera_groups, tie_points, point_cloud,
+        addCameraGroup, addPhotos, matchPhotos, alignCameras, buildDepthMaps,
+        buildPointCloud, exportPointCloud, copy, remove
+    Camera: photo.path, group, reference.accuracy
+    TiePoints.Filter: ImageCount, ProjectionAccuracy,
+        ReconstructionUncertainty, ReprojectionError, init, removePoints
+    NoFiltering, MildFiltering, ModerateFiltering, AggressiveFiltering
+    Vector, CoordinateSystem
+
+"metashape" is Agisoft Metashape, "simulated" the deterministic in-memory
+simulation in faca_sim, which needs no license and allows to profile FACA
+itself, e.g. in the benchmarks.
+"""
+
+BACKENDS = ("metashape", "simulated")
+
+
+def getBackend(name: str = "metashape"):
+    """Returns the backend module called name (see BACKENDS)."""
+    if name == "metashape":
+        try:
+            import Metashape
+        except ImportError as e:
+            raise ImportError(
+                "The Metashape Python module is not installed. "
+                "Install it or use backend = simulated."
+            ) from e
+        return Metashape
+    elif name == "simulated":
+        import faca_sim
+
+        return faca_sim
+    raise ValueError(f"No backend '{name}' found. {BACKENDS = }")
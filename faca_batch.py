@@ -0,0 +1,146 @@
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import os
+import re
+import time
+import traceback
+
+from faca_calc import FacaCalc
+from faca_index import imageIndex
+from faca_progress import formatProgress
+
+
+class FacaBatch:
+    """
+    Runs FACA for several parameter sets (e.g. the sections of an .ini file).
+
+    Every job gets its own output directory (output_dir/<job name>) and thus
+    its own project, .log and stage manifest. The survey images are looked up
+    once per distinct input_image_dir and shared by all jobs using it.
+    Jobs run one after another in this process, or in up to maxJobs worker
+    processes. The progress of every job is printed with its name as prefix.
+    A table with the wall-clock time per stage and job is written
+    to faca_batch_summary.csv in the output directory of the first job.
+    """
+
+    def __init__(self, jobs: dict[str, dict], maxJobs: int = 1):
+        """jobs maps a job name (e.g. the .ini section) to FacaCalc settings."""
+        if not jobs:
+            raise ValueError("Batch mode needs at least one job, none given.")
+        self.maxJobs = maxJobs
+        self.jobs = {}
+        for name, settings in jobs.items():
+            settings = dict(settings)
+            settings["output_dir"] = os.path.join(
+                settings["output_dir"], self._getDirName(name)
+            )
+            self.jobs[name] = settings
+        self.summaryDir = os.path.dirname(next(iter(self.jobs.values()))["output_dir"])
+
+    def run(self) -> list[dict]:
+        """Runs all jobs and writes the summary. Returns one result dict per job."""
+        imagesDicts = self.getImagesDicts()
+        names = list(self.jobs)
+        args = [
+            (n, self.jobs[n], imagesDicts[self.jobs[n]["input_image_dir"]])
+            for n in names
+        ]
+        if self.maxJobs > 1:
+            with ProcessPoolExecutor(max_workers=self.maxJobs) as executor:
+                results = list(executor.map(FacaBatch.runJob, *zip(*args)))
+        else:
+            results = [FacaBatch.runJob(*a) for a in args]
+        for name, result in zip(names, results):
+            result["name"] = name
+        self.writeSummary(results)
+        return results
+
+    def getImagesDicts(self) -> dict[str, dict]:
+        """Returns the survey images of every distinct input_image_dir of the jobs."""
+        imagesDicts = {}
+        for settings in self.jobs.values():
+            folder = settings["input_image_dir"]
+            if folder in imagesDicts:
+                continue
+            if os.path.isdir(folder):
+                # survey count is checked by FacaCalc.main
+                imagesDicts[folder] = imageIndex.getSubdirImages(folder)
+            else:
+                imagesDicts[folder] = {}
+        return imagesDicts
+
+    @staticmethod
+    def runJob(name: str, settings: dict, imagesDict: dict) -> dict:
+        """
+        Runs one FACA calculation. Exceptions are caught and returned,
+        so a failing job does not stop the others.
+        """
+        result = {"status": "done", "error": "", "seconds": 0.0, "stageTimes": {}}
+        start = time.perf_counter()
+        f = None
+        try:
+            f = FacaCalc(**settings)
+            f.progress.addSink(
+                lambda message: print(f"[{name}] {formatProgress(message)}", flush=True)
+            )
+            if not f.main(imagesDict=imagesDict):
+                result["status"] = "invalid parameters"
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = repr(e)
+            if f is not None:
+                f.l.l(traceback.format_exc())
+        finally:
+            if f is not None:
+                result["stageTimes"] = f.stageTimes
+                f.l.close()
+        result["seconds"] = time.perf_counter() - start
+        return result
+
+    def writeSummary(self, results: list[dict]) -> None:
+        """
+        Writes and prints the wall-clock seconds per stage and job.
+        Per survey stages (e.g. pointCloud:<survey>) are summed up.
+        """
+        stageNames = []
+        rows = []
+        for result in results:
+            row = {"job": result["name"], "status": result["status"]}
+            for stage, seconds in result["stageTimes"].items():
+                stage = stage.split(":")[0]
+                if stage not in stageNames:
+                    stageNames.append(stage)
+                row[stage] = row.get(stage, 0.0) + seconds
+            row["total"] = result["seconds"]
+            rows.append(row)
+        header = ["job", "status"] + stageNames + ["total"]
+
+        os.makedirs(self.summaryDir, exist_ok=True)
+        summaryPath = os.path.join(self.summaryDir, "faca_batch_summary.csv")
+        with open(summaryPath, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for row in rows:
+                writer.writerow([self._formatCell(row.get(h, "")) for h in header])
+
+        widths = [
+            max(len(h), *(len(self._formatCell(r.get(h, ""))) for r in rows))
+            for h in header
+        ]
+        print("  ".join(h.ljust(w) for h, w in zip(header, widths)).rstrip())
+        for row in rows:
+            cells = [self._formatCell(row.get(h, "")) for h in header]
+            print("  ".join(c.ljust(w) for c, w in zip(cells, widths)).rstrip())
+        for result in results:
+            if result["error"]:
+                print(f"{result['name']}: {result['error']}")
+        print(f"Summary written to {summaryPath}")
+
+    def _formatCell(self, value) -> str:
+        if isinstance(value, float):
+            return f"{value:.1f}"
+        return str(value)
+
+    def _getDirName(self, name: str) -> str:
+        # e.g. "Harkema et al. 2023 A" -> "Harkema_et_al_2023_A"
+        return re.sub(r"[^\w-]+", "_", name).strip("_")
@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+
+
+class AlignmentCache:
+    """
+    Directory of matched and aligned "Original" chunks, each saved as its own
+    Metashape project and addressed by a content hash of its inputs
+    (survey images and matching parameters).
+
+    A project only counts as cached once its marker file <key>.json exists.
+    The marker is written atomically after the project has been saved, so
+    interrupted or concurrent writers never expose half written projects.
+    """
+
+    def __init__(self, cacheDir: str):
+        self.cacheDir = cacheDir
+
+    def getKey(self, imagesDict: dict[str, list[str]], params: dict) -> str:
+        """
+        Returns the hash of the survey names, the path, size and modification
+        time of every image and the matching parameters in params.
+        """
+        h = hashlib.sha256()
+        h.update(json.dumps(params, sort_keys=True).encode())
+        for chunkName in sorted(imagesDict):
+            h.update(chunkName.encode())
+            for image in sorted(imagesDict[chunkName]):
+                stat = os.stat(image)
+                h.update(
+                    f"{os.path.abspath(image)}|{stat.st_size}|{stat.st_mtime_ns}".encode()
+                )
+        return h.hexdigest()
+
+    def lookup(self, key: str) -> str:
+        """Returns the path of the cached project for key or None."""
+        markerPath = self._getMarkerPath(key)
+        if not os.path.isfile(markerPath):
+            return None
+        with open(markerPath, "r") as f:
+            projectPath = os.path.join(self.cacheDir, json.load(f)["project"])
+        if not os.path.isfile(projectPath):
+            return None
+        return projectPath
+
+    def getNewProjectPath(self, key: str) -> str:
+        """Returns a path to save a new project for key to, unique per process."""
+        os.makedirs(self.cacheDir, exist_ok=True)
+        return os.path.join(self.cacheDir, f"{key[:16]}_{os.getpid()}.psx")
+
+    def commit(self, key: str, projectPath: str, params: dict) -> None:
+        """Marks the saved project at projectPath as the cached project for key."""
+        markerPath = self._getMarkerPath(key)
+        tmpPath = f"{markerPath}.{os.getpid()}.tmp"
+        with open(tmpPath, "w") as f:
+            json.dump(
+                {"project": os.path.basename(projectPath), "params": params},
+                f,
+                indent=2,
+            )
+        os.replace(tmpPath, markerPath)
+
+    def _getMarkerPath(self, key: str) -> str:
+        return os.path.join(self.cacheDir, key + ".json")
@@ -1,9 +1,59 @@
-import glob
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import json
+import math
+import platform
+import shutil
+import time
+from typing import TYPE_CHECKING
 
-import Metashape
 import os
 
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, used for large tie point clouds
+    np = None
+
+from faca_backend import getBackend
+from faca_cache import AlignmentCache
+from faca_index import imageIndex
 from faca_log import Logger
+from faca_progress import DEFAULT_HISTORY_PATH, ProgressReporter, formatProgress
+from faca_stages import StageManifest
+import faca_tiepoint_stats
+from faca_tiepoint_stats import TiePointStats
+import faca_voxel
+from faca_voxel import VoxelDownsampler
+import faca_change
+from faca_change import ChangeDetector
+import faca_report
+from faca_report import CoalignmentReport
+import faca_prescreen
+from faca_prescreen import ImagePrescreener
+from faca_metadata import MetadataCache, summarize
+import faca_window
+from faca_window import describeTransform, estimateHelmert, getWindows
+import faca_spatial
+from faca_spatial import estimateSpacing, getCandidatePairs
+
+if TYPE_CHECKING:
+    import Metashape
+
+
+# export_attributes -> exportPointCloud argument
+EXPORT_ATTRIBUTES = {
+    "color": "save_point_color",
+    "normal": "save_point_normal",
+    "classification": "save_point_classification",
+    "confidence": "save_point_confidence",
+    "return_number": "save_point_return_number",
+    "scan_angle": "save_point_scan_angle",
+    "source_id": "save_point_source_id",
+    "timestamp": "save_point_timestamp",
+    "index": "save_point_index",
+}
 
 
 class FacaCalc:
@@ -23,17 +73,90 @@ class FacaCalc:
         depthMapQuality (int): Quality level of the depth map (lower is more detailed).
         depthMapFiltering (str): Filter mode for the depth map.
         outputEpsg (int): EPSG code for the coordinate system of the output files.
+        resume (bool): Continue an interrupted calculation from its last finished stage.
+        stages (StageManifest): Finished stages of the current project.
+        parallelChunks (int): Number of worker processes building survey chunks (<= 1 is sequential).
+        settings (dict): The keyword arguments FacaCalc was created with.
+        stageTimes (dict): Wall-clock seconds of every stage run by main.
+        alignmentCache (AlignmentCache or None): Cache of aligned chunks shared between runs.
+        progress (ProgressReporter): Progress callbacks for long Metashape operations,
+            the seconds per image of earlier runs are read from progress_history (default ~/.faca/progress_history.json).
+        filterMode (str): "fixed" removes tie points at the criterion values once,
+            "adaptive" removes at most filterMaxRemoval percent per pass until the criterion values are reached.
+        filterMaxRemoval (float): Adaptive filtering: maximum percent of tie points removed per pass.
+        filterMaxIterations (int): Adaptive filtering: maximum passes per criterion.
+        filterMinRemovalToOptimize (float): Adaptive filtering: percent of removed tie points that triggers optimizeCameras.
+        realignPolicy (str): Fixed filtering: "after_each" criterion alignCameras, "once_at_end" or "optimize" (optimizeCameras after each criterion).
+        denseConfidenceMin (int): Remove dense points with a lower confidence before export, 0 keeps all.
+        densePointSpacing (float): Thin dense point clouds to this point spacing (in m), 0 keeps all.
+        exportFormat (str): "las" or "laz" (compressed).
+        exportTileSize (float): Export tiles of this size in CRS units, 0 exports one file per survey.
+        exportAttributes (list[str] or None): Point attributes to export (see EXPORT_ATTRIBUTES), None for Metashape's defaults.
+        exportWorkers (int): Number of worker processes exporting survey chunks (<= 1 is sequential).
+        voxelSize (float): Write a companion cloud downsampled to one point per voxel of this size (in m) after export, 0 disables it (needs numpy).
+        changeDetection (str): Compare the exported survey clouds: "none", "consecutive" surveys or "all_pairs".
+        changeCellSize (float): Cell size (in m) of the change detection rasters.
+        changeTileSize (float): Size (in m) of the change detection processing tiles.
+        changeMaxDistance (float): Maximum C2C distance (in m), farther points get no distance.
+        changeWorkers (int): Number of worker processes comparing tiles (<= 1 is sequential).
+        recordTiePointStats (bool): Write tie point statistics of every filter pass (needs numpy).
+        tiePointStats (TiePointStats or None): Statistics of the running filter stage.
+        preselection (str): Pair preselection of matchPhotos: "default" (Metashape's), "generic",
+            "reference", "none" or "spatial" (explicit pairs of cameras closer than preselectionRadius).
+        preselectionRadius (float): Spatial preselection: maximum camera distance in m, 0 for 5 x the median camera spacing.
+        metadataCache (MetadataCache or None): Cache of the EXIF/XMP metadata of the survey images.
+        prescreen (str): Score images for blur and exposure before adding them: "none",
+            "exclude" images below the thresholds or add them "disable"d.
+        prescreenMinSharpness (float): Minimum sharpness (variance of the Laplacian of a 256 px thumbnail).
+        prescreenMaxClipped (float): Maximum percent of under- or overexposed pixels.
+        prescreenWorkers (int): Number of worker processes scoring images (0 uses all CPUs).
+        prescreenCache (str): SQLite file caching the image scores (default ~/.faca/prescreen.sqlite).
+        rejectedImages (set[str]): Images below the pre-screening thresholds.
+        keepKeypoints (bool): Keep the key points of the "Original" chunk after matching, needed to append surveys later.
+        appendSurvey (str): Name of a new survey subdirectory to add to the finished project (see mainAppend), empty for a full run.
+        appendShiftTolerance (float): Existing survey chunks whose cameras moved more than this (m) in the new alignment are rebuilt.
+        windowSize (int): Co-align windows of this many consecutive surveys instead of all surveys at once (see mainWindows), 0 disables it.
+        windowOverlap (int): Number of surveys consecutive windows share.
+        windowWorkers (int): Number of worker processes aligning windows.
+        coalignmentReport (bool): Write camera reference and reprojection errors and shared tie points per survey (needs numpy).
+        ms (module): The photogrammetry backend, Metashape or faca_sim (see faca_backend).
     """
 
-    def __init__(self, **kwargs):
+    def __init__(self, logger: Logger = None, **kwargs):
+        """
+        kwargs are the FACA settings. If logger is given it is used as is,
+        otherwise a new .log file is set up in the output directory.
+        """
         os.makedirs(kwargs["output_dir"], exist_ok=True)
-        
-        self.l = Logger()
-        self.l.setupLogger(kwargs["output_dir"], kwargs["project_name"])
-        self.l.l("FACA Log")
-        self.l.l(f"Metashape Version: {Metashape.version}")
-        self.l.l("Parameters:")
-        self.l.logFacaInputs(kwargs)
+        self.ms = getBackend(kwargs.get("backend", "metashape"))
+
+        if logger is None:
+            self.l = Logger()
+            self.l.setupLogger(
+                kwargs["output_dir"],
+                kwargs["project_name"],
+                append=bool(kwargs.get("resume", False))
+                or bool(kwargs.get("append_survey", "")),
+            )
+            self.l.l("FACA Log")
+            self.l.l(f"Metashape Version: {self.ms.version}")
+            self.l.l("Parameters:")
+            self.l.logFacaInputs(kwargs)
+            self.l.logTimeline(
+                {
+                    "event": "run",
+                    "project": kwargs["project_name"],
+                    "metashapeVersion": self.ms.version,
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "cpuCount": os.cpu_count(),
+                }
+            )
+        else:
+            self.l = logger
+
+        self.settings = kwargs
+        self.stageTimes = {}
 
         self.projectName = kwargs["project_name"]  # str
         self.inputImageDir = kwargs["input_image_dir"]  # str
@@ -54,6 +177,74 @@ class FacaCalc:
         self.depthMapQuality = int(kwargs["depth_map_quality"])  # int
         self.depthMapFiltering = kwargs["depth_map_filtering"]  # str
         self.outputEpsg = int(kwargs["output_epsg_code"])  # int
+        self.resume = bool(kwargs.get("resume", False))  # bool
+        self.stages = StageManifest(os.path.join(self.outputDir, self.projectName))
+        self.parallelChunks = int(kwargs.get("parallel_chunks", 1))  # int
+        alignmentCacheDir = kwargs.get("alignment_cache_dir", "")  # str
+        self.alignmentCache = (
+            AlignmentCache(alignmentCacheDir) if alignmentCacheDir else None
+        )
+        progressHistory = kwargs.get("progress_history", "")  # str
+        self.progress = ProgressReporter(
+            os.path.expanduser(progressHistory or DEFAULT_HISTORY_PATH),
+            interval=float(kwargs.get("progress_interval", 10)),
+        )
+        self.progress.addSink(self._logProgress)
+        self.filterMode = kwargs.get("filter_mode", "fixed")  # str
+        self.filterMaxRemoval = float(kwargs.get("filter_max_removal", 10))  # float
+        self.filterMaxIterations = int(kwargs.get("filter_max_iterations", 10))  # int
+        self.filterMinRemovalToOptimize = float(
+            kwargs.get("filter_min_removal_to_optimize", 20)
+        )  # float
+        self.realignPolicy = kwargs.get("realign_policy", "after_each")  # str
+        self.recordTiePointStats = bool(kwargs.get("tiepoint_stats", False))  # bool
+        self.coalignmentReport = bool(kwargs.get("coalignment_report", False))  # bool
+        self.keepKeypoints = bool(kwargs.get("keep_keypoints", False))  # bool
+        self.appendSurvey = kwargs.get("append_survey", "")  # str
+        self.windowSize = int(kwargs.get("window_size", 0))  # int
+        self.windowOverlap = int(kwargs.get("window_overlap", 1))  # int
+        self.windowWorkers = int(kwargs.get("window_workers", 1))  # int
+        self.appendShiftTolerance = float(
+            kwargs.get("append_shift_tolerance", 0.05)
+        )  # float
+        self.preselection = kwargs.get("preselection", "default")  # str
+        self.preselectionRadius = float(kwargs.get("preselection_radius", 0))  # float
+        metadataCachePath = kwargs.get("metadata_cache", "")  # str
+        self.metadataCache = (
+            MetadataCache(os.path.expanduser(metadataCachePath))
+            if metadataCachePath
+            else None
+        )
+        self.prescreen = kwargs.get("prescreen", "none")  # str
+        self.prescreenMinSharpness = float(
+            kwargs.get("prescreen_min_sharpness", 30)
+        )  # float
+        self.prescreenMaxClipped = float(
+            kwargs.get("prescreen_max_clipped", 25)
+        )  # float
+        self.prescreenWorkers = int(kwargs.get("prescreen_workers", 0))  # int
+        self.prescreenCache = os.path.expanduser(
+            kwargs.get("prescreen_cache", "") or faca_prescreen.DEFAULT_CACHE_PATH
+        )  # str
+        self.rejectedImages = set()
+        self.denseConfidenceMin = int(kwargs.get("dense_confidence_min", 0))  # int
+        self.densePointSpacing = float(kwargs.get("dense_point_spacing", 0))  # float
+        self.exportFormat = kwargs.get("export_format", "las").lower()  # str
+        self.exportTileSize = float(kwargs.get("export_tile_size", 0))  # float
+        exportAttributes = kwargs.get("export_attributes", "")  # str
+        self.exportAttributes = (
+            [a.strip() for a in exportAttributes.split(",") if a.strip()]
+            if exportAttributes
+            else None
+        )  # list of strs
+        self.exportWorkers = int(kwargs.get("export_workers", 1))  # int
+        self.voxelSize = float(kwargs.get("voxel_size", 0))  # float
+        self.changeDetection = kwargs.get("change_detection", "none")  # str
+        self.changeCellSize = float(kwargs.get("change_cell_size", 1))  # float
+        self.changeTileSize = float(kwargs.get("change_tile_size", 100))  # float
+        self.changeMaxDistance = float(kwargs.get("change_max_distance", 5))  # float
+        self.changeWorkers = int(kwargs.get("change_workers", 1))  # int
+        self.tiePointStats = None
 
     def _validate(self) -> bool:
         """
@@ -86,6 +277,117 @@ class FacaCalc:
                     f"Invalid tie point filtering criterion: {criterion}. {okCriterion = }"
                 )
                 ok = False
+        if not self.filterMode in ("fixed", "adaptive"):
+            self.l.lwt(
+                f"Invalid filter mode: {self.filterMode}. Use fixed or adaptive."
+            )
+            ok = False
+        if not 0 < self.filterMaxRemoval <= 100:
+            self.l.lwt(
+                f"Invalid filter max removal: {self.filterMaxRemoval}. Expected a percentage > 0 and <= 100."
+            )
+            ok = False
+        okRealignPolicy = ("after_each", "once_at_end", "optimize")
+        if not self.realignPolicy in okRealignPolicy:
+            self.l.lwt(
+                f"Invalid realign policy: {self.realignPolicy}. {okRealignPolicy = }"
+            )
+            ok = False
+        if self.denseConfidenceMin < 0 or self.densePointSpacing < 0:
+            self.l.lwt(
+                f"Invalid dense confidence minimum {self.denseConfidenceMin} or point spacing {self.densePointSpacing}. Expected >= 0."
+            )
+            ok = False
+        if not self.exportFormat in ("las", "laz"):
+            self.l.lwt(f"Invalid export format: {self.exportFormat}. Use las or laz.")
+            ok = False
+        if self.exportTileSize < 0:
+            self.l.lwt(f"Invalid export tile size: {self.exportTileSize}.")
+            ok = False
+        for attribute in self.exportAttributes or []:
+            if not attribute in EXPORT_ATTRIBUTES:
+                self.l.lwt(
+                    f"Invalid export attribute: {attribute}. {list(EXPORT_ATTRIBUTES)}"
+                )
+                ok = False
+        if self.voxelSize < 0:
+            self.l.lwt(f"Invalid voxel size: {self.voxelSize}.")
+            ok = False
+        if self.voxelSize > 0 and self.exportFormat != "las":
+            self.l.lwt("Voxel downsampling needs export_format las.")
+            ok = False
+        if self.voxelSize > 0 and faca_voxel.np is None:
+            self.l.lwt("Voxel downsampling needs numpy, which is not installed.")
+            ok = False
+        okChangeDetection = ("none", "consecutive", "all_pairs")
+        if not self.changeDetection in okChangeDetection:
+            self.l.lwt(
+                f"Invalid change detection: {self.changeDetection}. {okChangeDetection = }"
+            )
+            ok = False
+        if self.changeDetection != "none":
+            if (
+                min(self.changeCellSize, self.changeTileSize, self.changeMaxDistance)
+                <= 0
+            ):
+                self.l.lwt(
+                    "Invalid change detection cell size, tile size or max distance. Expected > 0."
+                )
+                ok = False
+            if self.exportFormat != "las":
+                self.l.lwt("Change detection needs export_format las.")
+                ok = False
+            if faca_change.np is None or faca_change.cKDTree is None:
+                self.l.lwt(
+                    "Change detection needs numpy and scipy, which are not installed."
+                )
+                ok = False
+        if self.recordTiePointStats and faca_tiepoint_stats.np is None:
+            self.l.lwt("Tie point statistics need numpy, which is not installed.")
+            ok = False
+        okPreselection = ("default", "generic", "reference", "none", "spatial")
+        if not self.preselection in okPreselection:
+            self.l.lwt(
+                f"Invalid preselection: {self.preselection}. {okPreselection = }"
+            )
+            ok = False
+        if self.preselectionRadius < 0:
+            self.l.lwt(f"Invalid preselection radius: {self.preselectionRadius}.")
+            ok = False
+        if self.preselection == "spatial" and faca_spatial.np is None:
+            self.l.lwt("Spatial preselection needs numpy, which is not installed.")
+            ok = False
+        okPrescreen = ("none", "exclude", "disable")
+        if not self.prescreen in okPrescreen:
+            self.l.lwt(f"Invalid prescreen: {self.prescreen}. {okPrescreen = }")
+            ok = False
+        if self.prescreen != "none" and (
+            faca_prescreen.np is None or faca_prescreen.Image is None
+        ):
+            self.l.lwt(
+                "Image pre-screening needs numpy and Pillow, which are not installed."
+            )
+            ok = False
+        if self.appendShiftTolerance < 0:
+            self.l.lwt(
+                f"Invalid append shift tolerance: {self.appendShiftTolerance}. Expected >= 0."
+            )
+            ok = False
+        if self.windowSize:
+            if self.windowSize < 2 or not 1 <= self.windowOverlap < self.windowSize:
+                self.l.lwt(
+                    f"Invalid window size {self.windowSize} or overlap {self.windowOverlap}. Expected a size >= 2 and 1 <= overlap < size."
+                )
+                ok = False
+            if faca_window.np is None:
+                self.l.lwt("Windowed co-alignment needs numpy, which is not installed.")
+                ok = False
+            if self.appendSurvey:
+                self.l.lwt("Appending a survey is not supported with window_size.")
+                ok = False
+        if self.coalignmentReport and faca_report.np is None:
+            self.l.lwt("The co-alignment report needs numpy, which is not installed.")
+            ok = False
         if not self.depthMapQuality in okDepthMapQuality:
             self.l.lwt(
                 f"Invalid depth map quality: {self.depthMapQuality}. {okDepthMapQuality = }"
@@ -98,71 +400,927 @@ class FacaCalc:
             ok = False
         return ok
 
-    def main(self) -> None:
+    def main(self, imagesDict: dict[str, list[str]] = None) -> bool:
         """
         Main FACA execution method.
+        imagesDict can be given if the survey images are already known (e.g. in batch mode).
+        Returns False if the input parameter validation failed.
 
         Steps:
             1.  Validates input parameters.
             2.  Get survey count and names.
             3.  Get individual survey images.
-            4.  Initialize a Metashape project and add an "Original" chunk.
+                Optionally check the image metadata and pre-screen the images for blur and exposure.
+            4.  Initialize (or reopen if resuming) a Metashape project and add an "Original" chunk.
             5.  Load all images into "orignal" chunk.
             6.  Set Image Accuracy.
             7.  Align and match the images to generate tie points.
+                Steps 5 to 7 are replaced by a copy from the alignment cache if it
+                contains a chunk with the same images and matching parameters.
             8.  Optimize the sparse point cloud by filtering bad points and realigning.
             9.  Clone chunks and remove irrelevant camera groups.
+                Optionally report the co-alignment quality per survey.
             10. Build dense point clouds for each chunk.
             11. Export the point clouds.
+            12. Optionally write voxel downsampled companion clouds of the exports.
+            13. Optionally compare the survey clouds (change detection).
+
+        Every step from 5 on is a stage. After each stage the project is saved
+        and the stage is recorded in self.stages. With self.resume finished
+        stages are skipped. Duration, CPU time, memory and object counts of
+        every stage are written to the .timeline.jsonl next to the .log.
         """
         self.l.lwt("start.")
         if not self._validate():
             self.l.lwt("Input Parameter Validation failed.")
-            return
+            return False
         self.l.lwt("Input Parameter Validation finished sucessfully.")
+        if self.appendSurvey:
+            return self.mainAppend(imagesDict)
 
-        chunkNames = self.getChunkNames(self.inputImageDir)
+        with self.l.stage(
+            "imageDiscovery",
+            counts=lambda: {"images": sum(len(i) for i in imagesDict.values())},
+        ):
+            if imagesDict is None:
+                chunkNames = self.getChunkNames(self.inputImageDir)
+                imagesDict = self.getImagesByChunkName(self.inputImageDir, chunkNames)
+            else:
+                chunkNames = list(imagesDict)
+                self._checkChunkCount(chunkNames)
         self.l.lwt(f"Found {len(chunkNames)} directories: {chunkNames}")
-        imagesDict = self.getImagesByChunkName(self.inputImageDir, chunkNames)
+        imagesDict = self.checkImages(imagesDict)  # logging in function
+        if self.windowSize and len(chunkNames) > self.windowSize:
+            return self.mainWindows(imagesDict)
+
+        doc = self.openOrCreateDocument(os.path.join(self.outputDir, self.projectName))
+        self.progress.setPlan(self._getProgressPlan(imagesDict))
+        origChunk = self.getChunkByLabel(doc, "Original")
+        if origChunk is None:
+            origChunk = self.addLabeledChunk(doc, "Original")
+            self.l.lwt("Original chunk added.")
+            doc.save()
+
+        if self.alignmentCache is not None:
+            origChunk = self.loadCachedAlignment(doc, origChunk, imagesDict)
+        self._runStage(doc, "imagesAdded", self._stageAddImages, origChunk, imagesDict)
+        self._runStage(doc, "accuracySet", self._stageSetImageAccuracy, origChunk)
+        self._runStage(
+            doc, "matchedAndAligned", self._stageMatchAndAlign, doc, origChunk
+        )
+        self._runStage(
+            doc, "filtered", self.removeBadPointsAndRealign, origChunk
+        )  # logging in function
+        self._runStage(
+            doc, "chunksCloned", self._stageCloneChunks, doc, origChunk, chunkNames
+        )
+        if self.coalignmentReport:
+            self._runStage(
+                doc, "coalignmentReport", self.reportCoalignment, origChunk
+            )  # logging in function
+        self.runPointCloudStages(doc, chunkNames)  # logging in function
+        self.progress.finish()
+        self.l.lwt("done.")
+        return True
+
+    def mainAppend(self, imagesDict: dict[str, list[str]] = None) -> bool:
+        """
+        Adds the survey self.appendSurvey (a new subdirectory of the input image
+        directory) to the finished project of an earlier run, instead of
+        co-aligning all surveys from scratch.
+        imagesDict can be given if the survey images are already known, only the
+        images of self.appendSurvey are used.
+        Returns False if there is no finished project to append to.
+
+        Steps:
+            1.  Reopen the project. Its survey chunks must have been cloned.
+            2.  Get, check and optionally pre-screen the images of the new survey.
+            3.  Add them as new camera group to the "Original" chunk, match them
+                without resetting the existing matches and align them without
+                resetting the existing alignment.
+            4.  Filter the tie points again.
+            5.  Clone the chunk of the new survey. Existing survey chunks whose
+                cameras moved more than self.appendShiftTolerance in the new
+                alignment (see getSurveyShifts) are cloned anew, their point cloud
+                stages and the change detection are marked as not done.
+            6.  Build, export and post-process the point clouds of the new and
+                the moved surveys like main (runPointCloudStages).
+
+        The steps from 3 on are stages named after the new survey, so an
+        interrupted append continues where it stopped when run again.
+        """
+        name = self.appendSurvey
+        projectPath = os.path.join(self.outputDir, self.projectName)
+        self.stages.load()
+        if not os.path.isfile(projectPath) or not self.stages.isDone("chunksCloned"):
+            self.l.lwt(
+                f"Can't append {name}: {projectPath} has no co-aligned survey chunks. Run FACA without append_survey first."
+            )
+            return False
+        if not self.stages.isDone("keypointsKept"):
+            self.l.lwt(
+                f"Can't append {name}: {projectPath} has no stored key points, the new images can't be matched incrementally. Run FACA without append_survey and with keep_keypoints = True first."
+            )
+            return False
+        doc = self.ms.Document()
+        doc.open(projectPath)
+        origChunk = self.getChunkByLabel(doc, "Original")
+        chunkNames = [cg.label for cg in origChunk.camera_groups]
+        if name in chunkNames and not self.stages.isDone(f"surveyAppended:{name}"):
+            self.l.lwt(f"Can't append {name}: the project already contains it.")
+            return False
+        if not name in chunkNames:
+            chunkNames.append(name)
+        self.l.lwt(f"Appending {name} to {projectPath}. Surveys: {chunkNames}")
+        if self.alignmentCache is not None:
+            self.l.lwt("The alignment cache is not used when appending a survey.")
+
+        with self.l.stage(
+            "imageDiscovery",
+            counts=lambda: {"images": sum(len(i) for i in imagesDict.values())},
+        ):
+            if imagesDict is None or name not in imagesDict:
+                imagesDict = self.getImagesByChunkName(self.inputImageDir, [name])
+            else:
+                imagesDict = {name: imagesDict[name]}
+        if not imagesDict[name]:
+            self.l.lwt(f"Can't append {name}: no images found.")
+            return False
+        imagesDict = self.checkImages(imagesDict)  # logging in function
+        self.progress.setPlan(self._getProgressPlan(imagesDict))
+
+        self._runStage(
+            doc,
+            f"surveyAppended:{name}",
+            self._stageAppendSurvey,
+            origChunk,
+            imagesDict,
+        )
+        self._runStage(
+            doc, f"filtered:{name}", self.removeBadPointsAndRealign, origChunk
+        )  # logging in function
+        self._runStage(
+            doc,
+            f"chunksCloned:{name}",
+            self._stageCloneAppendedChunks,
+            doc,
+            origChunk,
+            chunkNames,
+        )
+        if self.coalignmentReport:
+            self._runStage(
+                doc, f"coalignmentReport:{name}", self.reportCoalignment, origChunk
+            )  # logging in function
+        self.runPointCloudStages(doc, chunkNames)  # logging in function
+        self.progress.finish()
+        self.l.lwt("done.")
+        return True
+
+    def mainWindows(self, imagesDict: dict[str, list[str]]) -> bool:
+        """
+        Co-aligns long survey time series in windows of self.windowSize consecutive
+        surveys (sorted by name) instead of one "Original" chunk with all surveys.
+        Consecutive windows share self.windowOverlap surveys.
+
+        Steps:
+            1.  Align every window in its own chunk ("Window 1", ...) like the
+                "Original" chunk: add images, set accuracy, match, align and filter.
+                With self.windowWorkers > 1 the windows are aligned concurrently.
+            2.  Chain the windows into the frame of the first window through the
+                cameras of their shared surveys (see chainWindows) and write the
+                alignment quality of every window to <project>_windows.json.
+            3.  Clone every survey chunk from the first window containing it.
+            4.  Build, export and post-process the survey point clouds like main.
+
+        Every step is a stage, so windowed runs can be resumed like full runs.
+        """
+        chunkNames = sorted(imagesDict)
+        windows = getWindows(chunkNames, self.windowSize, self.windowOverlap)
+        labels = [f"Window {i + 1}" for i in range(len(windows))]
+        for label, window in zip(labels, windows):
+            self.l.lwt(f"{label}: {window}")
+        if self.alignmentCache is not None:
+            self.l.lwt("The alignment cache is not used for windowed co-alignment.")
+
+        doc = self.openOrCreateDocument(os.path.join(self.outputDir, self.projectName))
+        self.progress.setPlan(
+            self._getProgressPlan(imagesDict, dict(zip(labels, windows)))
+        )
+        windowImages = [
+            {name: imagesDict[name] for name in window} for window in windows
+        ]
+        if self.windowWorkers > 1:
+            self.alignWindowsInParallel(
+                doc, labels, windowImages
+            )  # logging in function
+            # the workers ran the planned alignments in their own processes
+            self.progress.setPlan(
+                self._getProgressPlan(imagesDict, dict(zip(labels, windows)))
+            )
+        for label, images in zip(labels, windowImages):
+            self._runStage(
+                doc,
+                f"windowAligned:{label}",
+                self._stageAlignWindow,
+                doc,
+                label,
+                images,
+            )  # logging in function
+        self._runStage(
+            doc, "windowsChained", self.chainWindows, doc, labels, windows
+        )  # logging in function
+        if self.coalignmentReport:
+            for label in labels:
+                self._runStage(
+                    doc,
+                    f"coalignmentReport:{label}",
+                    self.reportCoalignment,
+                    self.getChunkByLabel(doc, label),
+                )  # logging in function
+        self._runStage(
+            doc, "chunksCloned", self._stageCloneWindowChunks, doc, labels, windows
+        )
+        self.runPointCloudStages(doc, chunkNames)  # logging in function
+        self.progress.finish()
+        self.l.lwt("done.")
+        return True
+
+    def _stageAlignWindow(
+        self,
+        doc: Metashape.Metashape.Document,
+        label: str,
+        imagesDict: dict[str, list[str]],
+    ) -> None:
+        # Remove leftovers of an interrupted earlier attempt before aligning anew.
+        leftovers = [c for c in doc.chunks if c.label == label]
+        if leftovers:
+            doc.remove(leftovers)
+        self.alignWindow(self.addLabeledChunk(doc, label), imagesDict)
+
+    def alignWindow(
+        self, chunk: Metashape.Metashape.Chunk, imagesDict: dict[str, list[str]]
+    ) -> None:
+        """Adds the images of the window's surveys to chunk, matches, aligns and filters them."""
+        self._stageAddImages(chunk, imagesDict)
+        self._stageSetImageAccuracy(chunk)
+        self.matchAndAlign(chunk)
+        self.l.lwt(f"{chunk.label} matched and aligned.")
+        self.l.l(f"{chunk.label} Tie Point Count: {len(chunk.tie_points.points)}")
+        self.removeBadPointsAndRealign(chunk)  # logging in function
+
+    def alignWindowsInParallel(
+        self,
+        doc: Metashape.Metashape.Document,
+        labels: list[str],
+        windowImages: list[dict[str, list[str]]],
+    ) -> None:
+        """
+        Aligns the windows in self.windowWorkers worker processes. Every window is
+        aligned in its own project by alignWindowProject and appended to doc.
+        Worker log messages are logged in the order of the windows.
+        """
+        todo = [
+            (label, images)
+            for label, images in zip(labels, windowImages)
+            if not self.stages.isDone(f"windowAligned:{label}")
+        ]
+        if not todo:
+            return
+        windowDir = os.path.join(
+            self.outputDir, os.path.splitext(self.projectName)[0] + "_windows"
+        )
+        os.makedirs(windowDir, exist_ok=True)
+        windowProjectPaths = [
+            os.path.join(windowDir, label.replace(" ", "_") + ".psx")
+            for label, _ in todo
+        ]
+        self.l.lwt(f"Aligning {len(todo)} windows in {self.windowWorkers} processes.")
+
+        workerSettings = dict(self.settings, resume=False)
+        with self.l.stage(
+            "parallelWindows", counts=lambda: self.getObjectCounts(doc)
+        ) as record, ProcessPoolExecutor(max_workers=self.windowWorkers) as executor:
+            results = executor.map(
+                FacaCalc.alignWindowProject,
+                [workerSettings] * len(todo),
+                windowProjectPaths,
+                [label for label, _ in todo],
+                [images for _, images in todo],
+                [sorted(self.rejectedImages)] * len(todo),
+            )
+            for (label, _), windowProjectPath, (messages, timeline) in zip(
+                todo, windowProjectPaths, results
+            ):
+                for message in messages:
+                    self.l.l(message)
+                for timelineRecord in timeline:
+                    self.l.logTimeline(timelineRecord)
+                windowDoc = self.ms.Document()
+                windowDoc.open(windowProjectPath, read_only=True)
+                leftovers = [c for c in doc.chunks if c.label == label]
+                if leftovers:
+                    doc.remove(leftovers)
+                doc.append(windowDoc)
+                doc.save()
+                self.stages.setDone(f"windowAligned:{label}")
+        self.stageTimes["parallelWindows"] = record["seconds"]
+
+    @staticmethod
+    def alignWindowProject(
+        settings: dict,
+        windowProjectPath: str,
+        label: str,
+        imagesDict: dict[str, list[str]],
+        rejectedImages: list[str],
+    ) -> tuple[list[str], list[dict]]:
+        """
+        Worker of alignWindowsInParallel. Aligns the window label in a new project
+        saved at windowProjectPath.
+        Returns the log messages and timeline records instead of writing them to files.
+        """
+        logger = Logger()
+        logger.setupBuffer()
+        f = FacaCalc(logger=logger, **settings)
+        f.rejectedImages = set(rejectedImages)
+        doc = f.ms.Document()
+        chunk = f.addLabeledChunk(doc, label)
+        with logger.stage(
+            f"windowAligned:{label}", counts=lambda: f.getObjectCounts(doc)
+        ):
+            f.alignWindow(chunk, imagesDict)
+            doc.save(windowProjectPath)
+        return logger.buffer, logger.timelineBuffer
+
+    def chainWindows(
+        self,
+        doc: Metashape.Metashape.Document,
+        labels: list[str],
+        windows: list[list[str]],
+    ) -> None:
+        """
+        Transforms every window chunk into the frame of the first window.
+        The similarity transform (Helmert, 7 parameters) from each window to the
+        previous one is estimated from the estimated centers of the cameras of
+        their shared surveys, and the transforms are chained.
+        Windows sharing fewer than 3 aligned cameras with the previous window keep
+        the previous window's transform (i.e. only their georeference links them).
+        Writes <project>_windows.json with the alignment quality of every window
+        and the fit of every link.
+        """
+        chain = np.eye(4)
+        previousCenters = {}
+        report = {}
+        for i, (label, window) in enumerate(zip(labels, windows)):
+            chunk = self.getChunkByLabel(doc, label)
+            centers = self._getCameraWorldCenters(chunk)
+            aligned = sum(center is not None for center in centers.values())
+            entry = {
+                "surveys": window,
+                "cameras": len(centers),
+                "aligned": aligned,
+                "tiePoints": len(chunk.tie_points.points),
+            }
+            message = f"{label} ({', '.join(window)}): {aligned} of {len(centers)} cameras aligned, {entry['tiePoints']} tie points"
+            if i > 0:
+                shared = [s for s in window if s in windows[i - 1]]
+                paths = [
+                    path
+                    for path, center in centers.items()
+                    if center is not None and previousCenters.get(path) is not None
+                ]
+                link = {"surveys": shared, "cameras": len(paths)}
+                if len(paths) < 3:
+                    message += f", only {len(paths)} aligned cameras shared with {labels[i - 1]}, not chained"
+                else:
+                    source = [centers[path] for path in paths]
+                    transform, residuals = estimateHelmert(
+                        source, [previousCenters[path] for path in paths]
+                    )
+                    chain = chain @ transform
+                    link.update(describeTransform(transform, source))
+                    link["residualRms"] = float(np.sqrt(np.mean(residuals**2)))
+                    link["residualMax"] = float(residuals.max())
+                    message += (
+                        f", linked to {labels[i - 1]} through {len(paths)} cameras of {shared}: "
+                        f"shift {link['shift']:.3f} m, scale {link['scale']:.6f}, rotation {link['rotation']:.4f} deg, "
+                        f"residual RMS {link['residualRms']:.3f} m (max {link['residualMax']:.3f} m)"
+                    )
+                entry["link"] = link
+                matrix = self.ms.Matrix(chain.tolist())
+                if chunk.transform.matrix is not None:
+                    matrix = matrix * chunk.transform.matrix
+                chunk.transform.matrix = matrix
+            previousCenters = centers
+            report[label] = entry
+            self.l.lwt(message + ".")
+        basePath = self._getOutputBasePath("windows")
+        with open(basePath + ".json.tmp", "w") as f:
+            json.dump(report, f, indent=2)
+        os.replace(basePath + ".json.tmp", basePath + ".json")
+        self.l.logTimeline({"event": "windowChain", "windows": report})
+
+    def _stageCloneWindowChunks(
+        self,
+        doc: Metashape.Metashape.Document,
+        labels: list[str],
+        windows: list[list[str]],
+    ) -> None:
+        """Clones every survey chunk from the first window containing the survey."""
+        cloned = set()
+        for label, window in zip(labels, windows):
+            surveys = [s for s in window if s not in cloned]
+            self._stageCloneChunks(doc, self.getChunkByLabel(doc, label), surveys)
+            cloned.update(surveys)
+
+    def checkImages(self, imagesDict: dict[str, list[str]]) -> dict[str, list[str]]:
+        """
+        Logs the images of every survey, checks their metadata and pre-screens them
+        if enabled. Returns imagesDict without the images excluded by pre-screening.
+        """
         self.l.logImagesDict(imagesDict)
+        if self.metadataCache is not None:
+            with self.l.stage("imageMetadata"):
+                self.checkImageMetadata(imagesDict)  # logging in function
+        if self.prescreen != "none":
+            with self.l.stage(
+                "imagePrescreen", counts=lambda: {"rejected": len(self.rejectedImages)}
+            ):
+                imagesDict = self.prescreenImages(imagesDict)  # logging in function
+        return imagesDict
 
-        doc = Metashape.Document()
-        doc.save(os.path.join(self.outputDir, self.projectName))
-        origChunk = self.addLabeledChunk(doc, "Original")
-        self.l.lwt("Original chunk added.")
-        doc.save()
+    def runPointCloudStages(
+        self, doc: Metashape.Metashape.Document, chunkNames: list[str]
+    ) -> None:
+        """
+        Builds and exports the point clouds of the survey chunks chunkNames and runs
+        the optional voxel downsampling and change detection, skipping finished stages.
+        """
+        newChunks = [self.getChunkByLabel(doc, label) for label in chunkNames]
+        if self.parallelChunks > 1:
+            self.buildPointCloudsInParallel(doc, newChunks)  # logging in function
+            newChunks = [self.getChunkByLabel(doc, label) for label in chunkNames]
+        for chunk in newChunks:
+            self._runStage(
+                doc, f"pointCloud:{chunk.label}", self.buildPointClouds, [chunk]
+            )  # logging in function
+        if self.exportWorkers > 1:
+            self.exportPointCloudsInParallel(doc, newChunks)  # logging in function
+        for chunk in newChunks:
+            self._runStage(
+                doc, f"exported:{chunk.label}", self.exportPointClouds, [chunk]
+            )  # logging in function
+        if self.voxelSize > 0:
+            for chunk in newChunks:
+                self._runStage(
+                    doc,
+                    f"voxelized:{chunk.label}",
+                    self.voxelDownsamplePointClouds,
+                    [chunk],
+                )  # logging in function
+        if self.changeDetection != "none":
+            self._runStage(
+                doc, "changeDetection", self.detectChanges, chunkNames
+            )  # logging in function
 
-        self.addImagesByChunkName(origChunk, imagesDict)
-        self.l.lwt(f"{len(origChunk.cameras)} images added to {origChunk.label}.")
-        doc.save()
+    def openOrCreateDocument(self, projectPath: str) -> Metashape.Metashape.Document:
+        """
+        Reopens the project at projectPath if resuming and it has finished stages.
+        Otherwise creates a new project and resets the stage manifest.
+        """
+        doc = self.ms.Document()
+        if self.resume and os.path.isfile(projectPath):
+            self.stages.load()
+            if self.stages.stages:
+                doc.open(projectPath)
+                self.l.lwt(
+                    f"Resuming {projectPath}. Finished stages: {self.stages.stages}"
+                )
+                return doc
+        self.stages.reset()
+        doc.save(projectPath)
+        return doc
+
+    def _runStage(
+        self, doc: Metashape.Metashape.Document, stage: str, func, *args
+    ) -> None:
+        """
+        Runs func(*args) unless stage is already finished, then saves doc
+        and records the stage as finished. Only stages finished in an earlier
+        run are logged as skipped, e.g. not the ones a parallel helper finished.
+        """
+        if self.stages.isDone(stage):
+            if self.stages.isDoneEarlier(stage):
+                self.l.lwt(f"Skipped {stage}, already finished.")
+            return
+        self.progress.startStage(stage)
+        with self.l.stage(stage, counts=lambda: self.getObjectCounts(doc)) as record:
+            try:
+                func(*args)
+            except BaseException:
+                self.progress.abort()
+                raise
+            self.progress.finish()
+            doc.save()
+            self.stages.setDone(stage)
+        self.stageTimes[stage] = record["seconds"]
+
+    def _logProgress(self, message: dict) -> None:
+        # stages are logged by the stage functions themselves
+        if message["event"] == "progress":
+            self.l.lwt(formatProgress(message))
+
+    def _getProgressPlan(
+        self, imagesDict: dict[str, list[str]], windows: dict[str, list[str]] = None
+    ) -> list:
+        """
+        Returns the long Metashape operations main will run, for the overall ETA.
+        windows maps the window labels of mainWindows to their surveys.
+        """
+        plan = []
+        if windows is None:
+            imageCount = sum(len(images) for images in imagesDict.values())
+            if not self.stages.isDone("matchedAndAligned"):
+                plan += [("matchPhotos", imageCount), ("alignCameras", imageCount)]
+            if not self.stages.isDone("filtered"):
+                plan += self._getFilterPlan(imageCount)
+        else:
+            for label, window in windows.items():
+                if not self.stages.isDone(f"windowAligned:{label}"):
+                    imageCount = sum(len(imagesDict[name]) for name in window)
+                    plan += [("matchPhotos", imageCount), ("alignCameras", imageCount)]
+                    plan += self._getFilterPlan(imageCount)
+        for chunkName, images in imagesDict.items():
+            if not self.stages.isDone(f"pointCloud:{chunkName}"):
+                plan += [
+                    ("buildDepthMaps", len(images)),
+                    ("buildPointCloud", len(images)),
+                ]
+        for chunkName, images in imagesDict.items():
+            if not self.stages.isDone(f"exported:{chunkName}"):
+                plan += [("exportPointCloud", len(images))]
+        return plan
+
+    def _getFilterPlan(self, imageCount: int) -> list:
+        if self.filterMode != "fixed":
+            return []  # adaptive filtering passes are not known in advance
+        criterions = [c for c in self.criterionsDict if c != "None"]
+        if self.realignPolicy == "after_each":
+            return [("alignCameras", imageCount)] * len(criterions)
+        if self.realignPolicy == "optimize":
+            return [("optimizeCameras", imageCount)] * len(criterions)
+        return [("alignCameras", imageCount)] if criterions else []
+
+    def getObjectCounts(self, doc: Metashape.Metashape.Document) -> dict:
+        """Returns the camera, tie point and dense point counts of every chunk in doc."""
+        counts = {}
+        for chunk in doc.chunks:
+            counts[chunk.label] = {
+                "cameras": len(chunk.cameras),
+                "tiePoints": len(chunk.tie_points.points) if chunk.tie_points else 0,
+                "densePoints": self._getDensePointCount(chunk),
+            }
+        return counts
+
+    def _getDensePointCount(self, chunk: Metashape.Metashape.Chunk) -> int:
+        # e.g. "<PointCloud '123456 points'>"
+        if not chunk.point_cloud:
+            return 0
+        return int(str(chunk.point_cloud).split("'")[1].split(" ")[0])
+
+    def _stageAddImages(
+        self, chunk: Metashape.Metashape.Chunk, imagesDict: dict[str, list[str]]
+    ) -> None:
+        self.addImagesByChunkName(chunk, imagesDict)
+        self.l.lwt(f"{len(chunk.cameras)} images added to {chunk.label}.")
+        if self.prescreen == "disable" and self.rejectedImages:
+            rejected = {self._normPath(i) for i in self.rejectedImages}
+            disabled = 0
+            for camera in chunk.cameras:
+                if self._normPath(camera.photo.path) in rejected:
+                    camera.enabled = False
+                    disabled += 1
+            self.l.lwt(
+                f"{disabled} images below the pre-screening thresholds disabled."
+            )
+
+    def checkImageMetadata(self, imagesDict: dict[str, list[str]]) -> None:
+        """
+        Reads the EXIF/XMP metadata of all images through self.metadataCache,
+        logs image, GPS and accuracy counts, time span and cameras per survey
+        and warns if the positions or accuracies camera_accuracy relies on are missing.
+        """
+        metadata = self.metadataCache.get(
+            [i for images in imagesDict.values() for i in images]
+        )
+        surveys = {}
+        for chunkName, images in imagesDict.items():
+            survey = summarize([metadata[i] for i in images])
+            surveys[chunkName] = survey
+            self.l.lwt(
+                f"{chunkName}: {survey['images']} images, {survey['withGps']} with GPS, "
+                f"{survey['withAccuracy']} with XMP accuracy, taken {survey['first']} - {survey['last']}, "
+                f"cameras: {', '.join(survey['cameras']) or '-'}"
+            )
+            if (
+                self.cameraAccuracy == "EXIF"
+                and survey["withAccuracy"] < survey["images"]
+            ):
+                self.l.lwt(
+                    f"Warning: {survey['images'] - survey['withAccuracy']} images of {chunkName} have no XMP accuracy, "
+                    "Metashape uses its default accuracy for them."
+                )
+            if self.cameraAccuracy is not None and not survey["withGps"]:
+                self.l.lwt(
+                    f"Warning: no image of {chunkName} has a GPS position, the camera accuracy has no effect."
+                )
+        self.l.logTimeline({"event": "imageMetadata", "surveys": surveys})
+
+    def prescreenImages(self, imagesDict: dict[str, list[str]]) -> dict[str, list[str]]:
+        """
+        Scores all images (see ImagePrescreener) and stores the images below
+        self.prescreenMinSharpness or above self.prescreenMaxClipped in self.rejectedImages.
+        Images that can't be decoded are kept. Returns imagesDict without the
+        rejected images if self.prescreen is "exclude", otherwise imagesDict.
+        """
+        prescreener = ImagePrescreener(
+            self.prescreenCache, maxWorkers=self.prescreenWorkers
+        )
+        try:
+            scores = prescreener.score(
+                [i for images in imagesDict.values() for i in images]
+            )
+        finally:
+            prescreener.close()
+        self.rejectedImages = set()
+        for chunkName, images in imagesDict.items():
+            rejected = [
+                i
+                for i in images
+                if scores[i] is not None
+                and (
+                    scores[i]["sharpness"] < self.prescreenMinSharpness
+                    or scores[i]["clipped"] > self.prescreenMaxClipped
+                )
+            ]
+            self.rejectedImages.update(rejected)
+            sharpness = sorted(scores[i]["sharpness"] for i in images if scores[i])
+            medianStr = f"{sharpness[len(sharpness) // 2]:.1f}" if sharpness else "-"
+            unreadable = sum(scores[i] is None for i in images)
+            self.l.lwt(
+                f"{chunkName}: {len(rejected)} of {len(images)} images below the pre-screening thresholds "
+                f"(median sharpness {medianStr}, {unreadable} images could not be decoded)."
+            )
+        if self.prescreen == "exclude":
+            return {
+                chunkName: [i for i in images if i not in self.rejectedImages]
+                for chunkName, images in imagesDict.items()
+            }
+        return imagesDict
 
-        self.setImageAccuracy(origChunk)
+    def _stageSetImageAccuracy(self, chunk: Metashape.Metashape.Chunk) -> None:
+        self.setImageAccuracy(chunk)
         self.l.lwt(f"Image Accuracy set to {self.cameraAccuracy}.")
-        doc.save()
 
-        self.matchAndAlign(origChunk)
-        self.l.lwt(f"{origChunk.label} matched and aligned.")
+    def _stageMatchAndAlign(
+        self, doc: Metashape.Metashape.Document, chunk: Metashape.Metashape.Chunk
+    ) -> None:
+        self.matchAndAlign(chunk)
+        if self.keepKeypoints:
+            self.stages.setDone("keypointsKept")
+        else:
+            self.stages.setNotDone(["keypointsKept"])
+        self.l.lwt(f"{chunk.label} matched and aligned.")
+        self.l.l(f"{chunk.label} Tie Point Count: {len(chunk.tie_points.points)}")
+        if self.alignmentCache is not None:
+            self.storeCachedAlignment(doc, chunk)
+
+    def _stageAppendSurvey(
+        self, chunk: Metashape.Metashape.Chunk, imagesDict: dict[str, list[str]]
+    ) -> None:
+        self._stageAddImages(chunk, imagesDict)
+        self.setImageAccuracy(chunk)
+        self.matchAndAlign(chunk, incremental=True)
+        self.l.lwt(f"{self.appendSurvey} matched and aligned to {chunk.label}.")
+        self.l.l(f"{chunk.label} Tie Point Count: {len(chunk.tie_points.points)}")
+
+    def _stageCloneAppendedChunks(
+        self,
+        doc: Metashape.Metashape.Document,
+        origChunk: Metashape.Metashape.Chunk,
+        chunkNames: list[str],
+    ) -> None:
+        """
+        Clones the chunk of the appended survey and the chunks of the existing
+        surveys that moved more than self.appendShiftTolerance, whose point cloud
+        stages (and the change detection) are marked as not done.
+        """
+        shifts = self.getSurveyShifts(
+            doc,
+            origChunk,
+            [label for label in chunkNames if label != self.appendSurvey],
+        )
+        moved = []
+        for label, shift in shifts.items():
+            self.l.lwt(
+                f"{label} cameras moved by max {shift['max']:.3f} m (RMS {shift['rms']:.3f} m, "
+                f"{shift['alignmentChanged']} cameras aligned only before or after appending)."
+            )
+            if shift["max"] > self.appendShiftTolerance:
+                moved.append(label)
+        self.l.lwt(
+            f"{len(moved)} surveys moved more than {self.appendShiftTolerance:g} m and are rebuilt: {moved}"
+        )
+        self.l.logTimeline(
+            {
+                "event": "appendSurvey",
+                "survey": self.appendSurvey,
+                "shifts": shifts,
+                "rebuilt": moved,
+            }
+        )
+        for label in moved:
+            self.stages.setNotDone(
+                [f"pointCloud:{label}", f"exported:{label}", f"voxelized:{label}"]
+            )
+        self.stages.setNotDone(["changeDetection"])
+        self._stageCloneChunks(doc, origChunk, [self.appendSurvey] + moved)
+
+    def getSurveyShifts(
+        self,
+        doc: Metashape.Metashape.Document,
+        origChunk: Metashape.Metashape.Chunk,
+        labels: list[str],
+    ) -> dict[str, dict]:
+        """
+        Compares the camera positions of the survey chunks labels (clones of the
+        alignment before appending) with the same cameras in origChunk.
+        Returns the max and RMS distance (m) per survey and the number of cameras
+        that are aligned in only one of the chunks, which counts as infinite shift.
+        """
+        origCenters = self._getCameraWorldCenters(origChunk)
+        shifts = {}
+        for label in labels:
+            distances = []
+            alignmentChanged = 0
+            for path, center in self._getCameraWorldCenters(
+                self.getChunkByLabel(doc, label)
+            ).items():
+                origCenter = origCenters.get(path)
+                if center is None and origCenter is None:
+                    continue
+                if center is None or origCenter is None:
+                    alignmentChanged += 1
+                    continue
+                distances.append(math.dist(center, origCenter))
+            shifts[label] = {
+                "max": (math.inf if alignmentChanged else max(distances, default=0.0)),
+                "rms": math.sqrt(sum(d**2 for d in distances) / max(len(distances), 1)),
+                "alignmentChanged": alignmentChanged,
+            }
+        return shifts
+
+    def _getCameraWorldCenters(self, chunk: Metashape.Metashape.Chunk) -> dict:
+        """
+        Returns the estimated camera centers of chunk (geocentric if the chunk is
+        referenced, None for unaligned cameras) by normalized photo path.
+        """
+        matrix = chunk.transform.matrix
+        centers = {}
+        for camera in chunk.cameras:
+            center = camera.center if camera.transform is not None else None
+            if center is not None and matrix is not None:
+                center = matrix.mulp(center)
+            centers[self._normPath(camera.photo.path)] = (
+                None if center is None else tuple(center)
+            )
+        return centers
+
+    def _getMatchingParams(self) -> dict:
+        """Parameters that influence the result of stages up to matchAndAlign."""
+        params = {
+            "metashape_version": self.ms.version,
+            "alignment_accuracy": self.alignmentAccuracy,
+            "camera_accuracy": self.cameraAccuracy,
+            "keypoint_limit": self.keypointLimit,
+            "tiepoint_limit": self.tiepointLimit,
+        }
+        if self.keepKeypoints:
+            params["keep_keypoints"] = True
+        if self.preselection != "default":
+            params["preselection"] = self.preselection
+            params["preselection_radius"] = self.preselectionRadius
+        if self.prescreen == "disable" and self.rejectedImages:
+            params["disabled_images"] = sorted(self.rejectedImages)
+        return params
+
+    def loadCachedAlignment(
+        self,
+        doc: Metashape.Metashape.Document,
+        origChunk: Metashape.Metashape.Chunk,
+        imagesDict: dict[str, list[str]],
+    ) -> Metashape.Metashape.Chunk:
+        """
+        Replaces origChunk by the cached aligned chunk for the same images and
+        matching parameters, if there is one, and marks the stages up to
+        matchedAndAligned as finished. Returns the (new) "Original" chunk.
+        """
+        self.alignmentCacheKey = self.alignmentCache.getKey(
+            imagesDict, self._getMatchingParams()
+        )
+        if self.stages.isDone("matchedAndAligned"):
+            return origChunk
+        cachedProjectPath = self.alignmentCache.lookup(self.alignmentCacheKey)
+        if cachedProjectPath is None:
+            self.l.lwt(f"No cached alignment found for {self.alignmentCacheKey}.")
+            return origChunk
+        cacheDoc = self.ms.Document()
+        cacheDoc.open(cachedProjectPath, read_only=True)
+        doc.remove([origChunk])
+        doc.append(cacheDoc)
+        doc.save()
+        for stage in ("imagesAdded", "accuracySet", "matchedAndAligned"):
+            self.stages.setDone(stage)
+        if self.keepKeypoints:
+            self.stages.setDone("keypointsKept")
+        origChunk = self.getChunkByLabel(doc, "Original")
+        self.l.lwt(f"Reused cached alignment {cachedProjectPath}.")
         self.l.l(
             f"{origChunk.label} Tie Point Count: {len(origChunk.tie_points.points)}"
         )
-        doc.save()
+        return origChunk
 
-        self.removeBadPointsAndRealign(origChunk)  # logging in function
-        doc.save()
+    def storeCachedAlignment(
+        self, doc: Metashape.Metashape.Document, chunk: Metashape.Metashape.Chunk
+    ) -> None:
+        """Saves the aligned chunk as new project in the alignment cache."""
+        cachedProjectPath = self.alignmentCache.getNewProjectPath(
+            self.alignmentCacheKey
+        )
+        cacheDoc = self.ms.Document()
+        cacheDoc.append(doc, chunks=[chunk])
+        cacheDoc.save(cachedProjectPath)
+        self.alignmentCache.commit(
+            self.alignmentCacheKey, cachedProjectPath, self._getMatchingParams()
+        )
+        self.l.lwt(f"Alignment cached in {cachedProjectPath}.")
 
+    def _stageCloneChunks(
+        self,
+        doc: Metashape.Metashape.Document,
+        origChunk: Metashape.Metashape.Chunk,
+        chunkNames: list[str],
+    ) -> None:
+        # Remove leftovers of an interrupted earlier attempt before cloning anew.
+        leftovers = [c for c in doc.chunks if c.label in chunkNames]
+        if leftovers:
+            doc.remove(leftovers)
         newChunks = self.CloneChunkNewLabels(origChunk, chunkNames)
         self.l.lwt(f"New Chunks created: {chunkNames}")
         self.removeCameraGroupsUnequalChunkName(newChunks)
         self.l.lwt(f"Removed images from other surveys.")
         self.l.logNewChunkInfos(newChunks)
-        doc.save()
 
-        self.buildPointClouds(newChunks)  # logging in function
-        doc.save()
+    def reportCoalignment(self, chunk: Metashape.Metashape.Chunk) -> None:
+        """
+        Writes <project>_coalignment.json and <project>_coalignment_cameras.csv
+        (see CoalignmentReport, with the chunk label appended for windows)
+        of the aligned chunk and logs the summary per survey.
+        """
+        report = CoalignmentReport(self.ms)
+        surveys = report.compute(chunk)
+        report.save(self._getOutputBasePath("coalignment", chunk))
+        for label, survey in surveys.items():
+            error = survey["referenceError"]
+            errorStr = (
+                f"reference error RMS {error['rms']:.3f} m (x {error['rmsX']:.3f}, y {error['rmsY']:.3f}, z {error['rmsZ']:.3f})"
+                if error["count"]
+                else "no reference positions"
+            )
+            reprojectionStr = (
+                f"{survey['reprojectionRms']:.3f} px"
+                if survey["reprojectionRms"] is not None
+                else "-"
+            )
+            self.l.lwt(
+                f"{label} co-alignment: {survey['aligned']} of {survey['cameras']} cameras aligned, "
+                f"{errorStr}, reprojection RMS {reprojectionStr}, "
+                f"{survey['sharedTiePoints']} of {survey['tiePoints']} tie points shared with other surveys."
+            )
+        self.l.logTimeline({"event": "coalignmentReport", "surveys": surveys})
 
-        self.exportPointClouds(newChunks)  # logging in function
-        doc.save()
-        self.l.lwt("done.")
+    def _getOutputBasePath(
+        self, name: str, chunk: Metashape.Metashape.Chunk = None
+    ) -> str:
+        """
+        Returns <output dir>/<project>_<name>, followed by _<chunk label>
+        for chunks other than "Original" (e.g. windows).
+        """
+        basePath = os.path.join(
+            self.outputDir, os.path.splitext(self.projectName)[0] + "_" + name
+        )
+        if chunk is not None and chunk.label != "Original":
+            basePath += "_" + chunk.label.replace(" ", "_")
+        return basePath
 
     def addLabeledChunk(
         self, doc: Metashape.Metashape.Document, label: str
@@ -181,9 +1339,13 @@ class FacaCalc:
     def CloneChunkNewLabels(
         self, inChunk, newLabels: list[str]
     ) -> list[Metashape.Chunk]:
+        """
+        Returns a copy of inChunk for every label in newLabels.
+        Key points are not copied, the survey chunks do not need them after matching.
+        """
         newChunks = []
         for label in newLabels:
-            newChunk = inChunk.copy()
+            newChunk = inChunk.copy(keypoints=False)
             newChunk.label = label
             newChunks.append(newChunk)
         return newChunks
@@ -194,15 +1356,17 @@ class FacaCalc:
         """
         Retrieves images recursivly for each subdirectory (chunkNames) in folder.
         Returns a dictionary where keys are chunkNames and values are lists of their image file paths.
+        Uses the shared faca_index.imageIndex (case insensitive, surveys walked concurrently).
         """
-        imagesDict = {}
-        for c in chunkNames:
-            chunkPath = os.path.join(folder, c)
-            chunkImageList = glob.glob(
-                chunkPath + f"{os.path.sep}**{os.path.sep}*.JPG", recursive=True
-            )
-            imagesDict[c] = chunkImageList
-        return imagesDict
+        return imageIndex.getImagesByChunkName(folder, chunkNames)
+
+    def getChunkByLabel(
+        self, doc: Metashape.Metashape.Document, label: str
+    ) -> Metashape.Metashape.Chunk:
+        for chunk in doc.chunks:
+            if chunk.label == label:
+                return chunk
+        return None
 
     def getCameraGroupByLabel(
         chunk: Metashape.Metashape.Chunk, label: str
@@ -215,15 +1379,18 @@ class FacaCalc:
 
     def getChunkNames(self, folder: str) -> list[str]:
         """
-        Returns the names of subdirectories within folder.
+        Returns the names of the (not hidden) subdirectories within folder, see ImageIndex.
         Expects folder to contain at least two subdirectories, as each subdirectory represents a survey.
         """
-        chunkNames = [os.path.basename(f) for f in os.scandir(folder) if f.is_dir()]
+        chunkNames = imageIndex.getSubdirNames(folder)
+        self._checkChunkCount(chunkNames)
+        return chunkNames
+
+    def _checkChunkCount(self, chunkNames: list[str]) -> None:
         if len(chunkNames) < 2:
             raise ValueError(
                 f"Expected >= 2 subfolders in Image Directory. Found {len(chunkNames)}: {chunkNames}"
             )
-        return chunkNames
 
     def addImagesByChunkName(
         self, chunk: Metashape.Metashape.Chunk, imagesDict: dict[str, list[str]]
@@ -232,17 +1399,37 @@ class FacaCalc:
         Adds images (imagesDict values) to chunk
         and organizes them into camera groups based on chunknames (imagesDict keys).
         Loads accuracy information from xmp metadata if self.cameraAccuracy == "EXIF".
+        All images are added with a single addPhotos call and every new camera
+        is touched exactly once to assign its group.
         """
         if self.cameraAccuracy == "EXIF":
             loadXmpAccuracy = True
         else:
             loadXmpAccuracy = False
+        allImages = []
+        imageGroups = []  # camera group of each image in allImages
         for chunkName, images in imagesDict.items():
             cameraGroup = self.addLabeledCameraGroup(chunk, chunkName)
-            chunk.addPhotos(images, load_xmp_accuracy=loadXmpAccuracy)
-            for camera in chunk.cameras:
-                if not camera.group:
-                    camera.group = cameraGroup
+            allImages.extend(images)
+            imageGroups.extend([cameraGroup] * len(images))
+        firstNewCamera = len(chunk.cameras)
+        chunk.addPhotos(allImages, load_xmp_accuracy=loadXmpAccuracy)
+        newCameras = chunk.cameras[firstNewCamera:]
+        if len(newCameras) != len(allImages):
+            # Metashape skipped some images, match the remaining ones by path.
+            groupsByPath = {
+                self._normPath(image): group
+                for image, group in zip(allImages, imageGroups)
+            }
+            imageGroups = [
+                groupsByPath[self._normPath(camera.photo.path)] for camera in newCameras
+            ]
+        for camera, cameraGroup in zip(newCameras, imageGroups):
+            camera.group = cameraGroup
+
+    def _normPath(self, path: str) -> str:
+        # Metashape may store photo paths with other separators or casing (Windows).
+        return os.path.normcase(os.path.abspath(path))
 
     def setImageAccuracy(self, chunk: Metashape.Metashape.Chunk) -> None:
         """
@@ -255,37 +1442,362 @@ class FacaCalc:
             camera.reference.accuracy = accuracyVector
 
     def _getAccuracyFromString(self) -> Metashape.Vector:
-        return Metashape.Vector(list(map(float, self.cameraAccuracy.split(","))))
+        return self.ms.Vector(list(map(float, self.cameraAccuracy.split(","))))
 
-    def matchAndAlign(self, chunk: Metashape.Metashape.Chunk) -> None:
+    def matchAndAlign(
+        self, chunk: Metashape.Metashape.Chunk, incremental: bool = False
+    ) -> None:
+        """
+        Matches and aligns the cameras of chunk. If incremental, the existing
+        matches and alignment are kept, so only the new cameras are matched
+        and aligned. The key points are kept if incremental or self.keepKeypoints,
+        incremental matching needs them.
+        """
+        imageCount = len(chunk.cameras)
+        matchArgs = self._getPreselectionArgs(
+            chunk, self.appendSurvey if incremental else None
+        )
+        alignArgs = {}
+        if incremental or self.keepKeypoints:
+            matchArgs["keep_keypoints"] = True
+        if incremental:
+            matchArgs["reset_matches"] = False
+            alignArgs["reset_alignment"] = False
         chunk.matchPhotos(
             downscale=self.alignmentAccuracy,
             keypoint_limit=self.keypointLimit,
             tiepoint_limit=self.tiepointLimit,
+            progress=self.progress.callback("matchPhotos", imageCount),
+            **matchArgs,
+        )
+        chunk.alignCameras(
+            progress=self.progress.callback("alignCameras", imageCount), **alignArgs
         )
-        chunk.alignCameras()
+
+    def _getPreselectionArgs(
+        self, chunk: Metashape.Metashape.Chunk, newGroup: str = None
+    ) -> dict:
+        """
+        Returns the matchPhotos preselection arguments of self.preselection.
+        newGroup is the label of the camera group matched incrementally.
+        """
+        if self.preselection == "default":
+            return {}
+        if self.preselection == "spatial":
+            pairs = self.getSpatialPairs(chunk, newGroup)
+            if pairs is not None:
+                return {
+                    "pairs": pairs,
+                    "generic_preselection": True,
+                    "reference_preselection": False,
+                }
+            self.l.lwt("Falling back to Metashape's default preselection.")
+            return {}
+        return {
+            "generic_preselection": self.preselection in ("generic", "reference"),
+            "reference_preselection": self.preselection == "reference",
+            **(
+                {"reference_preselection_mode": self.ms.ReferencePreselectionSource}
+                if self.preselection == "reference"
+                else {}
+            ),
+        }
+
+    def getSpatialPairs(
+        self, chunk: Metashape.Metashape.Chunk, newGroup: str = None
+    ) -> list:
+        """
+        Returns the (camera key, camera key) pairs of all cameras of chunk closer than
+        self.preselectionRadius (horizontal distance of their reference positions,
+        default 5 x the median camera spacing within the surveys), within and across surveys. Cameras without reference position are paired with all cameras.
+        If newGroup (a camera group label) is given, only pairs with at least one camera
+        of newGroup are returned, the other cameras are matched already.
+        Returns None if fewer than two cameras have a reference position.
+        """
+        cameras = chunk.cameras
+        positions, located = self._getCameraPlanePositions(chunk, cameras)
+        if located.sum() < 2:
+            self.l.lwt("Spatial preselection needs camera reference positions (GPS).")
+            return None
+        groups = np.array([id(c.group) for c in cameras])
+        radius = self.preselectionRadius
+        if not radius:
+            # spacing within every survey, repeat flights may share camera positions
+            spacings = [
+                estimateSpacing(positions[located & (groups == group)])
+                for group in np.unique(groups[located])
+            ]
+            spacings = [spacing for spacing in spacings if spacing > 0]
+            radius = 5 * float(np.median(spacings)) if spacings else 0.0
+        if radius <= 0:
+            self.l.lwt(
+                "Spatial preselection can't estimate the camera spacing, set preselection_radius."
+            )
+            return None
+        indices = np.flatnonzero(located)
+        pairs = indices[getCandidatePairs(positions[located], radius)]
+        unlocated = np.flatnonzero(~located)
+        if unlocated.size:
+            i, j = np.meshgrid(unlocated, np.arange(len(cameras)), indexing="ij")
+            keep = (i != j) & ~((j < i) & ~located[j])  # unlocated pairs once
+            pairs = np.concatenate([pairs, np.column_stack([i[keep], j[keep]])])
+        allPairs = len(cameras) * (len(cameras) - 1) // 2
+        if newGroup is not None:
+            new = np.array(
+                [c.group is not None and c.group.label == newGroup for c in cameras]
+            )
+            pairs = pairs[new[pairs[:, 0]] | new[pairs[:, 1]]]
+            oldCount = len(cameras) - int(new.sum())
+            allPairs -= oldCount * (oldCount - 1) // 2
+        within = int(np.sum(groups[pairs[:, 0]] == groups[pairs[:, 1]]))
+        self.l.lwt(
+            f"Spatial preselection: {len(pairs)} of {allPairs} camera pairs ({100 * len(pairs) / max(allPairs, 1):.1f} %) "
+            f"within {radius:.1f} m, {within} within and {len(pairs) - within} across surveys, "
+            f"{unlocated.size} cameras without position."
+        )
+        self.l.logTimeline(
+            {
+                "event": "preselection",
+                "pairs": len(pairs),
+                "allPairs": allPairs,
+                "radius": radius,
+                "withinSurveys": within,
+                "acrossSurveys": len(pairs) - within,
+                "unlocatedCameras": int(unlocated.size),
+            }
+        )
+        return [(cameras[i].key, cameras[j].key) for i, j in pairs.tolist()]
+
+    def _getCameraPlanePositions(
+        self, chunk: Metashape.Metashape.Chunk, cameras: list
+    ) -> tuple:
+        """
+        Returns the (n, 2) east/north positions in m (relative to their center) of the
+        reference locations of cameras and the mask of cameras with reference location.
+        """
+        located = np.array([c.reference.location is not None for c in cameras])
+        positions = np.zeros((len(cameras), 2))
+        if chunk.crs is None or not located.any():
+            return positions, np.zeros(len(cameras), dtype=bool)
+        geocentric = np.array(
+            [
+                list(chunk.crs.unproject(c.reference.location))
+                for c, isLocated in zip(cameras, located)
+                if isLocated
+            ]
+        )
+        center = geocentric.mean(axis=0)
+        frame = chunk.crs.localframe(self.ms.Vector(center.tolist()))
+        # rows: east, north and up of the local frame at the center
+        rotation = np.array(
+            [list(frame.mulv(self.ms.Vector(axis))) for axis in np.eye(3).tolist()]
+        ).T
+        positions[located] = ((geocentric - center) @ rotation.T)[:, :2]
+        return positions, located
 
     def removeBadPointsAndRealign(self, chunk: Metashape.Metashape.Chunk) -> None:
+        """
+        Removes the tie points beyond the value of every criterion and
+        realigns the cameras as defined by self.realignPolicy:
+        after_each criterion (alignCameras), once_at_end (alignCameras) or
+        optimize (optimizeCameras after each criterion).
+        Tie point counts and timings of every criterion are written to the timeline.
+        """
+        if self.recordTiePointStats:
+            self.tiePointStats = TiePointStats(self.ms)
+            self._addTiePointStats(chunk, "unfiltered")
+        if self.filterMode == "adaptive":
+            self.removeBadPointsAdaptive(chunk)
+            return
+        filtered = False
         for criterionStr, criterionValue in self.criterionsDict.items():
             criterion = self._getCriterionFromString(criterionStr)
             if criterion:  # do nothing is criterion is None
-                filter = Metashape.TiePoints.Filter()
+                before = len(chunk.tie_points.points)
+                start = time.perf_counter()
+                filter = self.ms.TiePoints.Filter()
                 filter.init(chunk, criterion)
                 filter.removePoints(criterionValue)
-                chunk.alignCameras(adaptive_fitting=True, reset_alignment=False)
+                filterSeconds = time.perf_counter() - start
+                filtered = True
+                realignSeconds = 0.0
+                if self.realignPolicy != "once_at_end":
+                    realignSeconds = self._realign(
+                        chunk, optimize=self.realignPolicy == "optimize"
+                    )
                 self.l.lwt(
                     f"{chunk.label} Tie Point Count after filtering with {criterionStr} and {criterionValue}: {len(chunk.tie_points.points)}"
                 )
+                self._logFilterPass(
+                    chunk,
+                    criterionStr,
+                    criterionValue,
+                    before,
+                    filterSeconds,
+                    realignSeconds,
+                )
+                self._addTiePointStats(chunk, f"{criterionStr} {criterionValue:g}")
+        if filtered and self.realignPolicy == "once_at_end":
+            seconds = self._realign(chunk, optimize=False)
+            self.l.lwt(f"{chunk.label} cameras realigned after filtering.")
+            self.l.logTimeline(
+                {
+                    "event": "realign",
+                    "chunk": chunk.label,
+                    "policy": self.realignPolicy,
+                    "tiePoints": len(chunk.tie_points.points),
+                    "seconds": seconds,
+                }
+            )
+
+    def _realign(self, chunk: Metashape.Metashape.Chunk, optimize: bool) -> float:
+        """Refines the camera alignment after filtering. Returns the seconds it took."""
+        start = time.perf_counter()
+        progress = self.progress.callback(
+            "optimizeCameras" if optimize else "alignCameras", len(chunk.cameras)
+        )
+        if optimize:
+            chunk.optimizeCameras(adaptive_fitting=True, progress=progress)
+        else:
+            chunk.alignCameras(
+                adaptive_fitting=True, reset_alignment=False, progress=progress
+            )
+        return time.perf_counter() - start
+
+    def _logFilterPass(
+        self,
+        chunk: Metashape.Metashape.Chunk,
+        criterionStr: str,
+        threshold: float,
+        before: int,
+        filterSeconds: float,
+        realignSeconds: float,
+    ) -> None:
+        """Writes the tie point counts and timings of a filter pass to the timeline."""
+        self.l.logTimeline(
+            {
+                "event": "filterPass",
+                "chunk": chunk.label,
+                "mode": self.filterMode,
+                "policy": self.realignPolicy,
+                "criterion": criterionStr,
+                "threshold": threshold,
+                "tiePointsBefore": before,
+                "tiePointsAfter": len(chunk.tie_points.points),
+                "filterSeconds": filterSeconds,
+                "realignSeconds": realignSeconds,
+            }
+        )
+
+    def removeBadPointsAdaptive(self, chunk: Metashape.Metashape.Chunk) -> None:
+        """
+        Removes tie points in passes until the criterion values are reached.
+        Every pass takes the threshold from the current value distribution
+        (Filter.values), so at most self.filterMaxRemoval percent of the tie
+        points are removed per pass. Cameras are only optimized once at least
+        self.filterMinRemovalToOptimize percent of the tie points were removed
+        since the last optimization, and once at the end.
+        ImageCount is not iterated, its values do not change between passes.
+        """
+        removedSinceOptimize = 0.0  # percent
+        for criterionStr, target in self.criterionsDict.items():
+            criterion = self._getCriterionFromString(criterionStr)
+            if not criterion:
+                continue
+            iterations = 1 if criterionStr == "ImageCount" else self.filterMaxIterations
+            for iteration in range(1, iterations + 1):
+                start = time.perf_counter()
+                filter = self.ms.TiePoints.Filter()
+                filter.init(chunk, criterion)
+                before = len(chunk.tie_points.points)
+                if criterionStr == "ImageCount":
+                    threshold = target
+                else:
+                    threshold = self._getAdaptiveThreshold(filter.values, target)
+                    if threshold is None:
+                        break
+                filter.removePoints(threshold)
+                filterSeconds = time.perf_counter() - start
+                after = len(chunk.tie_points.points)
+                removed = 100 * (before - after) / before if before else 0.0
+                self.l.lwt(
+                    f"{chunk.label} {criterionStr} pass {iteration}: threshold {threshold:g}, removed {removed:.1f} %, Tie Point Count: {after}"
+                )
+                if after == before:
+                    break
+                self._addTiePointStats(chunk, f"{criterionStr} pass {iteration}")
+                removedSinceOptimize += removed
+                realignSeconds = 0.0
+                if removedSinceOptimize >= self.filterMinRemovalToOptimize:
+                    realignSeconds = self._realign(chunk, optimize=True)
+                    self.l.lwt(f"{chunk.label} cameras optimized.")
+                    removedSinceOptimize = 0.0
+                self._logFilterPass(
+                    chunk,
+                    criterionStr,
+                    threshold,
+                    before,
+                    filterSeconds,
+                    realignSeconds,
+                )
+            else:
+                if criterionStr != "ImageCount":
+                    filter = self.ms.TiePoints.Filter()
+                    filter.init(chunk, criterion)
+                    reached = max(filter.values, default=0.0)
+                    if reached > target:
+                        self.l.lwt(
+                            f"Warning: {chunk.label} {criterionStr} reached {reached:g} after {iterations} passes, "
+                            f"target {target:g} not reached. Increase filter_max_iterations or filter_max_removal."
+                        )
+        if removedSinceOptimize > 0:
+            self._realign(chunk, optimize=True)
+            self.l.lwt(f"{chunk.label} cameras optimized.")
+
+    def _addTiePointStats(self, chunk: Metashape.Metashape.Chunk, name: str) -> None:
+        """Adds the statistics of the current tie points and saves all statistics."""
+        if self.tiePointStats is None:
+            return
+        record = self.tiePointStats.addPass(chunk, name)
+        self.tiePointStats.save(self._getOutputBasePath("tiepoint_stats", chunk))
+        medians = ", ".join(
+            f"{c} {summary['percentiles']['50']:.3g}"
+            for c, summary in record["criterions"].items()
+            if summary["count"]
+        )
+        self.l.l(f"{chunk.label} Tie Point medians ({name}): {medians}")
+
+    def _getAdaptiveThreshold(self, values, target: float) -> float:
+        """
+        Returns the removal threshold of the next adaptive filter pass:
+        the target or, if more than self.filterMaxRemoval percent of the
+        values exceed it, the (100 - filterMaxRemoval) percentile.
+        Returns None if no value exceeds the target.
+        """
+        if np is not None:
+            values = np.asarray(values, dtype=np.float64)
+            if not values.size or values.max() <= target:
+                return None
+            return max(
+                target, float(np.percentile(values, 100 - self.filterMaxRemoval))
+            )
+        values = sorted(values)
+        if not values or values[-1] <= target:
+            return None
+        index = min(
+            int(len(values) * (100 - self.filterMaxRemoval) / 100), len(values) - 1
+        )
+        return max(target, values[index])
 
     def _getCriterionFromString(self, string: str):
         if string == "ImageCount":
-            return Metashape.TiePoints.Filter.ImageCount
+            return self.ms.TiePoints.Filter.ImageCount
         elif string == "ProjectionAccuracy":
-            return Metashape.TiePoints.Filter.ProjectionAccuracy
+            return self.ms.TiePoints.Filter.ProjectionAccuracy
         elif string == "ReconstructionUncertainty":
-            return Metashape.TiePoints.Filter.ReconstructionUncertainty
+            return self.ms.TiePoints.Filter.ReconstructionUncertainty
         elif string == "ReprojectionError":
-            return Metashape.TiePoints.Filter.ReprojectionError
+            return self.ms.TiePoints.Filter.ReprojectionError
         elif string == "None":
             return None
         raise ValueError(f"No Criterion for String '{string}' found.")
@@ -293,51 +1805,314 @@ class FacaCalc:
     def removeCameraGroupsUnequalChunkName(
         self, chunks: list[Metashape.Metashape.Chunk]
     ) -> None:
+        """
+        Removes every camera group (and its cameras) whose label differs from the
+        chunk label with a single remove call per chunk.
+        """
         for chunk in chunks:
-            for camera in chunk.cameras:
-                if camera.group.label != chunk.label:
-                    chunk.remove(camera.group)
+            foreignGroups = [
+                cg for cg in chunk.camera_groups if cg.label != chunk.label
+            ]
+            if foreignGroups:
+                chunk.remove(foreignGroups)
 
     def buildPointClouds(self, chunks: list[Metashape.Metashape.Chunk]) -> None:
         """
         First generates depth maps from depth map filter mode and quality and then dense PCs.
+        Then removes points below self.denseConfidenceMin and thins the point clouds
+        to self.densePointSpacing, if set.
         """
         filterMode = self._getFilterModeFromString(self.depthMapFiltering)
         for chunk in chunks:
             # downscale: (1 - Ultra high, 2 - High, 4 - Medium, 8 - Low, 16 - Lowest)
+            imageCount = len(chunk.cameras)
             chunk.buildDepthMaps(
                 downscale=self.depthMapQuality,
                 filter_mode=filterMode,
+                progress=self.progress.callback("buildDepthMaps", imageCount),
             )
             self.l.lwt(f"{chunk.label} Depth Map build with {self.depthMapFiltering}.")
-            chunk.buildPointCloud()
-            densePointsStr = str(chunk.point_cloud).split("'")[1].split(" ")[0]
+            chunk.buildPointCloud(
+                point_confidence=self.denseConfidenceMin > 0,
+                progress=self.progress.callback("buildPointCloud", imageCount),
+            )
             self.l.lwt(
-                f"{chunk.label} Point Cloud build. Point Count: {densePointsStr}"
+                f"{chunk.label} Point Cloud build. Point Count: {self._getDensePointCount(chunk)}"
+            )
+            if self.denseConfidenceMin > 0:
+                self.removeLowConfidencePoints(chunk)
+            if self.densePointSpacing > 0:
+                chunk.filterPointCloud(
+                    point_spacing=self.densePointSpacing,
+                    progress=self.progress.callback("filterPointCloud", imageCount),
+                )
+                self.l.lwt(
+                    f"{chunk.label} Point Cloud thinned to {self.densePointSpacing} m point spacing. Point Count: {self._getDensePointCount(chunk)}"
+                )
+
+    def removeLowConfidencePoints(self, chunk: Metashape.Metashape.Chunk) -> None:
+        """Removes all dense points with a confidence below self.denseConfidenceMin."""
+        pointCloud = chunk.point_cloud
+        pointCloud.setConfidenceFilter(0, self.denseConfidenceMin - 1)
+        pointCloud.removePoints(list(range(128)))  # all point classes
+        pointCloud.resetFilters()
+        self.l.lwt(
+            f"{chunk.label} Points with confidence < {self.denseConfidenceMin} removed. Point Count: {self._getDensePointCount(chunk)}"
+        )
+
+    def buildPointCloudsInParallel(
+        self, doc: Metashape.Metashape.Document, chunks: list[Metashape.Metashape.Chunk]
+    ) -> None:
+        """
+        Builds and exports the point clouds of chunks in self.parallelChunks worker processes.
+        Every chunk is saved as its own project, processed by buildChunkProject and
+        appended back to doc, replacing the original chunk.
+        Worker log messages are logged in the order of chunks.
+        """
+        chunks = [c for c in chunks if not self.stages.isDone(f"pointCloud:{c.label}")]
+        if not chunks:
+            return
+        chunkDir = os.path.join(
+            self.outputDir, os.path.splitext(self.projectName)[0] + "_chunks"
+        )
+        os.makedirs(chunkDir, exist_ok=True)
+        chunkProjectPaths = []
+        for chunk in chunks:
+            chunkProjectPath = os.path.join(chunkDir, chunk.label + ".psx")
+            chunkDoc = self.ms.Document()
+            chunkDoc.append(doc, chunks=[chunk])
+            chunkDoc.save(chunkProjectPath)
+            chunkProjectPaths.append(chunkProjectPath)
+        self.l.lwt(
+            f"Building {len(chunks)} Point Clouds in {self.parallelChunks} processes."
+        )
+
+        workerSettings = dict(self.settings, resume=False)
+        with self.l.stage(
+            "parallelPointClouds", counts=lambda: self.getObjectCounts(doc)
+        ) as record, ProcessPoolExecutor(max_workers=self.parallelChunks) as executor:
+            results = executor.map(
+                FacaCalc.buildChunkProject,
+                [workerSettings] * len(chunks),
+                chunkProjectPaths,
             )
+            for chunk, chunkProjectPath, (messages, timeline) in zip(
+                chunks, chunkProjectPaths, results
+            ):
+                for message in messages:
+                    self.l.l(message)
+                for timelineRecord in timeline:
+                    self.l.logTimeline(timelineRecord)
+                chunkDoc = self.ms.Document()
+                chunkDoc.open(chunkProjectPath, read_only=True)
+                label = chunk.label
+                doc.remove([chunk])
+                doc.append(chunkDoc)
+                doc.save()
+                self.stages.setDone(f"pointCloud:{label}")
+                self.stages.setDone(f"exported:{label}")
+        self.stageTimes["parallelPointClouds"] = record["seconds"]
+
+    @staticmethod
+    def buildChunkProject(
+        settings: dict, chunkProjectPath: str
+    ) -> tuple[list[str], list[dict]]:
+        """
+        Worker of buildPointCloudsInParallel. Builds and exports the point cloud
+        of the single chunk project at chunkProjectPath.
+        Returns the log messages and timeline records instead of writing them to files.
+        """
+        logger = Logger()
+        logger.setupBuffer()
+        f = FacaCalc(logger=logger, **settings)
+        doc = f.ms.Document()
+        doc.open(chunkProjectPath)
+        label = doc.chunks[0].label
+        counts = lambda: f.getObjectCounts(doc)
+        with logger.stage(f"pointCloud:{label}", counts=counts):
+            f.buildPointClouds(doc.chunks)
+        with logger.stage(f"exported:{label}", counts=counts):
+            f.exportPointClouds(doc.chunks)
+            doc.save()
+        return logger.buffer, logger.timelineBuffer
 
     def _getFilterModeFromString(self, string: str):
         if string == "NoFiltering":
-            return Metashape.NoFiltering
+            return self.ms.NoFiltering
         elif string == "MildFiltering":
-            return Metashape.MildFiltering
+            return self.ms.MildFiltering
         elif string == "ModerateFiltering":
-            return Metashape.ModerateFiltering
+            return self.ms.ModerateFiltering
         elif string == "AggressiveFiltering":
-            return Metashape.AggressiveFiltering
+            return self.ms.AggressiveFiltering
         raise ValueError(f"No Filter Mode for String '{string}' found.")
 
     def exportPointClouds(self, chunks: list) -> None:
         """
-        Exports the dense clouds of each chunk in chunks as las files into the ouput directory.
+        Exports the dense clouds of each chunk in chunks as .las or .laz files into the ouput directory.
+        With self.exportTileSize the point cloud is split into tiles, written into
+        the directory <chunk label>_tiles.
+        Every export is written to a temporary file (or directory) first and renamed
+        when complete, so the output never contains partial files under the final name.
         """
+        extension = "." + self.exportFormat
         for chunk in chunks:
-            outputPath = os.path.join(self.outputDir, chunk.label + ".las")
-            if self.outputEpsg:
-                outputCrs = Metashape.CoordinateSystem("EPSG::" + str(self.outputEpsg))
-                chunk.exportPointCloud(outputPath, crs=outputCrs)
+            exportArgs = self._getExportArgs()
+            exportArgs["progress"] = self.progress.callback(
+                "exportPointCloud", len(chunk.cameras)
+            )
+            if self.exportTileSize:
+                outputPath = os.path.join(self.outputDir, chunk.label + "_tiles")
+                tmpPath = outputPath + ".tmp"
+                shutil.rmtree(tmpPath, ignore_errors=True)
+                os.makedirs(tmpPath)
+                chunk.exportPointCloud(
+                    os.path.join(tmpPath, chunk.label + extension),
+                    split_in_blocks=True,
+                    block_width=self.exportTileSize,
+                    block_height=self.exportTileSize,
+                    **exportArgs,
+                )
+                shutil.rmtree(outputPath, ignore_errors=True)
             else:
-                chunk.exportPointCloud(outputPath)
+                outputPath = os.path.join(self.outputDir, chunk.label + extension)
+                tmpPath = os.path.join(self.outputDir, chunk.label + ".tmp" + extension)
+                chunk.exportPointCloud(tmpPath, **exportArgs)
+            os.replace(tmpPath, outputPath)
             self.l.lwt(
                 f"Exported {chunk.label} Point Cloud with EPSG: {self.outputEpsg} to: {outputPath}"
             )
+
+    def voxelDownsamplePointClouds(self, chunks: list) -> None:
+        """
+        Streams the exported .las file (or tiles) of each chunk in chunks and writes
+        <chunk label>_voxel_<self.voxelSize>.las with one point per voxel.
+        """
+        downsampler = VoxelDownsampler(self.voxelSize)
+        for chunk in chunks:
+            outputPath = self._getVoxelCloudPath(chunk.label)
+            inputCount, outputCount = downsampler.run(
+                self._getExportedLasPaths(chunk.label), outputPath
+            )
+            self.l.lwt(
+                f"{chunk.label} Point Cloud downsampled to {self.voxelSize:g} m voxels: "
+                f"{inputCount} -> {outputCount} points. Written to: {outputPath}"
+            )
+
+    def _getExportedLasPaths(self, label: str) -> list[str]:
+        """Returns the exported .las file or tiles of the chunk label."""
+        if self.exportTileSize:
+            tileDir = os.path.join(self.outputDir, label + "_tiles")
+            return sorted(
+                os.path.join(tileDir, name)
+                for name in os.listdir(tileDir)
+                if name.lower().endswith(".las")
+            )
+        return [os.path.join(self.outputDir, label + ".las")]
+
+    def _getVoxelCloudPath(self, label: str) -> str:
+        return os.path.join(self.outputDir, f"{label}_voxel_{self.voxelSize:g}.las")
+
+    def detectChanges(self, labels: list[str]) -> None:
+        """
+        Computes C2C distances and vertical differences between the survey clouds
+        (consecutive surveys sorted by label or all pairs, see ChangeDetector)
+        into <output dir>/change. Uses the voxel downsampled clouds if self.voxelSize is set.
+        """
+        labels = sorted(labels)
+        if self.changeDetection == "all_pairs":
+            pairs = list(itertools.combinations(labels, 2))
+        else:
+            pairs = list(zip(labels, labels[1:]))
+        if self.voxelSize > 0:
+            clouds = {label: [self._getVoxelCloudPath(label)] for label in labels}
+        else:
+            clouds = {label: self._getExportedLasPaths(label) for label in labels}
+        detector = ChangeDetector(
+            os.path.join(self.outputDir, "change"),
+            cellSize=self.changeCellSize,
+            tileSize=self.changeTileSize,
+            maxDistance=self.changeMaxDistance,
+            workers=self.changeWorkers,
+        )
+        self.l.lwt(f"Detecting changes between {len(pairs)} survey pairs.")
+        summaries = detector.run(clouds, pairs)
+        for name, summary in summaries.items():
+            c2c, dz = summary["c2c"], summary["dz"]
+            c2cMedian = c2c.get("percentiles", {}).get("50", float("nan"))
+            dzMean = dz.get("mean", float("nan"))
+            self.l.lwt(
+                f"{summary['compared']} to {summary['reference']}: "
+                f"C2C median {c2cMedian:.3f} m ({c2c['pointsWithNeighbour']} of {summary['points']} points within {self.changeMaxDistance:g} m), "
+                f"mean dZ {dzMean:.3f} m, {dz['significantCells']} of {dz['cells']} cells beyond LoD95."
+            )
+            self.l.logTimeline({"event": "changePair", "pair": name, **summary})
+
+    def _getExportArgs(self) -> dict:
+        """Returns the exportPointCloud arguments of the export settings."""
+        exportArgs = {}
+        if self.outputEpsg:
+            exportArgs["crs"] = self.ms.CoordinateSystem(
+                "EPSG::" + str(self.outputEpsg)
+            )
+        if self.exportFormat == "laz":
+            exportArgs["format"] = self.ms.PointCloudFormatLAZ
+        else:
+            exportArgs["format"] = self.ms.PointCloudFormatLAS
+        if self.exportAttributes is not None:
+            for attribute, argument in EXPORT_ATTRIBUTES.items():
+                exportArgs[argument] = attribute in self.exportAttributes
+        return exportArgs
+
+    def exportPointCloudsInParallel(
+        self, doc: Metashape.Metashape.Document, chunks: list[Metashape.Metashape.Chunk]
+    ) -> None:
+        """
+        Exports the point clouds of chunks in self.exportWorkers worker processes.
+        Every worker opens the saved project read only and exports one chunk.
+        Worker log messages are logged in the order of chunks.
+        """
+        labels = [
+            c.label for c in chunks if not self.stages.isDone(f"exported:{c.label}")
+        ]
+        if not labels:
+            return
+        self.l.lwt(
+            f"Exporting {len(labels)} Point Clouds in {self.exportWorkers} processes."
+        )
+        workerSettings = dict(self.settings, resume=False)
+        with self.l.stage("parallelExports") as record, ProcessPoolExecutor(
+            max_workers=self.exportWorkers
+        ) as executor:
+            results = executor.map(
+                FacaCalc.exportChunkFromProject,
+                [workerSettings] * len(labels),
+                [doc.path] * len(labels),
+                labels,
+            )
+            for label, (messages, timeline) in zip(labels, results):
+                for message in messages:
+                    self.l.l(message)
+                for timelineRecord in timeline:
+                    self.l.logTimeline(timelineRecord)
+                self.stages.setDone(f"exported:{label}")
+        self.stageTimes["parallelExports"] = record["seconds"]
+
+    @staticmethod
+    def exportChunkFromProject(
+        settings: dict, projectPath: str, label: str
+    ) -> tuple[list[str], list[dict]]:
+        """
+        Worker of exportPointCloudsInParallel. Exports the point cloud of the chunk
+        labeled label of the project at projectPath, which is opened read only.
+        Returns the log messages and timeline records instead of writing them to files.
+        """
+        logger = Logger()
+        logger.setupBuffer()
+        f = FacaCalc(logger=logger, **settings)
+        doc = f.ms.Document()
+        doc.open(projectPath, read_only=True)
+        chunk = f.getChunkByLabel(doc, label)
+        with logger.stage(f"exported:{label}"):
+            f.exportPointClouds([chunk])
+        return logger.buffer, logger.timelineBuffer
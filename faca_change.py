@@ -0,0 +1,452 @@
+from concurrent.futures import ProcessPoolExecutor
+import json
+import math
+import os
+import shutil
+
+from faca_las import LasHeader, LasReader
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, change detection needs it
+    np = None
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # scipy is optional, change detection needs it
+    cKDTree = None
+
+NODATA = -9999.0
+
+
+class PointPartition:
+    """
+    Out-of-core copy of a point cloud sorted by processing tile.
+
+    build streams LAS files twice (count points per tile, then scatter them)
+    into memory-mapped .npy files: <name>_xyz.npy (float32 coordinates
+    relative to the grid origin), <name>_index.npy (index of every point in
+    the concatenated LAS files) and <name>_offsets.npy (first point of every
+    tile). tile returns the points of one tile as memmap slices.
+    """
+
+    def __init__(self, directory: str, name: str):
+        self.directory = directory
+        self.name = name
+        self.offsets = np.load(self._path("offsets"))
+
+    def _path(self, kind: str) -> str:
+        return os.path.join(self.directory, f"{self.name}_{kind}.npy")
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    @classmethod
+    def build(
+        cls,
+        lasPaths: list[str],
+        grid: "ChangeGrid",
+        directory: str,
+        name: str,
+        chunkSize: int,
+    ) -> "PointPartition":
+        readers = [LasReader(path) for path in lasPaths]
+        counts = np.zeros(grid.tileCount, dtype=np.int64)
+        for reader in readers:
+            for records in reader.chunks(chunkSize):
+                tiles = grid.getTiles(reader.xyz(records))
+                counts += np.bincount(tiles, minlength=grid.tileCount)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        np.save(os.path.join(directory, f"{name}_offsets.npy"), offsets)
+
+        pointCount = int(offsets[-1])
+        xyz = np.lib.format.open_memmap(
+            os.path.join(directory, f"{name}_xyz.npy"),
+            mode="w+",
+            dtype=np.float32,
+            shape=(pointCount, 3),
+        )
+        index = np.lib.format.open_memmap(
+            os.path.join(directory, f"{name}_index.npy"),
+            mode="w+",
+            dtype=np.int64,
+            shape=(pointCount,),
+        )
+        cursor = offsets[:-1].copy()
+        start = 0
+        for reader in readers:
+            for records in reader.chunks(chunkSize):
+                points = reader.xyz(records)
+                tiles = grid.getTiles(points)
+                order = np.argsort(tiles, kind="stable")
+                sortedTiles = tiles[order]
+                rank = np.arange(len(order)) - np.searchsorted(sortedTiles, sortedTiles)
+                positions = cursor[sortedTiles] + rank
+                xyz[positions] = points[order] - grid.origin
+                index[positions] = start + order
+                cursor += np.bincount(tiles, minlength=grid.tileCount)
+                start += len(records)
+        xyz.flush()
+        index.flush()
+        del xyz, index
+        return cls(directory, name)
+
+    def tile(self, tile: int):
+        """Returns the local coordinates and point indices of tile."""
+        start, end = self.offsets[tile], self.offsets[tile + 1]
+        xyz = np.load(self._path("xyz"), mmap_mode="r")
+        index = np.load(self._path("index"), mmap_mode="r")
+        return xyz[start:end], index[start:end]
+
+
+class ChangeGrid:
+    """
+    Raster cells and processing tiles (tileCells x tileCells cells) over the extent of all clouds.
+    Clouds without points (e.g. empty export tiles) have zero bounds and are ignored.
+    """
+
+    def __init__(self, headers: list[LasHeader], cellSize: float, tileSize: float):
+        headers = [h for h in headers if h.pointCount > 0]
+        if headers:
+            mins = np.min([h.mins for h in headers], axis=0)
+            maxs = np.max([h.maxs for h in headers], axis=0)
+        else:
+            mins = maxs = np.zeros(3)
+        self.cellSize = cellSize
+        self.tileCells = max(1, round(tileSize / cellSize))
+        self.tileSize = self.tileCells * cellSize
+        self.origin = np.array(
+            [
+                math.floor(mins[0] / cellSize) * cellSize,
+                math.floor(mins[1] / cellSize) * cellSize,
+                math.floor(mins[2]),
+            ]
+        )
+        extent = maxs[:2] - self.origin[:2]
+        self.tilesShape = tuple(
+            int(math.floor(e / self.tileSize)) + 1 for e in extent
+        )  # columns, rows
+        self.tileCount = self.tilesShape[0] * self.tilesShape[1]
+        self.rasterShape = (
+            self.tilesShape[1] * self.tileCells,
+            self.tilesShape[0] * self.tileCells,
+        )  # rows, columns
+
+    def getTiles(self, xyz):
+        """Returns the tile of every point of xyz (global coordinates)."""
+        columns = np.floor((xyz[:, 0] - self.origin[0]) / self.tileSize).astype(
+            np.int64
+        )
+        rows = np.floor((xyz[:, 1] - self.origin[1]) / self.tileSize).astype(np.int64)
+        np.clip(columns, 0, self.tilesShape[0] - 1, out=columns)
+        np.clip(rows, 0, self.tilesShape[1] - 1, out=rows)
+        return rows * self.tilesShape[0] + columns
+
+    def getNeighbours(self, tile: int, distance: float = 0.0) -> list[int]:
+        """
+        Returns tile and the tiles around it that contain points closer than
+        distance to it, at least its (up to 8) direct neighbours.
+        """
+        ring = max(1, math.ceil(distance / self.tileSize))
+        row, column = divmod(tile, self.tilesShape[0])
+        return [
+            r * self.tilesShape[0] + c
+            for r in range(max(row - ring, 0), min(row + ring + 1, self.tilesShape[1]))
+            for c in range(
+                max(column - ring, 0), min(column + ring + 1, self.tilesShape[0])
+            )
+        ]
+
+
+class ChangeDetector:
+    """
+    Distances between survey point clouds, computed tile by tile out-of-core.
+
+    For every survey pair (reference, compared):
+    - C2C: the distance of every compared point to its nearest reference
+      point (cKDTree over the reference points of the tile and its
+      neighbours, NaN beyond maxDistance).
+    - dZ (vertical M3C2-lite): the difference of the mean heights of both
+      clouds in every raster cell (vertical cylinders of one cell), with the
+      95 % level of detection 1.96 * sqrt(var_ref / n_ref + var_cmp / n_cmp).
+
+    Every cloud is partitioned by tile once (PointPartition), then the tiles
+    of every pair are processed by a pool of workers processes. The rasters
+    are memory-mapped .npy files next to the partitions, so memory use
+    depends on the tile size, not on the extent of the clouds. Per pair,
+    <compared>_to_<reference>_c2c.npy (C2C distance of every compared point,
+    in LAS point order), the rasters _c2c.asc (mean C2C), _dz.asc and
+    _lod95.asc, and the summary statistics _summary.json are written into
+    outputDir.
+    """
+
+    HISTOGRAM_BINS = 10_000
+    PERCENTILES = (5, 25, 50, 75, 95)
+
+    def __init__(
+        self,
+        outputDir: str,
+        cellSize: float = 1.0,
+        tileSize: float = 100.0,
+        maxDistance: float = 5.0,
+        workers: int = 1,
+        chunkSize: int = 5_000_000,
+    ):
+        if np is None or cKDTree is None:
+            raise ImportError("Change detection needs numpy and scipy.")
+        self.outputDir = outputDir
+        self.cellSize = cellSize
+        self.tileSize = tileSize
+        self.maxDistance = maxDistance
+        self.workers = workers
+        self.chunkSize = chunkSize
+
+    def run(
+        self, clouds: dict[str, list[str]], pairs: list[tuple[str, str]]
+    ) -> dict[str, dict]:
+        """
+        clouds are the LAS files of every survey, pairs the (reference, compared) surveys.
+        Returns the summary of every pair by "<compared>_to_<reference>".
+        """
+        os.makedirs(self.outputDir, exist_ok=True)
+        headers = [LasHeader.read(p) for paths in clouds.values() for p in paths]
+        grid = ChangeGrid(headers, self.cellSize, self.tileSize)
+        partitionDir = os.path.join(self.outputDir, "partitions.tmp")
+        shutil.rmtree(partitionDir, ignore_errors=True)
+        os.makedirs(partitionDir)
+        try:
+            labels = {label for pair in pairs for label in pair}
+            partitions = {
+                label: PointPartition.build(
+                    clouds[label], grid, partitionDir, label, self.chunkSize
+                )
+                for label in sorted(labels)
+            }
+            summaries = {}
+            for reference, compared in pairs:
+                name = f"{compared}_to_{reference}"
+                summaries[name] = self._comparePair(
+                    grid,
+                    partitions[reference],
+                    partitions[compared],
+                    name,
+                    partitionDir,
+                )
+                summaries[name].update({"reference": reference, "compared": compared})
+                self._writeJson(summaries[name], name + "_summary.json")
+        finally:
+            shutil.rmtree(partitionDir, ignore_errors=True)
+        return summaries
+
+    def _comparePair(
+        self,
+        grid: ChangeGrid,
+        reference: PointPartition,
+        compared: PointPartition,
+        name: str,
+        workDir: str,
+    ) -> dict:
+        distancesPath = os.path.join(self.outputDir, name + "_c2c.npy")
+        tmpPath = distancesPath + ".tmp.npy"
+        distances = np.lib.format.open_memmap(
+            tmpPath, mode="w+", dtype=np.float32, shape=(len(compared),)
+        )
+        distances[:] = np.nan
+        distances.flush()
+        del distances
+
+        rasters = {}
+        for kind in ("c2c", "dz", "lod95"):
+            rasters[kind] = np.lib.format.open_memmap(
+                os.path.join(workDir, f"{name}_{kind}.npy"),
+                mode="w+",
+                dtype=np.float32,
+                shape=grid.rasterShape,
+            )
+            for start in range(0, grid.rasterShape[0], grid.tileCells):
+                rasters[kind][start : start + grid.tileCells] = np.nan
+        tiles = [
+            t
+            for t in range(grid.tileCount)
+            if compared.offsets[t + 1] > compared.offsets[t]
+        ]
+        tasks = [
+            (grid, reference, compared, t, self.maxDistance, tmpPath) for t in tiles
+        ]
+        validDz = []  # only cells with points of both clouds
+        significantCells = 0
+        executor = None
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers)
+            results = executor.map(compareTile, tasks)
+        else:
+            results = map(compareTile, tasks)
+        try:
+            for tile, tileRasters in results:
+                row, column = divmod(tile, grid.tilesShape[0])
+                rows = slice(row * grid.tileCells, (row + 1) * grid.tileCells)
+                columns = slice(column * grid.tileCells, (column + 1) * grid.tileCells)
+                for kind, raster in tileRasters.items():
+                    rasters[kind][rows, columns] = raster
+                dz, lod = tileRasters["dz"], tileRasters["lod95"]
+                validDz.append(dz[~np.isnan(dz)])
+                with np.errstate(invalid="ignore"):
+                    significantCells += int(np.sum(np.abs(dz) > lod))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        os.replace(tmpPath, distancesPath)
+
+        for kind, raster in rasters.items():
+            raster.flush()
+            self._writeAsc(grid, raster, f"{name}_{kind}.asc")
+        del rasters, raster
+        validDz = np.concatenate(validDz) if validDz else np.zeros(0)
+        summary = {
+            "points": len(compared),
+            "c2c": self._summarizeDistances(distancesPath),
+        }
+        summary["dz"] = {
+            "cells": int(validDz.size),
+            "significantCells": significantCells,
+            "cellSize": grid.cellSize,
+        }
+        if validDz.size:
+            summary["dz"]["mean"] = float(validDz.mean())
+            summary["dz"]["percentiles"] = {
+                str(p): float(v)
+                for p, v in zip(
+                    self.PERCENTILES, np.percentile(validDz, self.PERCENTILES)
+                )
+            }
+        return summary
+
+    def _summarizeDistances(self, distancesPath: str) -> dict:
+        """Streams the C2C distances and returns count, mean, RMS and histogram percentiles."""
+        distances = np.load(distancesPath, mmap_mode="r")
+        edges = np.linspace(0, self.maxDistance, self.HISTOGRAM_BINS + 1)
+        histogram = np.zeros(self.HISTOGRAM_BINS, dtype=np.int64)
+        count, total, squares = 0, 0.0, 0.0
+        for start in range(0, len(distances), self.chunkSize):
+            chunk = np.asarray(distances[start : start + self.chunkSize], np.float64)
+            chunk = chunk[~np.isnan(chunk)]
+            count += chunk.size
+            total += chunk.sum()
+            squares += np.square(chunk).sum()
+            histogram += np.histogram(chunk, bins=edges)[0]
+        summary = {"pointsWithNeighbour": count, "maxDistance": self.maxDistance}
+        if count:
+            cumulative = np.cumsum(histogram) / count
+            summary["mean"] = total / count
+            summary["rms"] = math.sqrt(squares / count)
+            summary["percentiles"] = {
+                str(p): float(edges[np.searchsorted(cumulative, p / 100) + 1])
+                for p in self.PERCENTILES
+            }
+        return summary
+
+    def _writeAsc(self, grid: ChangeGrid, raster, fileName: str) -> None:
+        """
+        Writes raster as ESRI ASCII grid (first row is the northernmost),
+        one row of tiles at a time.
+        """
+        path = os.path.join(self.outputDir, fileName)
+        with open(path + ".tmp", "w") as f:
+            f.write(f"ncols {raster.shape[1]}\nnrows {raster.shape[0]}\n")
+            f.write(f"xllcorner {grid.origin[0]}\nyllcorner {grid.origin[1]}\n")
+            f.write(f"cellsize {grid.cellSize}\nNODATA_value {NODATA:g}\n")
+            for end in range(raster.shape[0], 0, -grid.tileCells):
+                rows = raster[max(end - grid.tileCells, 0) : end]
+                values = np.where(np.isnan(rows), NODATA, rows)
+                np.savetxt(f, values[::-1], fmt="%.4f")
+        os.replace(path + ".tmp", path)
+
+    def _writeJson(self, data: dict, fileName: str) -> None:
+        path = os.path.join(self.outputDir, fileName)
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+
+def compareTile(task: tuple) -> tuple[int, dict]:
+    """
+    Worker of ChangeDetector: C2C distances and cell rasters of one tile.
+    Writes the distances into the shared .npy and returns the tile rasters.
+    """
+    grid, reference, compared, tile, maxDistance, distancesPath = task
+    points, index = compared.tile(tile)
+    points = np.asarray(points, dtype=np.float64)
+    row, column = divmod(tile, grid.tilesShape[0])
+    tileOrigin = np.array([column, row]) * grid.tileSize
+
+    # reference points of the tile and of its neighbours within maxDistance
+    neighbours = [reference.tile(t)[0] for t in grid.getNeighbours(tile, maxDistance)]
+    referencePoints = np.concatenate(
+        [np.asarray(n, dtype=np.float64) for n in neighbours]
+    )
+    inBuffer = np.all(
+        (referencePoints[:, :2] >= tileOrigin - maxDistance)
+        & (referencePoints[:, :2] < tileOrigin + grid.tileSize + maxDistance),
+        axis=1,
+    )
+    referencePoints = referencePoints[inBuffer]
+    if len(referencePoints):
+        tileDistances, _ = cKDTree(referencePoints).query(
+            points, distance_upper_bound=maxDistance
+        )
+        tileDistances[np.isinf(tileDistances)] = np.nan
+    else:
+        tileDistances = np.full(len(points), np.nan)
+    distances = np.load(distancesPath, mmap_mode="r+")
+    distances[np.asarray(index)] = tileDistances
+    distances.flush()
+
+    cells = grid.tileCells**2
+    comparedCells = _getCells(grid, points, tileOrigin)
+    inTile = np.all(
+        (referencePoints[:, :2] >= tileOrigin)
+        & (referencePoints[:, :2] < tileOrigin + grid.tileSize),
+        axis=1,
+    )
+    referenceCells = _getCells(grid, referencePoints[inTile], tileOrigin)
+
+    valid = ~np.isnan(tileDistances)
+    c2cCount = np.bincount(comparedCells[valid], minlength=cells)
+    c2cSum = np.bincount(
+        comparedCells[valid], weights=tileDistances[valid], minlength=cells
+    )
+    nRef, meanRef, varRef = _cellStats(
+        referenceCells, referencePoints[inTile, 2], cells
+    )
+    nCmp, meanCmp, varCmp = _cellStats(comparedCells, points[:, 2], cells)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        c2c = c2cSum / c2cCount
+        dz = np.where((nRef > 0) & (nCmp > 0), meanCmp - meanRef, np.nan)
+        lod = np.where(
+            (nRef > 1) & (nCmp > 1),
+            1.96 * np.sqrt(varRef / nRef + varCmp / nCmp),
+            np.nan,
+        )
+    shape = (grid.tileCells, grid.tileCells)
+    return tile, {
+        "c2c": c2c.reshape(shape),
+        "dz": dz.reshape(shape),
+        "lod95": lod.reshape(shape),
+    }
+
+
+def _getCells(grid: ChangeGrid, points, tileOrigin):
+    """Returns the raster cell (row * tileCells + column) within the tile of every point."""
+    cells = np.floor((points[:, :2] - tileOrigin) / grid.cellSize).astype(np.int64)
+    np.clip(cells, 0, grid.tileCells - 1, out=cells)
+    return cells[:, 1] * grid.tileCells + cells[:, 0]
+
+
+def _cellStats(cells, values, cellCount: int):
+    """Returns count, mean and sample variance of values per cell."""
+    count = np.bincount(cells, minlength=cellCount)
+    total = np.bincount(cells, weights=values, minlength=cellCount)
+    squares = np.bincount(cells, weights=np.square(values), minlength=cellCount)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        variance = (squares - count * np.square(mean)) / (count - 1)
+    return count, mean, np.maximum(variance, 0)
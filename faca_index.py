@@ -0,0 +1,96 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+
+class ImageIndex:
+    """
+    Finds survey images in directory trees.
+
+    Directories are listed with os.scandir and the listing of every directory
+    is cached together with its modification time. A directory is only listed
+    again if its modification time changed, so repeated lookups (e.g. while
+    typing a path in the UI) only cost one stat per directory.
+    Hidden files and directories are ignored and symbolic links to directories
+    are followed, like glob does. getSubdirNames applies the same rule to the
+    survey directories, for FacaCalc, FacaBatch and the UI alike.
+    """
+
+    def __init__(self, extensions: tuple = (".jpg",), maxWorkers: int = 8):
+        self.extensions = tuple(e.lower() for e in extensions)
+        self.maxWorkers = maxWorkers
+        self._cache = {}  # directory -> (mtime_ns, subdirectories, images)
+        self._lock = threading.Lock()
+
+    def getImages(self, folder: str) -> list[str]:
+        """Returns the sorted paths of all images in folder and its subdirectories."""
+        images = []
+        pending = [folder]
+        visited = set()  # real paths, symbolic links may form cycles
+        while pending:
+            path = pending.pop()
+            realPath = os.path.realpath(path)
+            if realPath in visited:
+                continue
+            visited.add(realPath)
+            subdirs, dirImages = self._scanDir(path)
+            images.extend(dirImages)
+            pending.extend(subdirs)
+        return sorted(images)
+
+    def getSubdirNames(self, folder: str) -> list[str]:
+        """Returns the sorted names of the (first level, not hidden) subdirectories of folder."""
+        subdirs, _ = self._scanDir(folder)
+        return [os.path.basename(s) for s in subdirs]
+
+    def getImagesByChunkName(
+        self, folder: str, chunkNames: list[str]
+    ) -> dict[str, list[str]]:
+        """
+        Retrieves images recursively for each subdirectory (chunkNames) in folder.
+        The subdirectories are walked concurrently.
+        Returns a dictionary where keys are chunkNames and values are lists of their image file paths.
+        """
+        paths = [os.path.join(folder, c) for c in chunkNames]
+        with ThreadPoolExecutor(max_workers=self.maxWorkers) as executor:
+            imageLists = list(executor.map(self.getImages, paths))
+        return dict(zip(chunkNames, imageLists))
+
+    def getSubdirAndImageCounts(self, folder: str) -> tuple:
+        """Returns the image and (first level) subdirectory count of folder.
+        Only images inside the subdirectories are counted, as FACA ignores top level images.
+        """
+        imagesDict = self.getSubdirImages(folder)
+        return sum(len(images) for images in imagesDict.values()), len(imagesDict)
+
+    def getSubdirImages(self, folder: str) -> dict[str, list[str]]:
+        """Returns the images of every (first level) subdirectory of folder by subdirectory name."""
+        return self.getImagesByChunkName(folder, self.getSubdirNames(folder))
+
+    def _scanDir(self, path: str) -> tuple[list[str], list[str]]:
+        """Returns the subdirectories and images directly inside path."""
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+        subdirs = []
+        images = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir():
+                    subdirs.append(entry.path)
+                elif entry.name.lower().endswith(self.extensions):
+                    images.append(entry.path)
+        subdirs.sort()
+        images.sort()
+        with self._lock:
+            self._cache[path] = (mtime, subdirs, images)
+        return subdirs, images
+
+
+# Shared by FacaCalc, FacaUi and FacaMain, so every part of a FACA process
+# profits from the directory listings cached by the others.
+imageIndex = ImageIndex()
@@ -0,0 +1,199 @@
+import os
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, reading and writing LAS needs it
+    np = None
+
+# byte offsets in the LAS 1.2 - 1.4 public header block
+_POINT_DATA_OFFSET = 96
+_VLR_COUNT = 100
+_POINT_FORMAT = 104
+_LEGACY_POINT_COUNT = 107
+_LEGACY_RETURN_COUNTS = 111
+_SCALE = 131
+_BOUNDS = 179  # max x, min x, max y, min y, max z, min z
+_EVLR_START = 235  # LAS 1.4 only
+_POINT_COUNT = 247  # LAS 1.4 only
+_RETURN_COUNTS = 255  # LAS 1.4 only
+
+
+def pointDtype(recordLength: int):
+    """
+    Returns the numpy dtype of a point record with recordLength bytes.
+    Every point format starts with X, Y, Z, intensity and the return number byte,
+    the remaining attributes are kept as raw bytes.
+    """
+    return np.dtype(
+        [
+            ("X", "<i4"),
+            ("Y", "<i4"),
+            ("Z", "<i4"),
+            ("intensity", "<u2"),
+            ("returns", "u1"),
+            ("rest", f"V{recordLength - 15}"),
+        ]
+    )
+
+
+class LasHeader:
+    """The public header block and VLRs (everything before the points) of a LAS file."""
+
+    def __init__(self, raw: bytes):
+        if raw[:4] != b"LASF":
+            raise ValueError("Not a LAS file.")
+        self.raw = raw
+        self.versionMinor = raw[25]
+        self.pointDataOffset = struct.unpack_from("<I", raw, _POINT_DATA_OFFSET)[0]
+        pointFormat, self.recordLength = struct.unpack_from("<BH", raw, _POINT_FORMAT)
+        if pointFormat & 0xC0:
+            raise ValueError("Compressed (LAZ) point data is not supported.")
+        self.pointFormat = pointFormat
+        self.pointCount = struct.unpack_from("<I", raw, _LEGACY_POINT_COUNT)[0]
+        if self.versionMinor >= 4:
+            self.pointCount = struct.unpack_from("<Q", raw, _POINT_COUNT)[0]
+        self.scale = np.array(struct.unpack_from("<3d", raw, _SCALE))
+        self.offset = np.array(struct.unpack_from("<3d", raw, _SCALE + 24))
+        bounds = struct.unpack_from("<6d", raw, _BOUNDS)
+        self.maxs = np.array(bounds[0::2])
+        self.mins = np.array(bounds[1::2])
+
+    @classmethod
+    def read(cls, path: str) -> "LasHeader":
+        with open(path, "rb") as f:
+            start = f.read(_POINT_DATA_OFFSET + 4)
+            pointDataOffset = struct.unpack_from("<I", start, _POINT_DATA_OFFSET)[0]
+            return cls(start + f.read(pointDataOffset - len(start)))
+
+
+class LasReader:
+    """Reads the points of an uncompressed LAS file through a numpy memmap."""
+
+    def __init__(self, path: str):
+        if np is None:
+            raise ImportError("Reading LAS files needs numpy.")
+        self.path = path
+        self.header = LasHeader.read(path)
+        self.dtype = pointDtype(self.header.recordLength)
+
+    def __len__(self) -> int:
+        return self.header.pointCount
+
+    def chunks(self, chunkSize: int):
+        """Yields the point records in memory-mapped slices of at most chunkSize points."""
+        if not len(self):
+            return
+        points = np.memmap(
+            self.path,
+            dtype=self.dtype,
+            mode="r",
+            offset=self.header.pointDataOffset,
+            shape=(len(self),),
+        )
+        for start in range(0, len(self), chunkSize):
+            yield points[start : start + chunkSize]
+
+    def xyz(self, records) -> "np.ndarray":
+        """Returns the (n, 3) float64 coordinates of records."""
+        xyz = np.empty((len(records), 3))
+        for i, axis in enumerate("XYZ"):
+            xyz[:, i] = records[axis] * self.header.scale[i] + self.header.offset[i]
+        return xyz
+
+
+class LasWriter:
+    """
+    Writes point records with the header and VLRs of a template LAS file.
+    Points are appended with write, close updates point counts and bounds and
+    renames the temporary file to path. Records with another scale or offset
+    than the template are re-encoded with reencode.
+    """
+
+    def __init__(self, path: str, template: LasHeader):
+        self.path = path
+        self.tmpPath = path + ".tmp"
+        self.template = template
+        self.count = 0
+        self.returnCounts = np.zeros(16, dtype=np.int64)
+        self.mins = np.full(3, np.inf)
+        self.maxs = np.full(3, -np.inf)
+        self.file = open(self.tmpPath, "wb")
+        self.file.write(template.raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+        else:
+            self.file.close()
+            os.remove(self.tmpPath)
+
+    def reencode(self, records, header: LasHeader):
+        """Returns records (read with header) in the scale and offset of the template."""
+        if np.array_equal(header.scale, self.template.scale) and np.array_equal(
+            header.offset, self.template.offset
+        ):
+            return records
+        records = np.array(records)
+        for i, axis in enumerate("XYZ"):
+            coordinates = records[axis] * header.scale[i] + header.offset[i]
+            records[axis] = np.round(
+                (coordinates - self.template.offset[i]) / self.template.scale[i]
+            )
+        return records
+
+    def write(self, records) -> None:
+        if not len(records):
+            return
+        self.file.write(np.ascontiguousarray(records).tobytes())
+        self.count += len(records)
+        returnMask = 0x07 if self.template.pointFormat < 6 else 0x0F
+        returnNumbers = records["returns"] & returnMask
+        self.returnCounts += np.bincount(returnNumbers, minlength=16)
+        for i, axis in enumerate("XYZ"):
+            self.mins[i] = min(self.mins[i], records[axis].min())
+            self.maxs[i] = max(self.maxs[i], records[axis].max())
+
+    def close(self) -> None:
+        scale, offset = self.template.scale, self.template.offset
+        if self.count:
+            mins, maxs = self.mins * scale + offset, self.maxs * scale + offset
+        else:
+            mins = maxs = np.zeros(3)
+        bounds = [v for axis in zip(maxs, mins) for v in axis]
+        self.file.seek(_BOUNDS)
+        self.file.write(struct.pack("<6d", *bounds))
+        legacy = self.count < 2**32 and self.template.pointFormat < 6
+        self.file.seek(_LEGACY_POINT_COUNT)
+        self.file.write(struct.pack("<I", self.count if legacy else 0))
+        self.file.write(
+            struct.pack("<5I", *(self.returnCounts[1:6] if legacy else [0] * 5))
+        )
+        if self.template.versionMinor >= 4:
+            # extended VLRs after the points are not copied
+            self.file.seek(_EVLR_START)
+            self.file.write(struct.pack("<QI", 0, 0))
+            self.file.write(struct.pack("<Q", self.count))
+            self.file.write(struct.pack("<15Q", *self.returnCounts[1:16]))
+        self.file.close()
+        os.replace(self.tmpPath, self.path)
+
+
+def writeLas(path: str, xyz, scale: float = 0.001) -> None:
+    """Writes the (n, 3) coordinates xyz as LAS 1.2 point format 0 file (single returns)."""
+    offset = np.floor(xyz.min(axis=0)) if len(xyz) else np.zeros(3)
+    header = bytearray(227)
+    header[:4] = b"LASF"
+    header[24:26] = bytes([1, 2])
+    header[26:58] = b"FACA".ljust(32, b"\0")
+    struct.pack_into("<HIIBH", header, 94, 227, 227, 0, 0, 20)
+    struct.pack_into("<3d3d", header, _SCALE, *[scale] * 3, *offset)
+    records = np.zeros(len(xyz), dtype=pointDtype(20))
+    for i, axis in enumerate("XYZ"):
+        records[axis] = np.round((xyz[:, i] - offset[i]) / scale)
+    records["returns"] = 0b001001  # return 1 of 1
+    with LasWriter(path, LasHeader(bytes(header))) as writer:
+        writer.write(records)
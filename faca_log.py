@@ -1,28 +1,91 @@
+from contextlib import contextmanager
 from datetime import datetime
+import json
 import logging
 import os
+import sys
+import time
 
 
 class Logger:
-    def setupLogger(self, outFolder, projectName):
-        """Creates a .log text file in the output folder to log to."""
+    def setupLogger(self, outFolder, projectName, append=False):
+        """Creates a .log text file and a .timeline.jsonl file (see stage)
+        in the output folder to log to.
+        Existing files are replaced unless append is True (e.g. when resuming)."""
         logPath = os.path.join(outFolder, projectName + ".log")
-        open(logPath, "w").close()  # replace if exists
-        logging.basicConfig(
-            filename=logPath,
-            filemode="a",
-            format="%(message)s",
-            datefmt="%H:%M:%S",
-            level=logging.DEBUG,
-        )
-        self.logger = logging.getLogger("faca")
+        self.timelinePath = os.path.join(outFolder, projectName + ".timeline.jsonl")
+        if not append:
+            open(logPath, "w").close()  # replace if exists
+            open(self.timelinePath, "w").close()
+        # one logger per .log file, so several FACA runs in one process
+        # (e.g. batch mode) each write to their own file.
+        self.logger = logging.getLogger(f"faca.{os.path.abspath(logPath)}")
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            handler.close()
+        handler = logging.FileHandler(logPath, mode="a")
+        handler.setFormatter(logging.Formatter("%(message)s", datefmt="%H:%M:%S"))
+        self.logger.addHandler(handler)
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+
+    def close(self) -> None:
+        """Closes the .log file."""
+        if self.logger is not None:
+            for handler in list(self.logger.handlers):
+                self.logger.removeHandler(handler)
+                handler.close()
+
+    def setupBuffer(self):
+        """Collects messages in self.buffer and timeline records in
+        self.timelineBuffer instead of writing them to files.
+        Used by worker processes, whose messages are logged by the main process."""
+        self.buffer = []
+        self.timelineBuffer = []
+        self.logger = None
 
     def l(self, message: str) -> None:
-        self.logger.info(f"{message}")
+        if self.logger is None:
+            self.buffer.append(f"{message}")
+        else:
+            self.logger.info(f"{message}")
 
     def lwt(self, message: str) -> None:
         time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.logger.info(f"{time} - {message}")
+        self.l(f"{time} - {message}")
+
+    def logTimeline(self, record: dict) -> None:
+        """Appends record as a json line to the .timeline.jsonl file."""
+        if self.logger is None:
+            self.timelineBuffer.append(record)
+            return
+        with open(self.timelinePath, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    @contextmanager
+    def stage(self, name: str, counts=None):
+        """
+        Context manager measuring the enclosed block as stage name.
+        Records wall-clock and CPU seconds, the peak resident memory of the
+        process so far and, if given, the result of calling counts()
+        (e.g. Metashape object counts) after the block.
+        The record is yielded (filled in when the block is left) and written
+        to the timeline, but only if the block finished without an exception.
+
+        Usage:
+            with self.l.stage("matchedAndAligned", counts=lambda: {...}) as record:
+                ...
+        """
+        record = {"stage": name, "start": datetime.now().isoformat(timespec="seconds")}
+        start = time.perf_counter()
+        cpuStart = time.process_time()
+        yield record
+        record["seconds"] = round(time.perf_counter() - start, 3)
+        record["cpuSeconds"] = round(time.process_time() - cpuStart, 3)
+        record["peakRssMb"] = getPeakRssMb()
+        if counts is not None:
+            record["counts"] = counts()
+        self.logTimeline(record)
 
     def logFacaInputs(self, inputDictionary) -> None:
         self.l(f"Project name:            {inputDictionary['project_name']}")
@@ -37,6 +100,50 @@ class Logger:
         self.l(f"Depth Map Quality:       {inputDictionary['depth_map_quality']}")
         self.l(f"Depth Map Filtering:     {inputDictionary['depth_map_filtering']}")
         self.l(f"Output EPSG Code:        {inputDictionary['output_epsg_code']}")
+        self.l(f"Resume:                  {inputDictionary.get('resume', False)}")
+        self.l(
+            f"Window Size:             {inputDictionary.get('window_size', 0)} (overlap {inputDictionary.get('window_overlap', 1)}, {inputDictionary.get('window_workers', 1)} workers)"
+        )
+        self.l(
+            f"Keep Keypoints:          {inputDictionary.get('keep_keypoints', False)}"
+        )
+        self.l(
+            f"Append Survey:           {inputDictionary.get('append_survey', '')} (shift tolerance {inputDictionary.get('append_shift_tolerance', 0.05)})"
+        )
+        self.l(f"Parallel Chunks:         {inputDictionary.get('parallel_chunks', 1)}")
+        self.l(
+            f"Alignment Cache:         {inputDictionary.get('alignment_cache_dir', '')}"
+        )
+        self.l(
+            f"Progress Interval:       {inputDictionary.get('progress_interval', 10)}"
+        )
+        self.l(
+            f"Progress History:        {inputDictionary.get('progress_history', '') or '~/.faca/progress_history.json'}"
+        )
+        self.l(
+            f"Backend:                 {inputDictionary.get('backend', 'metashape')}"
+        )
+        self.l(
+            f"Dense Confidence Min:    {inputDictionary.get('dense_confidence_min', 0)}"
+        )
+        self.l(
+            f"Dense Point Spacing:     {inputDictionary.get('dense_point_spacing', 0)}"
+        )
+        self.l(f"Voxel Size:              {inputDictionary.get('voxel_size', 0)}")
+        self.l(f"Metadata Cache:          {inputDictionary.get('metadata_cache', '')}")
+        self.l(f"Pre-screen:              {inputDictionary.get('prescreen', 'none')}")
+        self.l(
+            f"Pre-screen Cache:        {inputDictionary.get('prescreen_cache', '') or '~/.faca/prescreen.sqlite'}"
+        )
+        self.l(
+            f"Preselection:            {inputDictionary.get('preselection', 'default')} (radius {inputDictionary.get('preselection_radius', 0)})"
+        )
+        self.l(
+            f"Co-alignment Report:     {inputDictionary.get('coalignment_report', False)}"
+        )
+        self.l(
+            f"Change Detection:        {inputDictionary.get('change_detection', 'none')}"
+        )
         self.l("")
 
     def logImagesDict(self, imagesDict: dict) -> None:
@@ -50,6 +157,50 @@ class Logger:
             )
 
 
+def getPeakRssMb() -> float:
+    """Returns the peak resident memory of this process in MB or None if unknown."""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        kernel32 = ctypes.WinDLL("kernel32")
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        psapi = ctypes.WinDLL("psapi")
+        psapi.GetProcessMemoryInfo.argtypes = [
+            wintypes.HANDLE,
+            ctypes.POINTER(PROCESS_MEMORY_COUNTERS),
+            wintypes.DWORD,
+        ]
+        if not psapi.GetProcessMemoryInfo(
+            kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb
+        ):
+            return None
+        return round(counters.PeakWorkingSetSize / 2**20, 1)
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
 if __name__ == "__main__":
     l = Logger()
     l.setupLogger("out", "test.psx")
@@ -2,15 +2,24 @@ import argparse
 import configparser
 import os
 
+from faca_backend import BACKENDS
+from faca_batch import FacaBatch
 from faca_calc import FacaCalc
+from faca_index import imageIndex
+from faca_progress import formatProgress
 
 
 class FacaMain:
 
-    def __init__(self, iniFile=None, section=None, ui=False, args=None):
+    def __init__(
+        self, iniFile=None, section=None, ui=False, args=None, sections=None, maxJobs=1
+    ):
         if ui:
             self.startUi()
             return
+        elif iniFile and sections is not None:
+            self.runBatch(iniFile, sections, maxJobs, args)
+            return
         elif iniFile and section:
             settings = self.getSettingsFromIniSection(iniFile, section)
             settings = self.updateSettingsFromArgs(settings, args)
@@ -19,6 +28,7 @@ class FacaMain:
         else:
             settings = self.getSettingsFromInput(args)
         f = FacaCalc(**settings)
+        f.progress.addSink(lambda message: print(formatProgress(message), flush=True))
         f.main()
 
     def startUi(self) -> None:
@@ -29,6 +39,30 @@ class FacaMain:
         fUi = FacaUi(root=root, calcClass=FacaCalc)
         fUi.mainloop()
 
+    def runBatch(
+        self, iniFile: str, sections: list[str], maxJobs: int, args: argparse.Namespace
+    ) -> None:
+        """
+        Runs FACA for every section in sections (all sections of iniFile if empty).
+        Parameters given on the command line replace the values of every section.
+        """
+        if not os.path.isfile(iniFile):
+            raise ValueError(f"Ini file {iniFile} not found.")
+        ini = configparser.ConfigParser()
+        ini.read(iniFile)
+        missing = [s for s in sections if not ini.has_section(s)]
+        if missing:
+            raise ValueError(f"Sections {', '.join(missing)} not found in {iniFile}.")
+        if not sections:
+            sections = ini.sections()
+        if not sections:
+            raise ValueError(f"No sections found in {iniFile}.")
+        jobs = {}
+        for section in sections:
+            settings = self.getSettingsFromIniSection(iniFile, section)
+            jobs[section] = self.updateSettingsFromArgs(settings, args)
+        FacaBatch(jobs, maxJobs=maxJobs).run()
+
     def getSettingsFromIniSection(self, iniFile: str, section: str) -> dict:
         settingsDict = {}
         settings = configparser.ConfigParser()
@@ -49,6 +83,117 @@ class FacaMain:
         )
         settingsDict["depth_map_filtering"] = settings[section]["depth_map_filtering"]
         settingsDict["output_epsg_code"] = settings[section]["output_epsg_code"]
+        settingsDict["resume"] = settings[section].getboolean("resume", fallback=False)
+        settingsDict["parallel_chunks"] = settings[section].getint(
+            "parallel_chunks", fallback=1
+        )
+        settingsDict["alignment_cache_dir"] = settings[section].get(
+            "alignment_cache_dir", fallback=""
+        )
+        settingsDict["progress_interval"] = settings[section].getfloat(
+            "progress_interval", fallback=10.0
+        )
+        settingsDict["progress_history"] = settings[section].get(
+            "progress_history", fallback=""
+        )
+        settingsDict["backend"] = settings[section].get("backend", fallback="metashape")
+        settingsDict["dense_confidence_min"] = settings[section].getint(
+            "dense_confidence_min", fallback=0
+        )
+        settingsDict["dense_point_spacing"] = settings[section].getfloat(
+            "dense_point_spacing", fallback=0.0
+        )
+        settingsDict["voxel_size"] = settings[section].getfloat(
+            "voxel_size", fallback=0.0
+        )
+        settingsDict["change_detection"] = settings[section].get(
+            "change_detection", fallback="none"
+        )
+        settingsDict["change_cell_size"] = settings[section].getfloat(
+            "change_cell_size", fallback=1.0
+        )
+        settingsDict["change_tile_size"] = settings[section].getfloat(
+            "change_tile_size", fallback=100.0
+        )
+        settingsDict["change_max_distance"] = settings[section].getfloat(
+            "change_max_distance", fallback=5.0
+        )
+        settingsDict["change_workers"] = settings[section].getint(
+            "change_workers", fallback=1
+        )
+        settingsDict["export_format"] = settings[section].get(
+            "export_format", fallback="las"
+        )
+        settingsDict["export_tile_size"] = settings[section].getfloat(
+            "export_tile_size", fallback=0.0
+        )
+        settingsDict["export_attributes"] = settings[section].get(
+            "export_attributes", fallback=""
+        )
+        settingsDict["export_workers"] = settings[section].getint(
+            "export_workers", fallback=1
+        )
+        settingsDict["realign_policy"] = settings[section].get(
+            "realign_policy", fallback="after_each"
+        )
+        settingsDict["tiepoint_stats"] = settings[section].getboolean(
+            "tiepoint_stats", fallback=False
+        )
+        settingsDict["metadata_cache"] = settings[section].get(
+            "metadata_cache", fallback=""
+        )
+        settingsDict["prescreen"] = settings[section].get("prescreen", fallback="none")
+        settingsDict["prescreen_min_sharpness"] = settings[section].getfloat(
+            "prescreen_min_sharpness", fallback=30.0
+        )
+        settingsDict["prescreen_max_clipped"] = settings[section].getfloat(
+            "prescreen_max_clipped", fallback=25.0
+        )
+        settingsDict["prescreen_workers"] = settings[section].getint(
+            "prescreen_workers", fallback=0
+        )
+        settingsDict["prescreen_cache"] = settings[section].get(
+            "prescreen_cache", fallback=""
+        )
+        settingsDict["preselection"] = settings[section].get(
+            "preselection", fallback="default"
+        )
+        settingsDict["preselection_radius"] = settings[section].getfloat(
+            "preselection_radius", fallback=0.0
+        )
+        settingsDict["keep_keypoints"] = settings[section].getboolean(
+            "keep_keypoints", fallback=False
+        )
+        settingsDict["append_survey"] = settings[section].get(
+            "append_survey", fallback=""
+        )
+        settingsDict["append_shift_tolerance"] = settings[section].getfloat(
+            "append_shift_tolerance", fallback=0.05
+        )
+        settingsDict["window_size"] = settings[section].getint(
+            "window_size", fallback=0
+        )
+        settingsDict["window_overlap"] = settings[section].getint(
+            "window_overlap", fallback=1
+        )
+        settingsDict["window_workers"] = settings[section].getint(
+            "window_workers", fallback=1
+        )
+        settingsDict["coalignment_report"] = settings[section].getboolean(
+            "coalignment_report", fallback=False
+        )
+        settingsDict["filter_mode"] = settings[section].get(
+            "filter_mode", fallback="fixed"
+        )
+        settingsDict["filter_max_removal"] = settings[section].getfloat(
+            "filter_max_removal", fallback=10.0
+        )
+        settingsDict["filter_max_iterations"] = settings[section].getint(
+            "filter_max_iterations", fallback=10
+        )
+        settingsDict["filter_min_removal_to_optimize"] = settings[section].getfloat(
+            "filter_min_removal_to_optimize", fallback=20.0
+        )
         return settingsDict
 
     def updateSettingsFromArgs(self, settings: dict, args: argparse.Namespace) -> dict:
@@ -60,6 +205,15 @@ class FacaMain:
                     "keypoint_limit",
                     "tiepoint_limit",
                     "depth_map_quality",
+                    "parallel_chunks",
+                    "filter_max_iterations",
+                    "export_workers",
+                    "dense_confidence_min",
+                    "change_workers",
+                    "prescreen_workers",
+                    "window_size",
+                    "window_overlap",
+                    "window_workers",
                 ]:
                     settings[attribute] = int(value)
                 elif attribute in [
@@ -71,8 +225,44 @@ class FacaMain:
                     "criterions",
                     "criterion_values",
                     "depth_map_filtering",
+                    "resume",
+                    "alignment_cache_dir",
+                    "backend",
+                    "filter_mode",
+                    "realign_policy",
+                    "export_format",
+                    "export_attributes",
+                    "change_detection",
+                    "prescreen",
+                    "prescreen_cache",
+                    "metadata_cache",
+                    "progress_history",
+                    "preselection",
+                    "append_survey",
                 ]:
                     settings[attribute] = value
+                elif attribute in [
+                    "progress_interval",
+                    "filter_max_removal",
+                    "filter_min_removal_to_optimize",
+                    "export_tile_size",
+                    "dense_point_spacing",
+                    "voxel_size",
+                    "change_cell_size",
+                    "change_tile_size",
+                    "change_max_distance",
+                    "prescreen_min_sharpness",
+                    "prescreen_max_clipped",
+                    "preselection_radius",
+                    "append_shift_tolerance",
+                ]:
+                    settings[attribute] = float(value)
+                elif attribute in [
+                    "keep_keypoints",
+                    "tiepoint_stats",
+                    "coalignment_report",
+                ]:
+                    settings[attribute] = value.lower() in ("true", "1", "yes")
         return settings
 
     def checkArgsComplete(self, args: argparse.Namespace) -> bool:
@@ -117,6 +307,13 @@ class FacaMain:
                 "images",
                 "The directory containing input images. Each survey in its own subdirectory.",
             )
+        if os.path.isdir(settings["input_image_dir"]):
+            imageCount, subdirCount = imageIndex.getSubdirAndImageCounts(
+                settings["input_image_dir"]
+            )
+            print(f"Found {imageCount} .jpg files in {subdirCount} subdirectories.")
+        else:
+            print(f"Input images directory {settings['input_image_dir']} not found.")
         if "output_dir" not in settings:
             settings["output_dir"] = p(
                 "Output directory",
@@ -202,18 +399,41 @@ if __name__ == "__main__":
         '{file} --ui' starts the FACA Userinterface
         '{file}' starts FACA in user input mode.
         '{file} --iniFile faca.ini --Section \"FACA defaults\" --input_image_dir new_dir' starts calculation with values from .ini Section but replaces the input_image_dir parameter.
+        '{file} --iniFile faca.ini --Section \"FACA defaults\" --resume' continues an interrupted calculation.
+        '{file} --iniFile faca.ini --Section \"FACA defaults\" --append_survey 2024_05' adds the new survey directory 2024_05 to the finished project.
+        '{file} --iniFile faca.ini --sections \"Nota et al. 2022,Moran et al. 2023\"' runs FACA for each listed section.
+        '{file} --iniFile faca.ini --all-sections --max_jobs 2' runs FACA for every section, two at a time.
         """,
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 There are three ways FACA handles indivual parameters defined on the command line:
     1. If not all parameters are given but a configuration file and section, the parameters replace corresponding values, and the calculation starts.
     2. If all parameters, but neither a configuration file nor section are given, the calculation starts.
-    3. If not all parameters are given, and neither a configuration file nor a section, the interactive mode starts, skipping defined parameters.""",
+    3. If not all parameters are given, and neither a configuration file nor a section, the interactive mode starts, skipping defined parameters.
+In batch mode (--sections, --all-sections) the parameters replace the corresponding values of every section.""",
     )
     parser.add_argument("-i", "--iniFile", help="Path to the ini file.", required=False)
     parser.add_argument(
         "-s", "--Section", help="Section in the ini file.", required=False
     )
+    parser.add_argument(
+        "--sections",
+        help="Batch mode: comma separated sections of the ini file, each run as its own job. Parameters given on the command line apply to every section.",
+        required=False,
+    )
+    parser.add_argument(
+        "--all-sections",
+        action="store_true",
+        help="Batch mode: run every section of the ini file as its own job. Parameters given on the command line apply to every section.",
+        required=False,
+    )
+    parser.add_argument(
+        "--max_jobs",
+        type=int,
+        default=1,
+        help="Batch mode: number of jobs running at the same time (default: 1).",
+        required=False,
+    )
     parser.add_argument(
         "-u", "--ui", action="store_true", help="Launch the GUI.", required=False
     )
@@ -279,10 +499,225 @@ There are three ways FACA handles indivual parameters defined on the command lin
         help="Depth Map Filter Mode; options: NoFiltering, MildFiltering, ModerateFiltering, AggressiveFiltering.",
         required=False,
     )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=None,
+        help="Reopen an existing project and skip all stages it already finished.",
+    )
+    parser.add_argument(
+        "--keep_keypoints",
+        help="Keep the key points of the co-aligned images in the project (True/False, default: False). Needed to append surveys to the project later.",
+        required=False,
+    )
+    parser.add_argument(
+        "--append_survey",
+        help="Name of a new survey subdirectory of input_image_dir to add to the finished project: only the new survey is matched and aligned incrementally and only its chunk and the moved surveys are rebuilt.",
+        required=False,
+    )
+    parser.add_argument(
+        "--append_shift_tolerance",
+        help="Appending: existing surveys whose cameras moved more than this (m) in the new alignment are rebuilt (default: 0.05).",
+        required=False,
+    )
+    parser.add_argument(
+        "--window_size",
+        help="Co-align windows of this many consecutive surveys (sorted by name) and chain them through their shared surveys instead of aligning all surveys at once, needs numpy (default: 0, all at once).",
+        required=False,
+    )
+    parser.add_argument(
+        "--window_overlap",
+        help="Number of surveys consecutive windows share (default: 1).",
+        required=False,
+    )
+    parser.add_argument(
+        "--window_workers",
+        help="Number of processes aligning windows in parallel (default: 1).",
+        required=False,
+    )
+    parser.add_argument(
+        "--parallel_chunks",
+        help="Number of processes building and exporting the survey point clouds in parallel (default: 1).",
+        required=False,
+    )
+    parser.add_argument(
+        "--alignment_cache_dir",
+        help="Directory to reuse matched and aligned chunks from, if images and matching parameters are identical.",
+        required=False,
+    )
+    parser.add_argument(
+        "--progress_interval",
+        help="Minimum seconds between progress messages of long Metashape operations (default: 10).",
+        required=False,
+    )
+    parser.add_argument(
+        "--progress_history",
+        help="JSON file with the durations of earlier runs, used for the overall ETA (default: ~/.faca/progress_history.json).",
+        required=False,
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        help="Photogrammetry backend. 'simulated' runs FACA without Metashape, e.g. for benchmarks (default: metashape).",
+        required=False,
+    )
+    parser.add_argument(
+        "--dense_confidence_min",
+        help="Remove dense points with a lower confidence before export (default: 0, keep all).",
+        required=False,
+    )
+    parser.add_argument(
+        "--dense_point_spacing",
+        help="Thin dense point clouds to this point spacing in m before export (default: 0, keep all).",
+        required=False,
+    )
+    parser.add_argument(
+        "--voxel_size",
+        help="Write a companion cloud with one point per voxel of this size in m after export (default: 0, disabled).",
+        required=False,
+    )
+    parser.add_argument(
+        "--change_detection",
+        help="Compare the exported survey clouds: none (default), consecutive or all_pairs.",
+        required=False,
+    )
+    parser.add_argument(
+        "--change_cell_size",
+        help="Cell size of the change detection rasters in m (default: 1).",
+        required=False,
+    )
+    parser.add_argument(
+        "--change_tile_size",
+        help="Size of the change detection processing tiles in m (default: 100).",
+        required=False,
+    )
+    parser.add_argument(
+        "--change_max_distance",
+        help="Maximum cloud to cloud distance in m (default: 5).",
+        required=False,
+    )
+    parser.add_argument(
+        "--change_workers",
+        help="Number of worker processes comparing tiles (default: 1).",
+        required=False,
+    )
+    parser.add_argument(
+        "--export_format",
+        choices=("las", "laz"),
+        help="Point cloud export format, laz is compressed (default: las).",
+        required=False,
+    )
+    parser.add_argument(
+        "--export_tile_size",
+        help="Export point clouds as square tiles of this size in output CRS units (default: 0, one file per survey).",
+        required=False,
+    )
+    parser.add_argument(
+        "--export_attributes",
+        help="Comma separated point attributes to export, e.g. color,classification,confidence (default: Metashape's defaults).",
+        required=False,
+    )
+    parser.add_argument(
+        "--export_workers",
+        help="Number of processes exporting survey point clouds in parallel (default: 1).",
+        required=False,
+    )
+    parser.add_argument(
+        "--realign_policy",
+        choices=("after_each", "once_at_end", "optimize"),
+        help="Fixed tie point filtering: alignCameras after each criterion (after_each, default), once after all criterions (once_at_end) or optimizeCameras after each criterion (optimize).",
+        required=False,
+    )
+    parser.add_argument(
+        "--tiepoint_stats",
+        help="Write percentiles and histograms of the tie point filter criterions after every filter pass, needs numpy (True/False, default: False).",
+        required=False,
+    )
+    parser.add_argument(
+        "--metadata_cache",
+        help="SQLite file caching the EXIF/XMP metadata of the images, which are checked and summarized per survey (default: empty, disabled).",
+        required=False,
+    )
+    parser.add_argument(
+        "--prescreen",
+        choices=("none", "exclude", "disable"),
+        help="Score images for blur and exposure before adding them and exclude or disable the images below the thresholds, needs numpy and Pillow (default: none).",
+        required=False,
+    )
+    parser.add_argument(
+        "--prescreen_min_sharpness",
+        help="Minimum image sharpness, the variance of the Laplacian of a 256 px thumbnail (default: 30).",
+        required=False,
+    )
+    parser.add_argument(
+        "--prescreen_max_clipped",
+        help="Maximum percent of under- or overexposed pixels of an image (default: 25).",
+        required=False,
+    )
+    parser.add_argument(
+        "--prescreen_workers",
+        help="Number of worker processes scoring images (default: 0, all CPUs).",
+        required=False,
+    )
+    parser.add_argument(
+        "--prescreen_cache",
+        help="SQLite file caching the pre-screening scores (default: ~/.faca/prescreen.sqlite).",
+        required=False,
+    )
+    parser.add_argument(
+        "--preselection",
+        choices=("default", "generic", "reference", "none", "spatial"),
+        help="Image pair preselection of matchPhotos: Metashape's default, generic, reference (source), none or spatial (pairs of cameras within preselection_radius across all surveys, needs numpy) (default: default).",
+        required=False,
+    )
+    parser.add_argument(
+        "--preselection_radius",
+        help="Spatial preselection: maximum horizontal distance of paired cameras in m (default: 0, 5 x the median camera spacing).",
+        required=False,
+    )
+    parser.add_argument(
+        "--coalignment_report",
+        help="Write camera reference and reprojection errors and tie points shared between surveys, needs numpy (True/False, default: False).",
+        required=False,
+    )
+    parser.add_argument(
+        "--filter_mode",
+        choices=("fixed", "adaptive"),
+        help="Tie point filtering: remove at the criterion values at once (fixed, default) or in passes (adaptive).",
+        required=False,
+    )
+    parser.add_argument(
+        "--filter_max_removal",
+        help="Adaptive filtering: maximum percent of tie points removed per pass (default: 10).",
+        required=False,
+    )
+    parser.add_argument(
+        "--filter_max_iterations",
+        help="Adaptive filtering: maximum passes per criterion (default: 10).",
+        required=False,
+    )
+    parser.add_argument(
+        "--filter_min_removal_to_optimize",
+        help="Adaptive filtering: percent of removed tie points after which cameras are optimized (default: 20).",
+        required=False,
+    )
     args = parser.parse_args()
 
     if args.ui:
         FacaMain(ui=True)
+    elif args.iniFile and (args.sections or args.all_sections):
+        sections = []
+        if args.sections and not args.all_sections:
+            sections = [s.strip() for s in args.sections.split(",")]
+        try:
+            FacaMain(
+                iniFile=args.iniFile,
+                sections=sections,
+                maxJobs=args.max_jobs,
+                args=args,
+            )
+        except ValueError as e:
+            parser.error(str(e))
     elif args.iniFile and args.Section:
         FacaMain(iniFile=args.iniFile, section=args.Section, args=args)
     else:
@@ -0,0 +1,230 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import re
+import sqlite3
+import struct
+import threading
+
+# The cache the GUI reads, FacaCalc uses it if metadata_cache is set to this path.
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".faca", "metadata.sqlite")
+
+FIELDS = (
+    "timestamp",
+    "latitude",
+    "longitude",
+    "altitude",
+    "make",
+    "model",
+    "xy_accuracy",
+    "z_accuracy",
+)
+
+_EXIF_HEADER = b"Exif\0\0"
+_XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\0"
+# TIFF field type -> size in bytes
+_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+_XMP_ATTRIBUTE = re.compile(rb'([\w-]+):(\w+)\s*=\s*"([^"]*)"')
+_XMP_ELEMENT = re.compile(rb"<([\w-]+):(\w+)>([^<]*)</")
+
+
+def parseJpegMetadata(path: str) -> dict:
+    """
+    Returns the FIELDS of the JPEG at path (None if missing).
+    Only the marker segments before the image data are read, the image is not decoded.
+    EXIF: DateTimeOriginal (or DateTime), GPS position, Make and Model.
+    XMP: the camera position accuracy as read by Metashape's load_xmp_accuracy
+    (Camera:GPSXYAccuracy/GPSZAccuracy or DJI's RtkStdLon/RtkStdLat/RtkStdHgt).
+    """
+    metadata = dict.fromkeys(FIELDS)
+    with open(path, "rb") as f:
+        if f.read(2) != b"\xff\xd8":
+            return metadata
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                break
+            if marker[1] in (0x01, 0xD8) or 0xD0 <= marker[1] <= 0xD7:
+                continue
+            if marker[1] in (0xD9, 0xDA):  # end of image, start of scan
+                break
+            length = f.read(2)
+            if len(length) < 2:
+                break
+            data = f.read(struct.unpack(">H", length)[0] - 2)
+            if marker[1] != 0xE1:
+                continue
+            try:
+                if data.startswith(_EXIF_HEADER):
+                    _parseExif(data[len(_EXIF_HEADER) :], metadata)
+                elif data.startswith(_XMP_HEADER):
+                    _parseXmp(data[len(_XMP_HEADER) :], metadata)
+            except (struct.error, ValueError, IndexError, ZeroDivisionError):
+                pass  # corrupt segment, keep what was parsed
+    return metadata
+
+
+def _parseExif(tiff: bytes, metadata: dict) -> None:
+    endian = {b"II": "<", b"MM": ">"}[tiff[:2]]
+    ifd0 = _readIfd(tiff, endian, struct.unpack_from(endian + "I", tiff, 4)[0])
+    exifIfd = (
+        _readIfd(tiff, endian, ifd0[0x8769][0]) if 0x8769 in ifd0 else {}
+    )  # Exif sub IFD
+    gpsIfd = _readIfd(tiff, endian, ifd0[0x8825][0]) if 0x8825 in ifd0 else {}
+    metadata["make"] = ifd0.get(0x010F)
+    metadata["model"] = ifd0.get(0x0110)
+    metadata["timestamp"] = exifIfd.get(0x9003) or ifd0.get(0x0132)
+    if 2 in gpsIfd and 4 in gpsIfd:
+        latitude = _toDegrees(gpsIfd[2])
+        longitude = _toDegrees(gpsIfd[4])
+        metadata["latitude"] = -latitude if gpsIfd.get(1) == "S" else latitude
+        metadata["longitude"] = -longitude if gpsIfd.get(3) == "W" else longitude
+    if 6 in gpsIfd:
+        below = gpsIfd.get(5, (0,))[0] == 1  # altitude reference 1: below sea level
+        metadata["altitude"] = -gpsIfd[6][0] if below else gpsIfd[6][0]
+
+
+def _readIfd(tiff: bytes, endian: str, offset: int) -> dict:
+    """Returns the values of the entries of the IFD at offset by tag (strings or tuples)."""
+    values = {}
+    count = struct.unpack_from(endian + "H", tiff, offset)[0]
+    for i in range(count):
+        entry = offset + 2 + 12 * i
+        tag, fieldType, n = struct.unpack_from(endian + "HHI", tiff, entry)
+        if fieldType not in _TYPE_SIZES:
+            continue
+        size = _TYPE_SIZES[fieldType] * n
+        if size > 4:
+            start = struct.unpack_from(endian + "I", tiff, entry + 8)[0]
+        else:
+            start = entry + 8
+        raw = tiff[start : start + size]
+        if fieldType == 2:
+            values[tag] = raw.split(b"\0")[0].decode("ascii", "replace").strip()
+        elif fieldType in (5, 10):
+            numbers = struct.unpack(
+                endian + ("I" if fieldType == 5 else "i") * 2 * n, raw
+            )
+            values[tag] = tuple(
+                a / b if b else 0.0 for a, b in zip(numbers[0::2], numbers[1::2])
+            )
+        else:
+            code = {1: "B", 3: "H", 4: "I", 7: "B", 9: "i"}[fieldType]
+            values[tag] = struct.unpack(endian + code * n, raw)
+    return values
+
+
+def _toDegrees(dms: tuple) -> float:
+    return dms[0] + dms[1] / 60 + dms[2] / 3600
+
+
+def _parseXmp(xmp: bytes, metadata: dict) -> None:
+    values = {}
+    for pattern in (_XMP_ATTRIBUTE, _XMP_ELEMENT):
+        for _, name, value in pattern.findall(xmp):
+            values.setdefault(name.decode(), value.decode(errors="replace"))
+    if "GPSXYAccuracy" in values:
+        metadata["xy_accuracy"] = float(values["GPSXYAccuracy"])
+    elif "RtkStdLon" in values and "RtkStdLat" in values:
+        metadata["xy_accuracy"] = max(
+            float(values["RtkStdLon"]), float(values["RtkStdLat"])
+        )
+    if "GPSZAccuracy" in values:
+        metadata["z_accuracy"] = float(values["GPSZAccuracy"])
+    elif "RtkStdHgt" in values:
+        metadata["z_accuracy"] = float(values["RtkStdHgt"])
+
+
+class MetadataCache:
+    """
+    SQLite cache of the EXIF/XMP metadata (FIELDS) of images,
+    keyed by path, size and modification time.
+
+    get parses uncached or changed images in maxWorkers threads (reading
+    headers is I/O bound) and stores them in one transaction, query only
+    returns what is cached, without touching the image files' contents.
+    The database can be shared by several processes (e.g. batch jobs and the GUI).
+    """
+
+    def __init__(self, dbPath: str, maxWorkers: int = 8):
+        self.dbPath = dbPath
+        self.maxWorkers = maxWorkers
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(dbPath)), exist_ok=True)
+        self._db = sqlite3.connect(dbPath, timeout=30, check_same_thread=False)
+        columns = ", ".join(FIELDS)
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS images (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, {columns})"
+        )
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def get(self, images: list[str]) -> dict[str, dict]:
+        """Returns the metadata of every image, parsing the images that are not cached."""
+        stats = {path: os.stat(path) for path in images}
+        metadata = self._select(stats)
+        missing = [path for path in images if path not in metadata]
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.maxWorkers) as executor:
+                parsed = list(executor.map(parseJpegMetadata, missing))
+            rows = [
+                (
+                    os.path.abspath(path),
+                    stats[path].st_size,
+                    stats[path].st_mtime_ns,
+                    *(m[field] for field in FIELDS),
+                )
+                for path, m in zip(missing, parsed)
+            ]
+            placeholders = ", ".join("?" * (3 + len(FIELDS)))
+            with self._lock, self._db:
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO images VALUES ({placeholders})", rows
+                )
+            metadata.update(zip(missing, parsed))
+        return metadata
+
+    def query(self, images: list[str]) -> dict[str, dict]:
+        """Returns the cached and up to date metadata of images, without parsing any image."""
+        stats = {}
+        for path in images:
+            try:
+                stats[path] = os.stat(path)
+            except OSError:
+                pass
+        return self._select(stats)
+
+    def _select(self, stats: dict) -> dict[str, dict]:
+        """Returns the cached metadata of the paths in stats whose size and mtime still match."""
+        byAbsPath = {os.path.abspath(path): path for path in stats}
+        absPaths = list(byAbsPath)
+        metadata = {}
+        with self._lock:
+            for start in range(0, len(absPaths), 500):
+                batch = absPaths[start : start + 500]
+                rows = self._db.execute(
+                    f"SELECT * FROM images WHERE path IN ({', '.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for absPath, size, mtimeNs, *values in rows:
+                    path = byAbsPath[absPath]
+                    stat = stats[path]
+                    if size == stat.st_size and mtimeNs == stat.st_mtime_ns:
+                        metadata[path] = dict(zip(FIELDS, values))
+        return metadata
+
+
+def summarize(records: list[dict]) -> dict:
+    """Returns image, GPS and accuracy counts, the time span and camera models of records."""
+    timestamps = sorted(r["timestamp"] for r in records if r["timestamp"])
+    return {
+        "images": len(records),
+        "withGps": sum(r["latitude"] is not None for r in records),
+        "withAccuracy": sum(r["xy_accuracy"] is not None for r in records),
+        "first": timestamps[0] if timestamps else None,
+        "last": timestamps[-1] if timestamps else None,
+        "cameras": sorted(
+            {f"{r['make'] or ''} {r['model'] or ''}".strip() for r in records} - {""}
+        ),
+    }
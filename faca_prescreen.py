@@ -0,0 +1,145 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sqlite3
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, pre-screening needs it
+    np = None
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, pre-screening needs it
+    Image = None
+
+# Shared by all runs, unless prescreen_cache is set. The image directories
+# are never written to: that would change their modification time, which
+# invalidates the listings cached by ImageIndex, and they may be read only.
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".faca", "prescreen.sqlite")
+SCORES = ("sharpness", "clipped", "brightness")
+
+
+def scoreImage(path: str, thumbnailSize: int) -> dict:
+    """
+    Returns the quality scores of the image at path, computed on a grey
+    thumbnail of about thumbnailSize pixels decoded in JPEG draft mode
+    (the JPEG is only decoded at 1/2 to 1/8 resolution):
+    sharpness (variance of the Laplacian), clipped (percent of pixels
+    <= 2 or >= 253) and brightness (mean grey value).
+    Returns None if the image can't be decoded.
+    """
+    try:
+        with Image.open(path) as image:
+            image.draft("L", (thumbnailSize, thumbnailSize))
+            image = image.convert("L")
+            image.thumbnail((thumbnailSize, thumbnailSize))
+            grey = np.asarray(image, dtype=np.float32)
+    except (OSError, ValueError):
+        return None
+    laplacian = (
+        grey[:-2, 1:-1]
+        + grey[2:, 1:-1]
+        + grey[1:-1, :-2]
+        + grey[1:-1, 2:]
+        - 4 * grey[1:-1, 1:-1]
+    )
+    return {
+        "sharpness": float(laplacian.var()),
+        "clipped": float(100 * np.mean((grey <= 2) | (grey >= 253))),
+        "brightness": float(grey.mean()),
+    }
+
+
+class ImagePrescreener:
+    """
+    Scores survey images for blur and exposure before they are added to Metashape.
+
+    Scores are cached in the SQLite database cachePath keyed by absolute
+    path, size, modification time and thumbnail size (like MetadataCache),
+    so only new or changed images are decoded again. Uncached images are
+    scored in a pool of maxWorkers processes.
+    """
+
+    def __init__(
+        self,
+        cachePath: str = DEFAULT_CACHE_PATH,
+        thumbnailSize: int = 256,
+        maxWorkers: int = None,
+    ):
+        if np is None or Image is None:
+            raise ImportError("Image pre-screening needs numpy and Pillow.")
+        self.thumbnailSize = thumbnailSize
+        self.maxWorkers = maxWorkers or os.cpu_count()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(cachePath)), exist_ok=True)
+        self._db = sqlite3.connect(cachePath, timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scores (path TEXT, thumbnail_size INTEGER, size INTEGER, mtime_ns INTEGER, "
+            f"{', '.join(SCORES)}, PRIMARY KEY (path, thumbnail_size))"
+        )
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def score(self, images: list[str]) -> dict[str, dict]:
+        """Returns the scores of every image in images (None if it can't be decoded)."""
+        stats = {path: os.stat(path) for path in images}
+        scores = self._select(stats)
+        uncached = [(path, stats[path]) for path in images if path not in scores]
+
+        if uncached:
+            paths = [path for path, _ in uncached]
+            if self.maxWorkers > 1 and len(paths) > 1:
+                with ProcessPoolExecutor(max_workers=self.maxWorkers) as executor:
+                    results = list(
+                        executor.map(
+                            scoreImage,
+                            paths,
+                            [self.thumbnailSize] * len(paths),
+                            chunksize=16,
+                        )
+                    )
+            else:
+                results = [scoreImage(path, self.thumbnailSize) for path in paths]
+            rows = [
+                (
+                    os.path.abspath(path),
+                    self.thumbnailSize,
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    *(result[s] if result else None for s in SCORES),
+                )
+                for (path, stat), result in zip(uncached, results)
+            ]
+            placeholders = ", ".join("?" * (4 + len(SCORES)))
+            with self._lock, self._db:
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO scores VALUES ({placeholders})", rows
+                )
+            scores.update(
+                (path, result) for (path, _), result in zip(uncached, results)
+            )
+        return scores
+
+    def _select(self, stats: dict) -> dict[str, dict]:
+        """Returns the cached scores of the paths in stats whose size and mtime still match."""
+        byAbsPath = {os.path.abspath(path): path for path in stats}
+        absPaths = list(byAbsPath)
+        scores = {}
+        with self._lock:
+            for start in range(0, len(absPaths), 500):
+                batch = absPaths[start : start + 500]
+                rows = self._db.execute(
+                    f"SELECT path, size, mtime_ns, {', '.join(SCORES)} FROM scores "
+                    f"WHERE thumbnail_size = ? AND path IN ({', '.join('?' * len(batch))})",
+                    [self.thumbnailSize, *batch],
+                ).fetchall()
+                for absPath, size, mtimeNs, *values in rows:
+                    path = byAbsPath[absPath]
+                    stat = stats[path]
+                    if size == stat.st_size and mtimeNs == stat.st_mtime_ns:
+                        scores[path] = (
+                            None if values[0] is None else dict(zip(SCORES, values))
+                        )
+        return scores
@@ -0,0 +1,159 @@
+import json
+import os
+import time
+
+# Shared by all runs and output directories, unless progress_history is set.
+DEFAULT_HISTORY_PATH = os.path.join(
+    os.path.expanduser("~"), ".faca", "progress_history.json"
+)
+
+
+class FacaCancelled(Exception):
+    """Raised inside FACA when a run was cancelled (see ProgressReporter.cancelEvent)."""
+
+
+class ProgressReporter:
+    """
+    Turns the progress callbacks of long Metashape operations into progress
+    messages with an estimated time of arrival (ETA).
+
+    callback() returns the function to pass as progress argument to a
+    Metashape operation. Metashape calls it very often, so it only compares
+    two timestamps and returns, unless interval seconds passed since the last
+    message. Messages are dicts (see _emit and startStage) passed to every sink.
+
+    If cancelEvent (e.g. a multiprocessing.Event) is set, the callbacks and
+    checkCancelled raise FacaCancelled, which aborts the running operation.
+
+    The ETA of the running operation is extrapolated from its progress.
+    The overall ETA adds the expected durations of the planned operations
+    (see setPlan), based on the seconds per image each operation took in
+    earlier runs. These are kept in historyPath. Only operations that
+    completed are recorded, see finish and abort.
+    """
+
+    def __init__(self, historyPath: str = None, interval: float = 10.0):
+        self.historyPath = historyPath
+        self.interval = interval
+        self.sinks = []
+        self.history = {}  # operation -> seconds per image
+        self.plan = []  # (operation, image count) still to run
+        self._current = None  # (operation, image count, start time)
+        self._lastEmit = 0.0
+        self._lastCancelCheck = 0.0
+        self.cancelEvent = None
+        self.stage = None
+        if historyPath and os.path.isfile(historyPath):
+            with open(historyPath, "r") as f:
+                self.history = json.load(f)
+
+    def addSink(self, sink) -> None:
+        """sink is called with every progress message dict."""
+        self.sinks.append(sink)
+
+    def startStage(self, stage: str) -> None:
+        """Sends a stage message to the sinks. Stage names end up in progress messages."""
+        self.checkCancelled()
+        self.stage = stage
+        for sink in self.sinks:
+            sink({"event": "stage", "stage": stage})
+
+    def checkCancelled(self) -> None:
+        if self.cancelEvent is not None and self.cancelEvent.is_set():
+            self.abort()
+            raise FacaCancelled()
+
+    def setPlan(self, plan: list[tuple[str, int]]) -> None:
+        """Sets the (operation, image count) pairs expected to run, in order."""
+        self.plan = list(plan)
+
+    def callback(self, operation: str, imageCount: int):
+        """
+        Finishes the previous operation and returns the progress callback for
+        operation, which processes imageCount images.
+        """
+        self.finish()
+        for i, (plannedOperation, _) in enumerate(self.plan):
+            if plannedOperation == operation:
+                del self.plan[i]
+                break
+        start = time.monotonic()
+        self._current = (operation, imageCount, start)
+        self._lastEmit = start
+
+        def progress(percent: float) -> None:
+            now = time.monotonic()
+            if now - self._lastCancelCheck >= 0.5:
+                self._lastCancelCheck = now
+                self.checkCancelled()
+            if now - self._lastEmit < self.interval:
+                return
+            self._lastEmit = now
+            self._emit(operation, imageCount, percent, now - start)
+
+        return progress
+
+    def abort(self) -> None:
+        """Forgets the running operation, it failed or was cancelled."""
+        self._current = None
+
+    def finish(self) -> None:
+        """Records the duration of the running operation, which completed, in the history."""
+        if self._current is None:
+            return
+        operation, imageCount, start = self._current
+        self._current = None
+        secondsPerImage = (time.monotonic() - start) / max(imageCount, 1)
+        if operation in self.history:
+            # smooth over runs, the newest run weighs half
+            secondsPerImage = (self.history[operation] + secondsPerImage) / 2
+        self.history[operation] = secondsPerImage
+        if self.historyPath:
+            os.makedirs(
+                os.path.dirname(os.path.abspath(self.historyPath)), exist_ok=True
+            )
+            # unique per process, parallel chunk workers share the history
+            tmpPath = f"{self.historyPath}.{os.getpid()}.tmp"
+            with open(tmpPath, "w") as f:
+                json.dump(self.history, f, indent=2)
+            os.replace(tmpPath, self.historyPath)
+
+    def _emit(self, operation: str, imageCount: int, percent: float, elapsed: float):
+        eta = None
+        if percent > 0:
+            eta = elapsed * (100 - percent) / percent
+        overallEta = eta
+        for plannedOperation, plannedImageCount in self.plan:
+            if overallEta is None or plannedOperation not in self.history:
+                overallEta = None
+                break
+            overallEta += self.history[plannedOperation] * plannedImageCount
+        message = {
+            "event": "progress",
+            "stage": self.stage,
+            "operation": operation,
+            "imageCount": imageCount,
+            "percent": percent,
+            "elapsed": elapsed,
+            "eta": eta,
+            "overallEta": overallEta,
+        }
+        for sink in self.sinks:
+            sink(message)
+
+
+def formatProgress(message: dict) -> str:
+    """e.g. 'matchPhotos 42.0 % - ETA 0:12:30 - overall ETA 2:10:00'"""
+    if message["event"] == "stage":
+        return f"Stage {message['stage']} started."
+    text = f"{message['operation']} {message['percent']:.1f} %"
+    text += f" - ETA {_formatSeconds(message['eta'])}"
+    text += f" - overall ETA {_formatSeconds(message['overallEta'])}"
+    return text
+
+
+def _formatSeconds(seconds: float) -> str:
+    if seconds is None:
+        return "unknown"
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
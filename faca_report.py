@@ -0,0 +1,185 @@
+import csv
+import json
+import math
+import os
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, CoalignmentReport needs it
+    np = None
+
+CAMERA_COLUMNS = (
+    "survey",
+    "camera",
+    "aligned",
+    "error_x",
+    "error_y",
+    "error_z",
+    "error",
+    "tie_points",
+    "reprojection_rms",
+)
+
+
+class CoalignmentReport:
+    """
+    Co-alignment quality of every survey (camera group) of the aligned chunk.
+
+    The Metashape API is only read once per camera (reference error) and once
+    per camera projection list (track ids), everything else is computed with
+    numpy arrays over all cameras:
+    - reference error: estimated minus reference camera position in the
+      local east/north/up frame (metres), RMS per survey.
+    - reprojection RMS: the RMS of the reprojection errors (pixels, the
+      ReprojectionError filter criterion) of the tie points of each camera.
+    - tie point multiplicity: the number of surveys seeing each tie point,
+      i.e. how many tie points a survey shares with the other surveys.
+
+    The survey chunks are clones of the aligned chunk with the same camera
+    alignment, so the report of the aligned chunk covers every survey chunk.
+    save writes <basePath>_cameras.csv (one row per camera) and
+    <basePath>.json (summary per survey).
+    """
+
+    def __init__(self, ms):
+        if np is None:
+            raise ImportError("The co-alignment report needs numpy.")
+        self.ms = ms
+        self.cameraRows = []
+        self.surveys = {}
+
+    def compute(self, chunk) -> dict:
+        """Computes the report of chunk and returns the summary per survey."""
+        cameras = [c for c in chunk.cameras if c.group is not None]
+        groupLabels = sorted({c.group.label for c in cameras})
+        groupIndex = np.array([groupLabels.index(c.group.label) for c in cameras])
+        aligned = np.array([c.transform is not None for c in cameras])
+        errors = self._getReferenceErrors(chunk, cameras)
+
+        points = chunk.tie_points.points
+        filter = self.ms.TiePoints.Filter()
+        filter.init(chunk, self.ms.TiePoints.Filter.ReprojectionError)
+        pointErrors = np.asarray(filter.values, dtype=np.float64)
+        trackIds = np.fromiter(
+            (p.track_id for p in points), dtype=np.int64, count=len(points)
+        )
+        trackToPoint = np.full(trackIds.max() + 1 if trackIds.size else 0, -1)
+        trackToPoint[trackIds] = np.arange(trackIds.size)
+
+        # (camera, tie point) of every projection onto a valid tie point
+        projections = chunk.tie_points.projections
+        projectionCameras, projectionPoints = [], []
+        for i, camera in enumerate(cameras):
+            if not aligned[i]:
+                continue
+            tracks = np.fromiter(
+                (p.track_id for p in projections[camera]), dtype=np.int64
+            )
+            tracks = tracks[tracks < trackToPoint.size]
+            pointIndices = trackToPoint[tracks]
+            pointIndices = pointIndices[pointIndices >= 0]
+            projectionPoints.append(pointIndices)
+            projectionCameras.append(np.full(pointIndices.size, i))
+        projectionPoints = np.concatenate(projectionPoints or [np.empty(0, np.int64)])
+        projectionCameras = np.concatenate(projectionCameras or [np.empty(0, np.int64)])
+
+        cameraTiePoints = np.bincount(projectionCameras, minlength=len(cameras))
+        squares = np.bincount(
+            projectionCameras,
+            weights=np.square(pointErrors[projectionPoints]),
+            minlength=len(cameras),
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            reprojectionRms = np.sqrt(squares / cameraTiePoints)
+
+        # surveys seeing each tie point
+        pointGroups = np.unique(
+            projectionPoints * len(groupLabels) + groupIndex[projectionCameras]
+        )
+        pointSurveys = np.bincount(
+            pointGroups // len(groupLabels), minlength=len(points)
+        )
+
+        self.cameraRows = [
+            {
+                "survey": camera.group.label,
+                "camera": camera.label,
+                "aligned": bool(aligned[i]),
+                "error_x": errors[i, 0],
+                "error_y": errors[i, 1],
+                "error_z": errors[i, 2],
+                "error": float(np.linalg.norm(errors[i])),
+                "tie_points": int(cameraTiePoints[i]),
+                "reprojection_rms": float(reprojectionRms[i]),
+            }
+            for i, camera in enumerate(cameras)
+        ]
+        self.surveys = {}
+        for g, label in enumerate(groupLabels):
+            inGroup = groupIndex == g
+            surveyPoints = np.unique(
+                projectionPoints[groupIndex[projectionCameras] == g]
+            )
+            multiplicity = np.bincount(pointSurveys[surveyPoints])
+            self.surveys[label] = {
+                "cameras": int(inGroup.sum()),
+                "aligned": int(aligned[inGroup].sum()),
+                "referenceError": self._summarizeErrors(errors[inGroup]),
+                "reprojectionRms": self._nanMean(reprojectionRms[inGroup]),
+                "tiePoints": int(surveyPoints.size),
+                "sharedTiePoints": int(np.sum(pointSurveys[surveyPoints] > 1)),
+                "surveysPerTiePoint": {
+                    str(n): int(count)
+                    for n, count in enumerate(multiplicity)
+                    if n and count
+                },
+            }
+        return self.surveys
+
+    def save(self, basePath: str) -> None:
+        """Writes basePath_cameras.csv and basePath.json, each through a temporary file."""
+        tmpPath = basePath + "_cameras.csv.tmp"
+        with open(tmpPath, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CAMERA_COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.cameraRows)
+        os.replace(tmpPath, basePath + "_cameras.csv")
+        tmpPath = basePath + ".json.tmp"
+        with open(tmpPath, "w") as f:
+            json.dump(self.surveys, f, indent=2)
+        os.replace(tmpPath, basePath + ".json")
+
+    def _getReferenceErrors(self, chunk, cameras: list):
+        """Returns the (n, 3) east, north, up errors of cameras in m, NaN without reference."""
+        errors = np.full((len(cameras), 3), np.nan)
+        if chunk.crs is None or chunk.transform.matrix is None:
+            return errors
+        crs, matrix = chunk.crs, chunk.transform.matrix
+        for i, camera in enumerate(cameras):
+            location = camera.reference.location
+            if camera.transform is None or location is None:
+                continue
+            estimated = matrix.mulp(camera.center)
+            error = estimated - crs.unproject(location)
+            errors[i] = list(crs.localframe(estimated).mulv(error))
+        return errors
+
+    def _summarizeErrors(self, errors) -> dict:
+        """Returns the count and RMS (x, y, z and total) of the rows of errors without NaN."""
+        errors = errors[~np.isnan(errors).any(axis=1)]
+        summary = {"count": int(len(errors))}
+        if len(errors):
+            rms = np.sqrt(np.mean(np.square(errors), axis=0))
+            summary.update(
+                {
+                    "rmsX": float(rms[0]),
+                    "rmsY": float(rms[1]),
+                    "rmsZ": float(rms[2]),
+                    "rms": float(math.sqrt(np.sum(np.square(rms)))),
+                }
+            )
+        return summary
+
+    def _nanMean(self, values) -> float:
+        values = values[~np.isnan(values)]
+        return float(values.mean()) if values.size else None
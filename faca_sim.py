@@ -0,0 +1,668 @@
+"""
+Deterministic in-memory simulation of the parts of the Metashape Python API
+FACA uses (see faca_backend).
+
+Nothing is actually computed: point counts follow simple models of the input
+(camera count, key point and tie point limits, downscale) and every tie point
+filter criterion follows a fixed distribution, so filtering at any threshold
+is O(1) even for millions of tie points. Long operations call their progress
+callback like Metashape does and add their simulated duration to
+simulatedSeconds. They only sleep if timeScale > 0 (real seconds per
+simulated second, environment variable FACA_SIM_TIME_SCALE).
+
+exportPointCloud writes small synthetic .las files (at most exportedPoints
+points) if numpy is installed, so the post-export stages can run offline.
+
+Projects are pickled into the .psx file, so saving, reopening (resume),
+the alignment cache and per chunk worker processes work like with Metashape.
+"""
+
+import math
+import os
+import pickle
+import time
+import zlib
+
+import faca_las
+
+version = "2.1.0 (simulated)"
+
+timeScale = float(os.environ.get("FACA_SIM_TIME_SCALE", 0))
+progressSteps = 100
+
+# simulated processing seconds per image of every long operation
+SECONDS_PER_IMAGE = {
+    "addPhotos": 0.001,
+    "matchPhotos": 0.5,
+    "alignCameras": 0.2,
+    "optimizeCameras": 0.05,
+    "buildDepthMaps": 2.0,
+    "buildPointCloud": 1.0,
+    "filterPointCloud": 0.05,
+    "exportPointCloud": 0.1,
+}
+# operation -> simulated seconds spent in this process
+simulatedSeconds = {}
+
+# depth map filter modes
+NoFiltering = 0
+MildFiltering = 1
+ModerateFiltering = 2
+AggressiveFiltering = 3
+_DENSE_POINTS_KEPT = {0: 1.0, 1: 0.95, 2: 0.9, 3: 0.85}
+
+# reference preselection modes
+ReferencePreselectionSource = 0
+ReferencePreselectionEstimated = 1
+ReferencePreselectionSequential = 2
+
+# point cloud export formats
+PointCloudFormatLAS = 1
+PointCloudFormatLAZ = 2
+# exported .las files get at most this many points (if numpy is installed)
+exportedPoints = 100_000
+
+
+def _run(operation: str, imageCount: int, progress=None) -> None:
+    seconds = SECONDS_PER_IMAGE[operation] * imageCount
+    simulatedSeconds[operation] = simulatedSeconds.get(operation, 0.0) + seconds
+    for step in range(progressSteps + 1):
+        if timeScale > 0 and step > 0:
+            time.sleep(seconds * timeScale / progressSteps)
+        if progress is not None:
+            progress(100.0 * step / progressSteps)
+
+
+class Vector:
+    def __init__(self, values):
+        self.values = list(values)
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __sub__(self, other):
+        return Vector(a - b for a, b in zip(self.values, other.values))
+
+    def __repr__(self):
+        return f"Vector({self.values})"
+
+
+class Matrix:
+    """
+    4 x 4 matrix, the identity by default: without a transform internal,
+    geocentric and projected coordinates are the same.
+    """
+
+    def __init__(self, rows=None):
+        if rows is None:
+            rows = [[float(i == j) for j in range(4)] for i in range(4)]
+        self.rows = [[float(value) for value in row] for row in rows]
+
+    def mulp(self, point: Vector) -> Vector:
+        values = list(point) + [1.0]
+        return Vector(sum(r * v for r, v in zip(row, values)) for row in self.rows[:3])
+
+    def mulv(self, vector: Vector) -> Vector:
+        return Vector(sum(r * v for r, v in zip(row, vector)) for row in self.rows[:3])
+
+    def __mul__(self, other):
+        columns = list(zip(*other.rows))
+        return Matrix(
+            [
+                [sum(a * b for a, b in zip(row, col)) for col in columns]
+                for row in self.rows
+            ]
+        )
+
+
+class ChunkTransform:
+    def __init__(self):
+        self.matrix = Matrix()
+
+
+class CoordinateSystem:
+    def __init__(self, name: str = ""):
+        self.name = name
+
+    def project(self, point: Vector) -> Vector:
+        return Vector(point)
+
+    def unproject(self, point: Vector) -> Vector:
+        return Vector(point)
+
+    def localframe(self, point: Vector) -> Matrix:
+        return Matrix()
+
+
+class Photo:
+    def __init__(self, path: str):
+        self.path = path
+
+
+class CameraReference:
+    def __init__(self):
+        self.location = None
+        self.accuracy = None
+        self.enabled = True
+
+
+class CameraGroup:
+    def __init__(self, key: int):
+        self.key = key
+        self.label = ""
+
+
+class Camera:
+    def __init__(self, key: int, path: str):
+        self.key = key
+        self.label = os.path.splitext(os.path.basename(path))[0]
+        self.photo = Photo(path)
+        self.group = None
+        self.enabled = True
+        self.reference = CameraReference()
+        self.transform = None
+
+    @property
+    def center(self) -> Vector:
+        """
+        The estimated position: the reference location plus a deterministic error
+        plus the translation of the alignment (see Chunk.alignCameras).
+        """
+        if self.transform is None:
+            return None
+        x, y, z = self.reference.location or (0.0, 0.0, 0.0)
+        return Vector(
+            [
+                x + 0.5 * math.sin(self.key) + self.transform[3],
+                y + 0.5 * math.cos(self.key) + self.transform[7],
+                z + math.sin(0.7 * self.key) + self.transform[11],
+            ]
+        )
+
+
+class TiePoint:
+    def __init__(self, track_id: int):
+        self.track_id = track_id
+        self.valid = True
+
+
+class Projection:
+    def __init__(self, track_id: int):
+        self.track_id = track_id
+
+
+class _Points:
+    """
+    Lazy tie point list. Point i belongs to track i, the points are only
+    created when accessed.
+    """
+
+    def __init__(self, count: int):
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i: int) -> TiePoint:
+        if not 0 <= i < self.count:
+            raise IndexError("tie point index out of range")
+        return TiePoint(i)
+
+    def __iter__(self):
+        return (TiePoint(i) for i in range(self.count))
+
+
+class _Projections:
+    """
+    Tie point projections per camera. The cameras of a chunk see
+    overlapping blocks of tracks in camera order, so every track is seen
+    by 3 cameras and neighbouring surveys share the tracks at their border.
+    """
+
+    def __init__(self, tiePoints, chunk):
+        self.tiePoints = tiePoints
+        self.cameraCount = len(chunk._cameras)
+        self.cameraIndices = {id(c): i for i, c in enumerate(chunk._cameras)}
+
+    def __getitem__(self, camera) -> list[Projection]:
+        index = self.cameraIndices[id(camera)]
+        count = len(self.tiePoints.points)
+        first = max(0, (index - 1) * count // self.cameraCount)
+        last = min(count, (index + 2) * count // self.cameraCount)
+        return [Projection(t) for t in range(first, last)]
+
+
+# Distributions of the tie point filter criterions. Error criterions are
+# exponential with the given mean, removePoints removes values above the
+# threshold. ImageCount is 2 + geometric(0.5), removePoints removes values
+# below the threshold.
+_ERROR_MEANS = {2: 5.0, 3: 25.0, 4: 0.4}
+
+
+class TiePoints:
+    class Filter:
+        ImageCount = 1
+        ProjectionAccuracy = 2
+        ReconstructionUncertainty = 3
+        ReprojectionError = 4
+
+        def __init__(self):
+            self.chunk = None
+            self.criterion = None
+
+        def init(self, chunk, criterion) -> None:
+            self.chunk = chunk
+            self.criterion = criterion
+
+        @property
+        def values(self) -> list[float]:
+            """The criterion value of every tie point (quantiles of the distribution)."""
+            tiePoints = self.chunk.tie_points
+            count = len(tiePoints.points)
+            cutoff = tiePoints.cutoffs.get(self.criterion)
+            if self.criterion == TiePoints.Filter.ImageCount:
+                low = 2 if cutoff is None else cutoff
+                return [
+                    float(low + int(math.log(1 - (i + 0.5) / count, 0.5)))
+                    for i in range(count)
+                ]
+            mean = _ERROR_MEANS[self.criterion]
+            kept = 1.0 if cutoff is None else 1 - math.exp(-cutoff / mean)
+            return [
+                -mean * math.log(1 - (i + 0.5) / count * kept) for i in range(count)
+            ]
+
+        def removePoints(self, threshold: float) -> None:
+            tiePoints = self.chunk.tie_points
+            cutoff = tiePoints.cutoffs.get(self.criterion)
+            if self.criterion == TiePoints.Filter.ImageCount:
+                low = 2 if cutoff is None else cutoff
+                threshold = math.ceil(threshold)
+                if threshold <= low:
+                    return
+                kept = 0.5 ** (threshold - low)
+            else:
+                mean = _ERROR_MEANS[self.criterion]
+                if cutoff is not None and threshold >= cutoff:
+                    return
+                keptBefore = 1.0 if cutoff is None else 1 - math.exp(-cutoff / mean)
+                kept = (1 - math.exp(-threshold / mean)) / keptBefore
+            tiePoints.cutoffs[self.criterion] = threshold
+            tiePoints.points = _Points(int(len(tiePoints.points) * kept))
+
+    def __init__(self, count: int, chunk=None):
+        self.points = _Points(count)
+        self.cutoffs = {}  # criterion -> threshold of the last removal
+        self.chunk = chunk
+
+    @property
+    def projections(self) -> _Projections:
+        return _Projections(self, self.chunk)
+
+
+class DepthMaps:
+    pass
+
+
+class PointCloud:
+    """
+    Point confidences (if built with point_confidence) are modelled as
+    1 + geometric(0.25), i.e. 25 % of the points have confidence 1.
+    """
+
+    def __init__(self, count: int, confidence: bool = False):
+        self.count = count
+        self.confidence = confidence
+        self.minConfidence = 1  # lowest confidence left
+        self.confidenceFilter = None  # (min, max)
+
+    def __str__(self):
+        return f"<PointCloud '{self.count} points'>"
+
+    def setConfidenceFilter(self, min_confidence: int, max_confidence: int) -> None:
+        if not self.confidence:
+            raise RuntimeError("Point cloud has no confidence")
+        self.confidenceFilter = (min_confidence, max_confidence)
+
+    def resetFilters(self) -> None:
+        self.confidenceFilter = None
+
+    def removePoints(self, point_classes) -> None:
+        """Removes the points of point_classes passing the confidence filter."""
+        if self.confidenceFilter is None:
+            self.count = 0
+            return
+        low, high = self.confidenceFilter
+        if low > self.minConfidence or high < self.minConfidence:
+            return
+        # the points between minConfidence and high are removed
+        kept = 0.75 ** (high + 1 - self.minConfidence)
+        self.count = int(self.count * kept)
+        self.minConfidence = high + 1
+
+
+class Chunk:
+    def __init__(self, doc, key: int):
+        self._doc = doc
+        self.key = key
+        self.label = f"Chunk {key + 1}"
+        self._cameras = []
+        self._groups = []
+        self._nextKey = 0
+        self.keypoints = False
+        self.matchLimits = None  # (downscale, keypoint_limit, tiepoint_limit)
+        self.matchPairs = None  # number of explicit pairs of the last matchPhotos
+        self.matchedCameras = 0  # cameras matched so far
+        self.alignedCameras = 0  # cameras aligned so far
+        self.groupShifts = {}  # camera group key -> x shift (m) of its alignment
+        self.tie_points = None
+        self.depth_maps = None
+        self.depthDownscale = None
+        self.depthFilterMode = None
+        self.point_cloud = None
+        self.crs = CoordinateSystem("EPSG::32632")
+        self.transform = ChunkTransform()
+
+    @property
+    def cameras(self) -> list[Camera]:
+        # Metashape returns a new list on every access, too.
+        return list(self._cameras)
+
+    @property
+    def camera_groups(self) -> list[CameraGroup]:
+        return list(self._groups)
+
+    def _newKey(self) -> int:
+        self._nextKey += 1
+        return self._nextKey - 1
+
+    def addCameraGroup(self) -> CameraGroup:
+        group = CameraGroup(self._newKey())
+        self._groups.append(group)
+        return group
+
+    def addPhotos(self, filenames, load_xmp_accuracy=False, progress=None, **kwargs):
+        directoryCounts = {}
+        for camera in self._cameras:
+            directory = os.path.dirname(camera.photo.path)
+            directoryCounts[directory] = directoryCounts.get(directory, 0) + 1
+        newCounts = {}
+        for path in filenames:
+            directory = os.path.dirname(path)
+            newCounts[directory] = newCounts.get(directory, 0) + 1
+        for path in filenames:
+            camera = Camera(self._newKey(), path)
+            # Repeat flights: the GPS positions of every image directory are on
+            # the same square 30 m grid, 100 m above ground, shifted by a few m.
+            directory = os.path.dirname(path)
+            index = directoryCounts.get(directory, 0)
+            directoryCounts[directory] = index + 1
+            width = math.ceil(math.sqrt(newCounts[directory]))
+            offset = zlib.crc32(directory.encode())
+            camera.reference.location = Vector(
+                [
+                    500_000 + 30.0 * (index % width) + offset % 5,
+                    5_500_000 + 30.0 * (index // width) + offset // 5 % 5,
+                    200.0,
+                ]
+            )
+            self._cameras.append(camera)
+        _run("addPhotos", len(filenames), progress)
+
+    def matchPhotos(
+        self,
+        downscale=1,
+        keypoint_limit=40000,
+        tiepoint_limit=4000,
+        generic_preselection=True,
+        reference_preselection=True,
+        reference_preselection_mode=ReferencePreselectionSource,
+        pairs=None,
+        keep_keypoints=False,
+        reset_matches=False,
+        progress=None,
+    ):
+        keys = {camera.key for camera in self._cameras}
+        if pairs is not None and not all(a in keys and b in keys for a, b in pairs):
+            raise ValueError("Can't match photos: unknown camera key in pairs")
+        if reset_matches or not self.keypoints:
+            self.matchedCameras = 0
+        # with kept key points only the new cameras are matched, otherwise
+        # the key points of all cameras are detected again
+        _run("matchPhotos", len(self._cameras) - self.matchedCameras, progress)
+        self.matchedCameras = len(self._cameras)
+        # Metashape discards the key points after matching by default
+        self.keypoints = keep_keypoints
+        self.matchLimits = (downscale, keypoint_limit, tiepoint_limit)
+        self.matchPairs = None if pairs is None else len(pairs)
+
+    def alignCameras(self, adaptive_fitting=False, reset_alignment=True, progress=None):
+        if self.matchLimits is None:
+            raise RuntimeError("Can't align cameras: no matching results")
+        _run("alignCameras", len(self._cameras), progress)
+        newCount = len(self._cameras) - self.alignedCameras
+        if self.alignedCameras and newCount > 0:
+            # New cameras move the solution of the existing ones a little, the
+            # more the later their group and the more new cameras there are.
+            for i, group in enumerate(self._groups):
+                self.groupShifts[group.key] = self.groupShifts.get(
+                    group.key, 0.0
+                ) + 0.1 * newCount / len(self._cameras) * (i + 1) / len(self._groups)
+        for camera in self._cameras:
+            if not camera.enabled:
+                camera.transform = None
+            elif camera.transform is None or reset_alignment or newCount > 0:
+                shift = self.groupShifts.get(camera.group and camera.group.key, 0.0)
+                camera.transform = Vector(
+                    [1.0, 0, 0, shift, 0, 1.0, 0, 0, 0, 0, 1.0, 0, 0, 0, 0, 1.0]
+                )
+        downscale, keypointLimit, tiepointLimit = self.matchLimits
+        perImage = min(tiepointLimit or 10000, keypointLimit or 60000)
+        # 3/4 of the matches are valid, every tie point is seen by 3 images,
+        # coarser downscales find fewer matches
+        perImage = perImage / 4 / max(downscale, 1) ** 0.5
+        if self.tie_points is None or reset_alignment:
+            self.tie_points = TiePoints(int(len(self._cameras) * perImage), self)
+        elif len(self._cameras) > self.alignedCameras:
+            # incremental alignment adds the tie points of the new cameras
+            newPoints = int((len(self._cameras) - self.alignedCameras) * perImage)
+            self.tie_points.points = _Points(len(self.tie_points.points) + newPoints)
+        self.alignedCameras = len(self._cameras)
+
+    def optimizeCameras(self, progress=None, **kwargs):
+        _run("optimizeCameras", len(self._cameras), progress)
+
+    def buildDepthMaps(self, downscale=4, filter_mode=MildFiltering, progress=None):
+        if self.tie_points is None:
+            raise RuntimeError("Can't build depth maps: cameras not aligned")
+        _run("buildDepthMaps", len(self._cameras), progress)
+        self.depth_maps = DepthMaps()
+        self.depthDownscale = downscale
+        self.depthFilterMode = filter_mode
+
+    def buildPointCloud(self, point_confidence=False, progress=None, **kwargs):
+        if self.depth_maps is None:
+            raise RuntimeError("Can't build point cloud: no depth maps")
+        _run("buildPointCloud", len(self._cameras), progress)
+        # 24 MP images, every point seen by 8 depth maps
+        perImage = 24_000_000 // self.depthDownscale**2 // 8
+        kept = _DENSE_POINTS_KEPT[self.depthFilterMode]
+        self.point_cloud = PointCloud(
+            int(len(self._cameras) * perImage * kept), point_confidence
+        )
+
+    def filterPointCloud(self, point_spacing=0, progress=None, **kwargs):
+        """Thins the point cloud to one point per point_spacing x point_spacing."""
+        if self.point_cloud is None:
+            raise RuntimeError("Null point cloud")
+        _run("filterPointCloud", len(self._cameras), progress)
+        if point_spacing > 0:
+            # every image covers 30 x 30 m
+            maxCount = int(900 * len(self._cameras) / point_spacing**2)
+            self.point_cloud.count = min(self.point_cloud.count, maxCount)
+
+    def exportPointCloud(
+        self,
+        path="",
+        crs=None,
+        format=PointCloudFormatLAS,
+        split_in_blocks=False,
+        block_width=1000,
+        block_height=1000,
+        progress=None,
+        **kwargs,
+    ):
+        if self.point_cloud is None:
+            raise RuntimeError("Null point cloud")
+        _run("exportPointCloud", len(self._cameras), progress)
+        # every image covers 30 x 30 m
+        side = 30 * len(self._cameras) ** 0.5
+        tiles = {(0, 0): path}
+        if split_in_blocks:
+            base, extension = os.path.splitext(path)
+            tiles = {
+                (i, j): f"{base}-{i}-{j}{extension}"
+                for i in range(math.ceil(side / block_width))
+                for j in range(math.ceil(side / block_height))
+            }
+        if faca_las.np is None or format != PointCloudFormatLAS:
+            for tilePath in tiles.values():
+                with open(tilePath, "w") as f:
+                    f.write(
+                        f"simulated point cloud of {self.label}: {self.point_cloud}\n"
+                    )
+            return
+        np = faca_las.np
+        # a gently undulating surface in UTM coordinates
+        rng = np.random.default_rng(zlib.crc32(self.label.encode()))
+        count = min(self.point_cloud.count, exportedPoints)
+        xy = rng.uniform(0, side, (count, 2))
+        z = 100 + 5 * np.sin(xy[:, 0] / 20) * np.cos(xy[:, 1] / 30)
+        xyz = np.column_stack([xy + (500_000, 5_500_000), z])
+        for (i, j), tilePath in tiles.items():
+            if split_in_blocks:
+                inTile = (xy[:, 0] // block_width == i) & (
+                    xy[:, 1] // block_height == j
+                )
+                faca_las.writeLas(tilePath, xyz[inTile])
+            else:
+                faca_las.writeLas(tilePath, xyz)
+
+    def copy(self, keypoints=True):
+        """Copies the chunk into its document, like Metashape.Chunk.copy."""
+        newChunk = self._copy(self._doc, self._doc._newKey())
+        newChunk.keypoints = self.keypoints and keypoints
+        newChunk.label = self.label + " (copy)"
+        self._doc._chunks.append(newChunk)
+        return newChunk
+
+    def _copy(self, doc, key: int):
+        newChunk = Chunk(doc, key)
+        newChunk.label = self.label
+        newChunk._nextKey = self._nextKey
+        newChunk.keypoints = self.keypoints
+        newChunk.matchLimits = self.matchLimits
+        newChunk.transform.matrix = self.transform.matrix
+        newChunk.matchedCameras = self.matchedCameras
+        newChunk.alignedCameras = self.alignedCameras
+        newChunk.groupShifts = dict(self.groupShifts)
+        groups = {}
+        for group in self._groups:
+            newGroup = CameraGroup(group.key)
+            newGroup.label = group.label
+            groups[id(group)] = newGroup
+            newChunk._groups.append(newGroup)
+        for camera in self._cameras:
+            newCamera = Camera(camera.key, camera.photo.path)
+            newCamera.group = groups.get(id(camera.group))
+            newCamera.enabled = camera.enabled
+            newCamera.reference.location = camera.reference.location
+            newCamera.reference.accuracy = camera.reference.accuracy
+            newCamera.transform = camera.transform
+            newChunk._cameras.append(newCamera)
+        if self.tie_points is not None:
+            newChunk.tie_points = TiePoints(len(self.tie_points.points), newChunk)
+            newChunk.tie_points.cutoffs = dict(self.tie_points.cutoffs)
+        newChunk.depth_maps = self.depth_maps
+        newChunk.depthDownscale = self.depthDownscale
+        newChunk.depthFilterMode = self.depthFilterMode
+        newChunk.point_cloud = self.point_cloud
+        return newChunk
+
+    def remove(self, items) -> None:
+        """Removes cameras and camera groups (with their cameras)."""
+        groupIds = {id(i) for i in items if isinstance(i, CameraGroup)}
+        cameraIds = {id(i) for i in items if isinstance(i, Camera)}
+        before = len(self._cameras)
+        self._groups = [g for g in self._groups if id(g) not in groupIds]
+        self._cameras = [
+            c
+            for c in self._cameras
+            if id(c) not in cameraIds and id(c.group) not in groupIds
+        ]
+        if self.tie_points is not None and before:
+            # tie points only seen by removed cameras disappear
+            kept = len(self._cameras) / before
+            self.tie_points.points = _Points(int(len(self.tie_points.points) * kept))
+
+
+class Document:
+    def __init__(self):
+        self._chunks = []
+        self._nextKey = 0
+        self.path = ""
+        self.read_only = False
+
+    @property
+    def chunks(self) -> list[Chunk]:
+        return list(self._chunks)
+
+    @property
+    def chunk(self) -> Chunk:
+        return self._chunks[0] if self._chunks else None
+
+    def _newKey(self) -> int:
+        self._nextKey += 1
+        return self._nextKey - 1
+
+    def addChunk(self) -> Chunk:
+        chunk = Chunk(self, self._newKey())
+        self._chunks.append(chunk)
+        return chunk
+
+    def append(self, document, chunks=None) -> None:
+        """Appends copies of chunks (default: all chunks) of document."""
+        for chunk in document.chunks if chunks is None else chunks:
+            self._chunks.append(chunk._copy(self, self._newKey()))
+
+    def remove(self, items) -> None:
+        ids = {id(i) for i in items}
+        self._chunks = [c for c in self._chunks if id(c) not in ids]
+
+    def save(self, path=None) -> None:
+        if path is None:
+            if self.read_only or not self.path:
+                raise OSError("Can't save document: read only or no path")
+            path = self.path
+        tmpPath = path + ".tmp"
+        with open(tmpPath, "wb") as f:
+            pickle.dump((self._chunks, self._nextKey), f)
+        os.replace(tmpPath, path)
+        self.path = path
+        self.read_only = False
+
+    def open(self, path, read_only=False, ignore_lock=False) -> None:
+        if not os.path.isfile(path):
+            raise OSError(f"Can't open file: {path}")
+        with open(path, "rb") as f:
+            self._chunks, self._nextKey = pickle.load(f)
+        for chunk in self._chunks:
+            chunk._doc = self
+        self.path = path
+        self.read_only = read_only
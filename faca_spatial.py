@@ -0,0 +1,58 @@
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, spatial preselection needs it
+    np = None
+
+# half of the 3 x 3 cell neighbourhood, so every pair of cells is visited once
+_NEIGHBOUR_CELLS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+def getCandidatePairs(positions, radius: float):
+    """
+    Returns the (m, 2) indices (i < j) of all positions (n, 2) closer than radius.
+
+    The positions are hashed into a grid of radius x radius cells and sorted
+    by cell, so the candidates of every point are found with searchsorted in
+    its own and the neighbouring cells, in O(n log n + m) without a Python loop
+    over the points.
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    if len(positions) < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    cells = np.floor(positions / radius).astype(np.int64)
+    cells -= cells.min(axis=0) - 1  # neighbours of the first cells stay >= 0
+    rowLength = int(cells[:, 1].max()) + 2
+    keys = cells[:, 0] * rowLength + cells[:, 1]
+    order = np.argsort(keys, kind="stable")
+    sortedKeys = keys[order]
+    pairs = []
+    for dx, dy in _NEIGHBOUR_CELLS:
+        neighbourKeys = (cells[:, 0] + dx) * rowLength + cells[:, 1] + dy
+        starts = np.searchsorted(sortedKeys, neighbourKeys, side="left")
+        counts = np.searchsorted(sortedKeys, neighbourKeys, side="right") - starts
+        i = np.repeat(np.arange(len(positions)), counts)
+        firsts = np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(starts, counts) + np.arange(counts.sum()) - firsts]
+        if (dx, dy) == (0, 0):
+            i, j = i[i < j], j[i < j]
+        close = np.sum(np.square(positions[i] - positions[j]), axis=1) <= radius**2
+        pairs.append(np.column_stack([np.minimum(i, j), np.maximum(i, j)])[close])
+    return np.concatenate(pairs)
+
+
+def estimateSpacing(positions, sampleSize: int = 1000) -> float:
+    """Returns the median nearest neighbour distance of (up to sampleSize) positions."""
+    positions = np.asarray(positions, dtype=np.float64)
+    if len(positions) < 2:
+        return 0.0
+    sample = np.linspace(0, len(positions) - 1, min(sampleSize, len(positions)))
+    sample = np.unique(sample.astype(np.int64))
+    nearest = []
+    for start in range(0, len(sample), 100):
+        indices = sample[start : start + 100]
+        distances = np.sum(
+            np.square(positions[indices, None, :] - positions[None, :, :]), axis=2
+        )
+        distances[np.arange(len(indices)), indices] = np.inf
+        nearest.append(np.sqrt(distances.min(axis=1)))
+    return float(np.median(np.concatenate(nearest)))
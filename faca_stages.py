@@ -0,0 +1,59 @@
+import json
+import os
+
+
+class StageManifest:
+    """
+    Keeps track of the finished FACA stages of a project.
+
+    The manifest is a small json file next to the Metashape project
+    (e.g. faca.psx.stages.json). A stage is only marked as done after the
+    project has been saved, so the .psx on disk always contains at least the
+    results of every stage listed in the manifest.
+    Stages read by load() are remembered as finished in an earlier run.
+    """
+
+    def __init__(self, projectPath: str):
+        self.path = projectPath + ".stages.json"
+        self.stages = []
+        self.earlierStages = set()  # finished before this run, see load
+
+    def load(self) -> None:
+        """Reads finished stages from the manifest file if it exists."""
+        if not os.path.isfile(self.path):
+            self.stages = []
+        else:
+            with open(self.path, "r") as f:
+                self.stages = json.load(f).get("stages", [])
+        self.earlierStages = set(self.stages)
+
+    def reset(self) -> None:
+        """Forgets all finished stages, e.g. when a calculation starts from scratch."""
+        self.stages = []
+        self.earlierStages = set()
+        self._write()
+
+    def isDone(self, stage: str) -> bool:
+        return stage in self.stages
+
+    def isDoneEarlier(self, stage: str) -> bool:
+        """True if stage was finished before this run, i.e. it is skipped on resume."""
+        return stage in self.earlierStages
+
+    def setDone(self, stage: str) -> None:
+        if stage not in self.stages:
+            self.stages.append(stage)
+        self._write()
+
+    def setNotDone(self, stages: list[str]) -> None:
+        """Marks stages as not done, e.g. when their results are outdated."""
+        self.stages = [s for s in self.stages if s not in stages]
+        self.earlierStages.difference_update(stages)
+        self._write()
+
+    def _write(self) -> None:
+        # write to a temporary file first, so a crash never leaves a broken manifest
+        tmpPath = self.path + ".tmp"
+        with open(tmpPath, "w") as f:
+            json.dump({"stages": self.stages}, f, indent=2)
+        os.replace(tmpPath, self.path)
@@ -0,0 +1,126 @@
+import json
+import os
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, TiePointStats needs it
+    np = None
+
+CRITERIONS = (
+    "ImageCount",
+    "ProjectionAccuracy",
+    "ReconstructionUncertainty",
+    "ReprojectionError",
+)
+
+
+class TiePointStats:
+    """
+    Tie point quality statistics of every tie point filter pass.
+
+    addPass reads the values of all four filter criterions into numpy arrays
+    and computes percentiles and histograms, for all tie points and for the
+    tie points seen by each camera group (survey). Survey membership is read
+    once per chunk from the camera projections (track ids), after that every
+    pass is vectorised except reading the track ids of the remaining points.
+
+    save writes <basePath>.json (summaries of all passes) and
+    <basePath>.npz (histogram counts and edges, keys like
+    "p1_ReprojectionError_hist" and "p1_survey_2019_ReprojectionError_edges").
+    """
+
+    PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+    def __init__(self, ms, bins: int = 50, perSurvey: bool = True):
+        if np is None:
+            raise ImportError("Tie point statistics need numpy.")
+        self.ms = ms
+        self.bins = bins
+        self.perSurvey = perSurvey
+        self.passes = []
+        self.arrays = {}
+        self._groupTracks = {}  # chunk key -> {group label: sorted track ids}
+
+    def addPass(self, chunk, name: str) -> dict:
+        """Computes the statistics of the current tie points of chunk as pass name."""
+        points = chunk.tie_points.points
+        values = {}
+        for criterionStr in CRITERIONS:
+            filter = self.ms.TiePoints.Filter()
+            filter.init(chunk, getattr(self.ms.TiePoints.Filter, criterionStr))
+            values[criterionStr] = np.asarray(filter.values, dtype=np.float64)
+
+        index = len(self.passes) + 1
+        record = {"pass": index, "name": name, "tiePoints": len(points)}
+        record["criterions"] = self._summarize(values, f"p{index}")
+        if self.perSurvey:
+            trackIds = np.fromiter(
+                (p.track_id for p in points), dtype=np.int64, count=len(points)
+            )
+            record["surveys"] = {}
+            for label, tracks in self._getGroupTracks(chunk).items():
+                mask = np.isin(trackIds, tracks, assume_unique=True)
+                record["surveys"][label] = {
+                    "tiePoints": int(mask.sum()),
+                    "criterions": self._summarize(
+                        {c: v[mask] for c, v in values.items()},
+                        f"p{index}_survey_{label}",
+                    ),
+                }
+        self.passes.append(record)
+        return record
+
+    def save(self, basePath: str) -> None:
+        """Writes basePath.json and basePath.npz, each through a temporary file."""
+        tmpPath = basePath + ".tmp.npz"
+        np.savez_compressed(tmpPath, **self.arrays)
+        os.replace(tmpPath, basePath + ".npz")
+        tmpPath = basePath + ".json.tmp"
+        with open(tmpPath, "w") as f:
+            json.dump(self.passes, f, indent=2)
+        os.replace(tmpPath, basePath + ".json")
+
+    def _summarize(self, values: dict, prefix: str) -> dict:
+        """Returns count, mean and percentiles per criterion, stores the histograms."""
+        summaries = {}
+        for criterionStr, v in values.items():
+            summary = {"count": int(v.size)}
+            if v.size:
+                percentiles = np.percentile(v, self.PERCENTILES)
+                summary["min"] = float(v.min())
+                summary["mean"] = float(v.mean())
+                summary["max"] = float(v.max())
+                summary["percentiles"] = {
+                    str(p): float(x) for p, x in zip(self.PERCENTILES, percentiles)
+                }
+                counts, edges = np.histogram(v, bins=self.bins)
+                self.arrays[f"{prefix}_{criterionStr}_hist"] = counts
+                self.arrays[f"{prefix}_{criterionStr}_edges"] = edges
+            summaries[criterionStr] = summary
+        return summaries
+
+    def _getGroupTracks(self, chunk) -> dict:
+        """Returns the track ids seen by the cameras of every camera group of chunk."""
+        if chunk.key in self._groupTracks:
+            return self._groupTracks[chunk.key]
+        projections = chunk.tie_points.projections
+        trackLists = {}
+        for camera in chunk.cameras:
+            if camera.group is None:
+                continue
+            cameraProjections = projections[camera]
+            if not cameraProjections:
+                continue
+            trackLists.setdefault(camera.group.label, []).append(
+                np.fromiter(
+                    (p.track_id for p in cameraProjections),
+                    dtype=np.int64,
+                    count=len(cameraProjections),
+                )
+            )
+        groupTracks = {
+            label: np.unique(np.concatenate(lists))
+            for label, lists in trackLists.items()
+        }
+        self._groupTracks[chunk.key] = groupTracks
+        return groupTracks
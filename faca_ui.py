@@ -2,11 +2,119 @@ import configparser
 from idlelib.tooltip import Hovertip
 import multiprocessing
 import os
+import queue
 from tkinter import *
 from tkinter import filedialog
 from tkinter.ttk import *
+import traceback
+
+from faca_index import imageIndex
+from faca_metadata import DEFAULT_CACHE_PATH, MetadataCache
+from faca_progress import FacaCancelled, formatProgress
+
+
+class RunManager:
+    """
+    Runs one FACA calculation at a time in a worker process without blocking
+    the UI.
+
+    The worker sends its stage and progress messages (see ProgressReporter)
+    and finally a "done", "cancelled" or "error" message over a
+    multiprocessing.Queue. poll() drains the queue every poll_ms
+    milliseconds via root.after and passes the messages to on_message.
+    cancel() asks the worker to stop: the running Metashape operation is
+    aborted and the .psx stays at the last finished stage, so the run can be
+    resumed.
+    root only needs an after() method, so the manager also works without a
+    display (e.g. with a stub calc_class).
+    """
+
+    def __init__(self, root, calc_class, on_message, poll_ms: int = 200):
+        self.root = root
+        self.calc_class = calc_class
+        self.on_message = on_message
+        self.poll_ms = poll_ms
+        self.process = None
+        self.queue = None
+        self.cancel_event = None
+
+    def is_running(self) -> bool:
+        return self.process is not None
+
+    def start(self, settings: dict) -> bool:
+        """Starts a run with settings. Returns False if a run is still active."""
+        if self.is_running():
+            return False
+        self.queue = multiprocessing.Queue()
+        self.cancel_event = multiprocessing.Event()
+        self.process = multiprocessing.Process(
+            target=RunManager.run_worker,
+            args=(self.calc_class, settings, self.queue, self.cancel_event),
+        )
+        self.process.start()
+        self.root.after(self.poll_ms, self.poll)
+        return True
 
-from faca_calc import FacaCalc
+    def cancel(self) -> None:
+        if self.is_running():
+            self.cancel_event.set()
+
+    def poll(self) -> None:
+        """Passes queued messages to on_message. Reschedules itself until the run ended."""
+        finished = not self.process.is_alive()
+        finished_message = False
+        while True:
+            try:
+                message = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            finished_message |= message["event"] in ("done", "cancelled", "error")
+            self.on_message(message)
+        if not finished:
+            self.root.after(self.poll_ms, self.poll)
+            return
+        self.process.join()
+        if not finished_message:
+            # worker died without reporting, e.g. killed or crashed in Metashape
+            self.on_message(
+                {
+                    "event": "error",
+                    "error": f"Worker exited with code {self.process.exitcode}.",
+                    "traceback": "",
+                }
+            )
+        self.process = None
+        self.queue = None
+        self.cancel_event = None
+
+    @staticmethod
+    def run_worker(calc_class, settings: dict, message_queue, cancel_event) -> None:
+        """Runs in the worker process."""
+        f = None
+        try:
+            f = calc_class(**settings)
+            f.progress.cancelEvent = cancel_event
+            f.progress.addSink(message_queue.put)
+            ok = f.main()
+            message_queue.put({"event": "done", "ok": ok, "stageTimes": f.stageTimes})
+        except Exception as e:
+            # Metashape may wrap FacaCancelled raised in a progress callback.
+            if isinstance(e, FacaCancelled) or cancel_event.is_set():
+                if f is not None:
+                    f.l.lwt(
+                        "cancelled. The project is saved at the last finished stage."
+                    )
+                message_queue.put({"event": "cancelled"})
+            else:
+                if f is not None:
+                    f.l.l(traceback.format_exc())
+                message_queue.put(
+                    {
+                        "event": "error",
+                        "error": repr(e),
+                        "traceback": traceback.format_exc(),
+                    }
+                )
 
 
 class FacaUi(Frame):
@@ -15,6 +123,7 @@ class FacaUi(Frame):
         self.root = root
         self.init_ui()
         self.facacalc = calcClass
+        self.run_manager = RunManager(root, calcClass, self.on_run_message)
         if os.path.isfile("faca.ini"):
             self.ini_file = os.path.abspath("faca.ini")
             self._replace_entry(self.ini_path_entry, self.ini_file)
@@ -323,11 +432,31 @@ class FacaUi(Frame):
         )
         self.save_to_ini_button.grid(row=9, column=1, padx=5, pady=5, sticky=W)
 
+        self.resume_checkbutton = Checkbutton(
+            self.root, text="Resume", onvalue=1, offvalue=0
+        )
+        self.resume_checkbutton.state(["!alternate"])
+        self.resume_tooltip = Hovertip(
+            self.resume_checkbutton,
+            "Continues the project in the output directory at the last finished stage.\nUnchecked, FACA starts over.",
+        )
+        self.resume_checkbutton.grid(row=9, column=2, padx=5, pady=5, sticky=W)
+
+        self.cancel_button = Button(
+            self.root, text="Cancel Run", command=self.on_cancel_button_clicked
+        )
+        self.cancel_button.grid(row=9, column=3, padx=5, pady=5, sticky=W)
+        self.cancel_button["state"] = "disabled"
+
         self.exit_button = Button(self.root, text="Exit", command=self.root.destroy)
         self.exit_button.grid(row=9, column=5, padx=5, pady=5, sticky=W)
 
-        progress = Progressbar(self.root, orient="horizontal", length=1200)
-        progress.grid(row=11, column=0, padx=5, pady=5, sticky="nsew", columnspan=6)
+        self.status_label = Label(self.root, text="")
+        self.status_label.grid(row=10, column=0, padx=5, pady=5, sticky=W, columnspan=6)
+        self.progress_bar = Progressbar(self.root, orient="horizontal", length=1200)
+        self.progress_bar.grid(
+            row=11, column=0, padx=5, pady=5, sticky="nsew", columnspan=6
+        )
 
     def update_ui_with_ini_section(self, event) -> None:
         """Called when self.ini_section_combobox changes AND when a new .ini file is selected.
@@ -610,6 +739,7 @@ class FacaUi(Frame):
             image_count, subdir_count = self._get_subdir_and_image_counts(abs_in_path)
             self.in_path_info_label["text"] = (
                 f"Found {image_count} .jpg files in {subdir_count} subdirectories."
+                + self._get_gps_count_text(abs_in_path)
             )
         else:
             self.in_path_info_label["text"] = (
@@ -619,17 +749,28 @@ class FacaUi(Frame):
     def _get_subdir_and_image_counts(self, path: str) -> tuple:
         """Returns the image and (first level) subdirectory count.
         We only count images outside the top directory, because FACA expects
-        every subdirectory to contain images and does not care about top level images"""
-        image_count = 0
-        subdir_count = 0
-        top_dir = True
-        for _, dirs, files in os.walk(path):
-            if top_dir:
-                subdir_count = len(dirs)
-                top_dir = False
-            else:
-                image_count += sum(1 for file in files if file.lower().endswith(".jpg"))
-        return image_count, subdir_count
+        every subdirectory to contain images and does not care about top level images.
+        Directory listings are cached, so this is cheap to call on every keystroke.
+        """
+        return imageIndex.getSubdirAndImageCounts(path)
+
+    def _get_gps_count_text(self, path: str) -> str:
+        """Returns how many of the images have a GPS position, if the default
+        metadata cache knows them. Only the cache is queried, no image is read."""
+        if not os.path.isfile(DEFAULT_CACHE_PATH):
+            return ""
+        images = [
+            i for images in imageIndex.getSubdirImages(path).values() for i in images
+        ]
+        cache = MetadataCache(DEFAULT_CACHE_PATH)
+        try:
+            metadata = cache.query(images)
+        finally:
+            cache.close()
+        if not metadata:
+            return ""
+        with_gps = sum(m["latitude"] is not None for m in metadata.values())
+        return f" {with_gps} of {len(metadata)} cached have GPS."
 
     def on_in_path_button_clicked(self):
         in_path = filedialog.askdirectory()
@@ -768,17 +909,49 @@ class FacaUi(Frame):
             out.write(ini_file)
 
     def run_faca(self):
-        if self.validate_ui():
-            settings = self.get_settings_from_ui()
-            calc_Thread = multiprocessing.Process(
-                target=self.thread_wrap, args=(settings,)
-            )
-            calc_Thread.start()
-
-    @staticmethod
-    def thread_wrap(settings: dict) -> None:
-        f = FacaCalc(**settings)
-        f.main()
+        if self.run_manager.is_running() or not self.validate_ui():
+            return
+        settings = self.get_settings_from_ui()
+        settings["resume"] = "selected" in self.resume_checkbutton.state()
+        if self.run_manager.start(settings):
+            self.run_button["state"] = "disabled"
+            self.cancel_button["state"] = "enabled"
+            self.progress_bar["value"] = 0
+            self.status_label["text"] = "Starting FACA..."
+
+    def on_cancel_button_clicked(self):
+        self.run_manager.cancel()
+        self.cancel_button["state"] = "disabled"
+        self.status_label["text"] = "Cancelling, waiting for Metashape..."
+
+    def on_run_message(self, message: dict) -> None:
+        """Shows a message of the RunManager."""
+        if message["event"] == "stage":
+            self.progress_bar["value"] = 0
+            self.status_label["text"] = formatProgress(message)
+        elif message["event"] == "progress":
+            self.progress_bar["value"] = message["percent"]
+            self.status_label["text"] = f"{message['stage']}: {formatProgress(message)}"
+        else:
+            self.run_button["state"] = "enabled"
+            self.cancel_button["state"] = "disabled"
+            if message["event"] == "done":
+                self.progress_bar["value"] = 100 if message["ok"] else 0
+                self.status_label["text"] = (
+                    "FACA finished."
+                    if message["ok"]
+                    else "Invalid parameters, see log."
+                )
+            elif message["event"] == "cancelled":
+                self.resume_checkbutton.state(["selected"])
+                self.status_label["text"] = (
+                    "FACA cancelled. Run FACA with Resume checked to continue at the last finished stage."
+                )
+            else:
+                self.resume_checkbutton.state(["selected"])
+                self.status_label["text"] = (
+                    f"FACA failed: {message['error']} Resume is checked to continue at the last finished stage."
+                )
 
     def _replace_entry(self, entry, new_string: str) -> None:
         """Replaces old value in entry widget with new_string.
@@ -0,0 +1,93 @@
+from faca_las import LasHeader, LasReader, LasWriter
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, voxel downsampling needs it
+    np = None
+
+
+class VoxelDownsampler:
+    """
+    Streams LAS files in chunks and keeps the first point of every voxel.
+
+    The voxel grid is aligned to multiples of voxelSize, so voxels are
+    consistent across tiles. Every point gets a grid hash (its int64 voxel
+    index); np.unique finds the first point per voxel of a chunk and the
+    voxels written so far drop the ones seen in earlier chunks. These are
+    kept as a few sorted runs of decreasing size (see _addRun), so adding a
+    chunk never copies all of them. Input points are memory-mapped, so
+    memory is bounded by chunkSize and 8 bytes per output point,
+    independent of the input size. Inputs without points are ignored.
+    The kept points are written unchanged with all attributes.
+    """
+
+    def __init__(self, voxelSize: float, chunkSize: int = 5_000_000):
+        if np is None:
+            raise ImportError("Voxel downsampling needs numpy.")
+        self.voxelSize = voxelSize
+        self.chunkSize = chunkSize
+
+    def run(self, inputPaths: list[str], outputPath: str) -> tuple[int, int]:
+        """
+        Writes the downsampled points of all inputPaths into outputPath
+        (with the header of the first input) and returns the input and output point counts.
+        """
+        readers = [LasReader(path) for path in inputPaths]
+        gridMin, gridShape = self._getGrid([r.header for r in readers])
+        seen = []  # sorted runs of the voxels written so far
+        inputCount = 0
+        with LasWriter(outputPath, readers[0].header) as writer:
+            for reader in readers:
+                for records in reader.chunks(self.chunkSize):
+                    inputCount += len(records)
+                    keys = self._getKeys(reader.xyz(records), gridMin, gridShape)
+                    keys, first = np.unique(keys, return_index=True)
+                    isNew = np.ones(keys.size, dtype=bool)
+                    for run in seen:
+                        positions = np.searchsorted(run, keys)
+                        isNew &= run[np.minimum(positions, run.size - 1)] != keys
+                    keys, first = keys[isNew], first[isNew]
+                    self._addRun(seen, keys)
+                    writer.write(
+                        writer.reencode(records[np.sort(first)], reader.header)
+                    )
+            outputCount = writer.count
+        return inputCount, outputCount
+
+    @staticmethod
+    def _addRun(runs: list, keys) -> None:
+        """
+        Appends the sorted keys to runs and merges the last runs while a run is
+        not more than twice as large as the next one, so there are only
+        O(log n) runs and every key is merged O(log n) times.
+        """
+        if keys.size:
+            runs.append(keys)
+        while len(runs) > 1 and runs[-2].size <= 2 * runs[-1].size:
+            last = runs.pop()
+            runs[-1] = np.union1d(runs[-1], last)
+
+    def _getGrid(self, headers: list[LasHeader]):
+        """
+        Returns the lowest voxel index and the voxel count per axis of all headers
+        with points. Headers without points have zero bounds.
+        """
+        headers = [h for h in headers if h.pointCount > 0]
+        if not headers:
+            return np.zeros(3, dtype=np.int64), np.ones(3, dtype=np.int64)
+        mins = np.min([h.mins for h in headers], axis=0)
+        maxs = np.max([h.maxs for h in headers], axis=0)
+        gridMin = np.floor(mins / self.voxelSize).astype(np.int64)
+        gridShape = np.floor(maxs / self.voxelSize).astype(np.int64) - gridMin + 1
+        if np.prod(gridShape.astype(np.float64)) >= 2**63:
+            raise ValueError(
+                f"Voxel size {self.voxelSize} is too small for the point cloud extent."
+            )
+        return gridMin, gridShape
+
+    def _getKeys(self, xyz, gridMin, gridShape):
+        """Returns the int64 grid hash of the voxel of every point."""
+        index = np.floor(xyz / self.voxelSize).astype(np.int64) - gridMin
+        # points on the header bounds may round outside the grid
+        np.clip(index, 0, gridShape - 1, out=index)
+        return (index[:, 0] * gridShape[1] + index[:, 1]) * gridShape[2] + index[:, 2]
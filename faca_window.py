@@ -0,0 +1,75 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, windowed co-alignment needs it
+    np = None
+
+
+def getWindows(labels: list[str], size: int, overlap: int = 1) -> list[list[str]]:
+    """
+    Returns windows of size consecutive labels, each sharing overlap labels
+    with the previous window. The last window ends with the last label and
+    may be shorter.
+    """
+    windows = []
+    start = 0
+    while True:
+        windows.append(labels[start : start + size])
+        if start + size >= len(labels):
+            return windows
+        start += size - overlap
+
+
+def estimateHelmert(source, target) -> tuple:
+    """
+    Returns the 4 x 4 similarity transform (7 parameters: scale, rotation,
+    translation) mapping the points source (n, 3) onto target (n, 3) with
+    least squares (Umeyama 1991) and the residual distance of every point.
+    If the source points are (nearly) collinear, e.g. a corridor flight, the
+    rotation about their line is undetermined and only a translation is estimated.
+    """
+    source = np.asarray(source, dtype=np.float64)
+    target = np.asarray(target, dtype=np.float64)
+    sourceCenter = source.mean(axis=0)
+    targetCenter = target.mean(axis=0)
+    a = source - sourceCenter
+    b = target - targetCenter
+    matrix = np.eye(4)
+    spread = np.linalg.svd(a, compute_uv=False)
+    if len(source) < 3 or spread[1] <= 1e-3 * spread[0]:
+        matrix[:3, 3] = targetCenter - sourceCenter
+        residuals = np.linalg.norm(applyTransform(matrix, source) - target, axis=1)
+        return matrix, residuals
+    u, d, vt = np.linalg.svd(b.T @ a / len(source))
+    signs = np.ones(3)
+    if np.linalg.det(u) * np.linalg.det(vt) < 0:
+        signs[2] = -1  # a reflection, not a rotation
+    rotation = u @ np.diag(signs) @ vt
+    scale = np.sum(d * signs) / np.sum(a.var(axis=0))
+    matrix[:3, :3] = scale * rotation
+    matrix[:3, 3] = targetCenter - scale * rotation @ sourceCenter
+    residuals = np.linalg.norm(applyTransform(matrix, source) - target, axis=1)
+    return matrix, residuals
+
+
+def applyTransform(matrix, points):
+    """Returns the points (n, 3) transformed by the 4 x 4 matrix."""
+    return np.asarray(points) @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+def describeTransform(matrix, points) -> dict:
+    """
+    Returns scale and rotation angle (degrees) of a similarity transform and
+    the mean distance (m) it moves points (n, 3) by.
+    """
+    scale = float(np.cbrt(np.linalg.det(matrix[:3, :3])))
+    rotation = matrix[:3, :3] / scale
+    cosAngle = min(max((np.trace(rotation) - 1) / 2, -1.0), 1.0)
+    points = np.asarray(points, dtype=np.float64)
+    shifts = np.linalg.norm(applyTransform(matrix, points) - points, axis=1)
+    return {
+        "scale": scale,
+        "rotation": math.degrees(math.acos(cosAngle)),
+        "shift": float(shifts.mean()) if shifts.size else 0.0,
+    }
@@ -0,0 +1,75 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def makeSurveys(imageDir, names, imageCount: int = 4) -> dict[str, list[str]]:
+    """Creates empty .jpg files for every survey in names, returns the imagesDict."""
+    imagesDict = {}
+    for name in names:
+        os.makedirs(os.path.join(imageDir, name))
+        imagesDict[name] = []
+        for i in range(imageCount):
+            path = os.path.join(imageDir, name, f"{name}_{i}.jpg")
+            open(path, "w").close()
+            imagesDict[name].append(path)
+    return imagesDict
+
+
+@pytest.fixture
+def settings(tmp_path) -> dict:
+    """FACA settings of a small run with the simulated backend in tmp_path."""
+    return {
+        "project_name": "faca.psx",
+        "input_image_dir": str(tmp_path / "images"),
+        "output_dir": str(tmp_path / "out"),
+        "alignment_accuracy": 1,
+        "camera_accuracy": "None",
+        "keypoint_limit": 40000,
+        "tiepoint_limit": 4000,
+        "criterions": "ImageCount,ReconstructionUncertainty",
+        "criterion_values": "3,50",
+        "depth_map_quality": 4,
+        "depth_map_filtering": "MildFiltering",
+        "output_epsg_code": "32632",
+        "backend": "simulated",
+        "progress_history": str(tmp_path / "progress_history.json"),
+        "prescreen_cache": str(tmp_path / "prescreen.sqlite"),
+    }
+
+
+class CallRecorder:
+    """Records the chunk labels a faca_sim.Chunk method is called on (see record)."""
+
+    def __init__(self, monkeypatch):
+        self.monkeypatch = monkeypatch
+        self.calls = []
+
+    def record(self, name: str, fail=None) -> None:
+        """
+        Records every call of faca_sim.Chunk.<name> as (name, chunk label).
+        fail(label) can return True to raise a RuntimeError instead (a crash).
+        """
+        import faca_sim
+
+        method = getattr(faca_sim.Chunk, name)
+        calls = self.calls
+
+        def recorded(chunk, *args, **kwargs):
+            if fail is not None and fail(chunk.label):
+                raise RuntimeError(f"simulated crash in {name} of {chunk.label}")
+            calls.append((name, chunk.label))
+            return method(chunk, *args, **kwargs)
+
+        self.monkeypatch.setattr(faca_sim.Chunk, name, recorded)
+
+    def labels(self, name: str) -> list[str]:
+        return [label for called, label in self.calls if called == name]
+
+
+@pytest.fixture
+def recorder(monkeypatch) -> CallRecorder:
+    return CallRecorder(monkeypatch)
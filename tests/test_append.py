@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from conftest import makeSurveys
+from faca_calc import FacaCalc
+import faca_sim
+
+
+def readLog(settings: dict) -> str:
+    with open(os.path.join(settings["output_dir"], "faca.psx.log")) as f:
+        return f.read()
+
+
+def test_append_needs_stored_keypoints(settings):
+    imagesDict = makeSurveys(settings["input_image_dir"], ["s1", "s2"])
+    assert FacaCalc(**settings).main(imagesDict)
+    imagesDict.update(makeSurveys(settings["input_image_dir"], ["s3"]))
+    assert not FacaCalc(**dict(settings, append_survey="s3")).main(imagesDict)
+    assert "has no stored key points" in readLog(settings)
+
+
+def test_append_matches_only_the_new_survey(settings, recorder):
+    imagesDict = makeSurveys(settings["input_image_dir"], ["s1", "s2"])
+    assert FacaCalc(**dict(settings, keep_keypoints=True)).main(imagesDict)
+    imagesDict.update(makeSurveys(settings["input_image_dir"], ["s3"]))
+    recorder.record("buildDepthMaps")
+    f = FacaCalc(**dict(settings, append_survey="s3"))
+    assert f.main(imagesDict)
+    assert f.stages.isDone("surveyAppended:s3")
+    assert recorder.labels("buildDepthMaps") == ["s3"]
+
+
+def test_append_spatial_pairs_include_the_new_survey(settings, monkeypatch):
+    pytest.importorskip("numpy")
+    settings.update(preselection="spatial", keep_keypoints=True)
+    imagesDict = makeSurveys(settings["input_image_dir"], ["s1", "s2"])
+    assert FacaCalc(**settings).main(imagesDict)
+    imagesDict.update(makeSurveys(settings["input_image_dir"], ["s3"]))
+    matchPhotos = faca_sim.Chunk.matchPhotos
+    matchedPairs = []
+
+    def recordPairs(chunk, pairs=None, **kwargs):
+        groups = {c.key: c.group.label for c in chunk.cameras}
+        matchedPairs.extend((groups[a], groups[b]) for a, b in pairs)
+        return matchPhotos(chunk, pairs=pairs, **kwargs)
+
+    monkeypatch.setattr(faca_sim.Chunk, "matchPhotos", recordPairs)
+    assert FacaCalc(**dict(settings, append_survey="s3")).main(imagesDict)
+    assert {"s1", "s2"} <= {group for pair in matchedPairs for group in pair}
+    assert all("s3" in pair for pair in matchedPairs)
+
+
+def test_append_rebuilds_surveys_that_moved(settings, recorder):
+    imagesDict = makeSurveys(settings["input_image_dir"], ["s1", "s2"])
+    assert FacaCalc(**dict(settings, keep_keypoints=True)).main(imagesDict)
+    imagesDict.update(makeSurveys(settings["input_image_dir"], ["s3"]))
+    recorder.record("buildDepthMaps")
+    f = FacaCalc(**dict(settings, append_survey="s3", append_shift_tolerance=0.015))
+    assert f.main(imagesDict)
+    # the simulated alignment moves the later surveys more (s1 0.011 m, s2 0.022 m)
+    assert recorder.labels("buildDepthMaps") == ["s2", "s3"]
+    assert "1 surveys moved more than 0.015 m and are rebuilt: ['s2']" in readLog(
+        settings
+    )
@@ -0,0 +1,55 @@
+import argparse
+import csv
+import os
+
+import pytest
+
+from conftest import makeSurveys
+from faca_batch import FacaBatch
+from faca_main import FacaMain
+
+SURVEYS = ["s1", "s2", "s3"]
+
+
+def test_batch_without_jobs_is_an_error():
+    with pytest.raises(ValueError, match="at least one job"):
+        FacaBatch({})
+
+
+def test_missing_ini_file_is_an_error(tmp_path):
+    with pytest.raises(ValueError, match="not found"):
+        FacaMain(
+            iniFile=str(tmp_path / "missing.ini"),
+            sections=[],
+            args=argparse.Namespace(),
+        )
+
+
+def test_ini_file_without_sections_is_an_error(tmp_path):
+    iniFile = tmp_path / "empty.ini"
+    iniFile.write_text("; no sections\n")
+    with pytest.raises(ValueError, match="No sections"):
+        FacaMain(iniFile=str(iniFile), sections=[], args=argparse.Namespace())
+
+
+def test_batch_writes_summary_into_sanitised_dirs(settings, capsys):
+    makeSurveys(settings["input_image_dir"], SURVEYS)
+    jobs = {
+        "Nota et al. 2022": settings,
+        "Moran/2023 (fine)": dict(settings, keypoint_limit=60000),
+    }
+    results = FacaBatch(jobs).run()
+    assert [r["status"] for r in results] == ["done", "done"]
+
+    for dirName in ("Nota_et_al_2022", "Moran_2023_fine"):
+        projectPath = os.path.join(settings["output_dir"], dirName, "faca.psx")
+        assert os.path.isfile(projectPath)
+    with open(os.path.join(settings["output_dir"], "faca_batch_summary.csv")) as f:
+        rows = list(csv.DictReader(f))
+    assert [r["job"] for r in rows] == list(jobs)
+    assert all(r["status"] == "done" and float(r["total"]) > 0 for r in rows)
+    assert "matchedAndAligned" in rows[0]
+
+    output = capsys.readouterr().out
+    assert "[Nota et al. 2022] " in output
+    assert "[Moran/2023 (fine)] " in output
@@ -0,0 +1,54 @@
+import os
+
+from conftest import makeSurveys
+from faca_cache import AlignmentCache
+from faca_calc import FacaCalc
+
+SURVEYS = ["s1", "s2", "s3"]
+
+
+def test_key_changes_with_parameters_and_images(tmp_path):
+    imagesDict = makeSurveys(str(tmp_path / "images"), SURVEYS)
+    cache = AlignmentCache(str(tmp_path / "cache"))
+    key = cache.getKey(imagesDict, {"keypoint_limit": 40000})
+    assert cache.getKey(imagesDict, {"keypoint_limit": 40000}) == key
+    assert cache.getKey(imagesDict, {"keypoint_limit": 60000}) != key
+    with open(imagesDict["s2"][0], "w") as f:
+        f.write("changed")
+    assert cache.getKey(imagesDict, {"keypoint_limit": 40000}) != key
+
+
+def test_lookup_needs_the_marker(tmp_path):
+    cache = AlignmentCache(str(tmp_path / "cache"))
+    key = "0123456789abcdef" * 4
+    assert cache.lookup(key) is None
+    projectPath = cache.getNewProjectPath(key)
+    open(projectPath, "w").close()
+    assert cache.lookup(key) is None
+    cache.commit(key, projectPath, {})
+    assert cache.lookup(key) == projectPath
+    os.remove(projectPath)
+    assert cache.lookup(key) is None
+
+
+def test_runs_share_the_alignment_until_a_parameter_changes(
+    settings, recorder, tmp_path
+):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    settings["alignment_cache_dir"] = str(tmp_path / "cache")
+    recorder.record("matchPhotos")
+    assert FacaCalc(**dict(settings, output_dir=str(tmp_path / "a"))).main(imagesDict)
+    assert recorder.labels("matchPhotos") == ["Original"]
+
+    # only later stages differ: hit
+    sweep = dict(settings, output_dir=str(tmp_path / "b"), depth_map_quality=2)
+    assert FacaCalc(**sweep).main(imagesDict)
+    assert recorder.labels("matchPhotos") == ["Original"]
+    with open(os.path.join(sweep["output_dir"], "faca.psx.log")) as f:
+        assert "Reused cached alignment" in f.read()
+    assert os.path.isfile(os.path.join(sweep["output_dir"], "s1.las"))
+
+    # matching parameter differs: miss
+    other = dict(settings, output_dir=str(tmp_path / "c"), keypoint_limit=60000)
+    assert FacaCalc(**other).main(imagesDict)
+    assert recorder.labels("matchPhotos") == ["Original", "Original"]
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+
+from faca_change import ChangeDetector, ChangeGrid
+from faca_las import LasHeader, writeLas
+
+ORIGIN = np.array([500000.0, 5500000.0, 300.0])  # UTM coordinates
+
+
+def writeClouds(directory, reference, compared) -> dict[str, list[str]]:
+    clouds = {}
+    for label, xyz in (("a", reference), ("b", compared)):
+        clouds[label] = [os.path.join(directory, f"{label}.las")]
+        writeLas(clouds[label][0], xyz)
+    return clouds
+
+
+def bruteForce(reference, compared, maxDistance: float):
+    distances = np.linalg.norm(compared[:, None] - reference[None], axis=2).min(axis=1)
+    distances[distances > maxDistance] = np.nan
+    return distances
+
+
+def test_c2c_matches_brute_force_beyond_the_tile_size(tmp_path):
+    rng = np.random.default_rng(1)
+    reference = ORIGIN + rng.uniform(0, [50, 50, 5], size=(400, 3))
+    # compared points up to 10 m away from the reference area
+    compared = ORIGIN + rng.uniform([-10, -10, 0], [60, 60, 5], size=(300, 3))
+    clouds = writeClouds(tmp_path, reference, compared)
+    detector = ChangeDetector(
+        str(tmp_path / "change"), cellSize=1, tileSize=5, maxDistance=20
+    )
+    summary = detector.run(clouds, [("a", "b")])["b_to_a"]
+
+    # compare the rounded coordinates written to the LAS files
+    reference = np.round(reference, 3)
+    compared = np.round(compared, 3)
+    expected = bruteForce(reference, compared, 20)
+    distances = np.load(tmp_path / "change" / "b_to_a_c2c.npy")
+    assert summary["c2c"]["pointsWithNeighbour"] == len(compared)
+    assert np.allclose(distances, expected, atol=1e-3)
+
+
+def test_empty_tiles_do_not_widen_the_grid(tmp_path):
+    rng = np.random.default_rng(2)
+    reference = ORIGIN + rng.uniform(0, [100, 100, 5], size=(2000, 3))
+    compared = reference + [0, 0, 0.5]
+    clouds = writeClouds(tmp_path, reference, compared)
+    empty = str(tmp_path / "empty.las")
+    writeLas(empty, np.zeros((0, 3)))
+    clouds["b"].append(empty)
+
+    headers = [LasHeader.read(p) for paths in clouds.values() for p in paths]
+    grid = ChangeGrid(headers, cellSize=1, tileSize=50)
+    assert grid.rasterShape == (100, 100)
+    assert np.all(grid.origin[:2] == ORIGIN[:2])
+
+    detector = ChangeDetector(str(tmp_path / "change"), cellSize=1, tileSize=50)
+    summary = detector.run(clouds, [("a", "b")])["b_to_a"]
+    assert summary["points"] == len(compared)
+    assert summary["dz"]["mean"] == pytest.approx(0.5, abs=1e-3)
+    with open(tmp_path / "change" / "b_to_a_dz.asc") as f:
+        assert f.readline() == "ncols 100\n"
+
+
+def test_grid_of_empty_clouds(tmp_path):
+    empty = str(tmp_path / "empty.las")
+    writeLas(empty, np.zeros((0, 3)))
+    grid = ChangeGrid([LasHeader.read(empty)], cellSize=1, tileSize=10)
+    assert grid.tileCount == 1
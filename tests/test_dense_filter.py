@@ -0,0 +1,55 @@
+import os
+
+import faca_sim
+from conftest import makeSurveys
+from faca_calc import FacaCalc
+
+SURVEYS = ["s1", "s2", "s3"]
+
+
+def readPointClouds(settings: dict) -> dict:
+    """Returns the point cloud of every survey chunk in the project."""
+    doc = faca_sim.Document()
+    doc.open(os.path.join(settings["output_dir"], settings["project_name"]))
+    return {c.label: c.point_cloud for c in doc.chunks if c.label in SURVEYS}
+
+
+def test_dense_points_are_kept_by_default(settings, recorder):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    recorder.record("filterPointCloud")
+    assert FacaCalc(**settings).main(imagesDict)
+    assert recorder.calls == []
+    for pointCloud in readPointClouds(settings).values():
+        assert pointCloud.confidence is False
+
+
+def test_low_confidence_points_are_removed(settings, tmp_path):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    assert FacaCalc(**settings).main(imagesDict)
+    unfiltered = readPointClouds(settings)
+
+    settings.update(output_dir=str(tmp_path / "filtered"), dense_confidence_min=3)
+    assert FacaCalc(**settings).main(imagesDict)
+    for survey, pointCloud in readPointClouds(settings).items():
+        assert pointCloud.confidence is True
+        assert pointCloud.minConfidence == 3
+        # confidence 1 and 2 are 25 % and 18.75 % of the points
+        expected = int(unfiltered[survey].count * 0.75**2)
+        assert abs(pointCloud.count - expected) <= 1
+    with open(os.path.join(settings["output_dir"], "faca.psx.log")) as f:
+        assert "s1 Points with confidence < 3 removed." in f.read()
+
+
+def test_point_clouds_are_thinned_to_the_spacing(settings, recorder):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    recorder.record("filterPointCloud")
+    assert FacaCalc(**dict(settings, dense_point_spacing=2)).main(imagesDict)
+    assert recorder.labels("filterPointCloud") == SURVEYS
+    for pointCloud in readPointClouds(settings).values():
+        # 4 images of 30 x 30 m, one point per 2 x 2 m
+        assert pointCloud.count == 900
+
+
+def test_negative_dense_settings_are_rejected(settings):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    assert not FacaCalc(**dict(settings, dense_confidence_min=-1)).main(imagesDict)
@@ -0,0 +1,69 @@
+import os
+import re
+
+import pytest
+
+from conftest import makeSurveys
+from faca_calc import FacaCalc
+
+SURVEYS = ["s1", "s2", "s3"]
+
+
+def readLog(settings: dict) -> str:
+    path = os.path.join(settings["output_dir"], settings["project_name"] + ".log")
+    with open(path) as f:
+        return f.read()
+
+
+def getPasses(log: str, criterion: str) -> list[float]:
+    """Returns the thresholds of the logged filter passes of criterion."""
+    return [
+        float(t)
+        for t in re.findall(rf"Original {criterion} pass \d+: threshold (\S+),", log)
+    ]
+
+
+@pytest.mark.parametrize("useNumpy", [True, False])
+def test_adaptive_threshold_removes_at_most_filter_max_removal(
+    settings, monkeypatch, useNumpy
+):
+    if useNumpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr("faca_calc.np", None)
+    f = FacaCalc(**dict(settings, filter_max_removal=10))
+    values = [float(v) for v in range(1, 101)]
+    assert f._getAdaptiveThreshold(values, 50) == pytest.approx(90, abs=1)
+    assert f._getAdaptiveThreshold(values, 95) == 95
+    assert f._getAdaptiveThreshold(values, 100) is None
+    assert f._getAdaptiveThreshold([], 50) is None
+
+
+def test_adaptive_filter_passes_until_target(settings, recorder):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    recorder.record("optimizeCameras")
+    settings.update(filter_mode="adaptive", filter_max_removal=10)
+    assert FacaCalc(**settings).main(imagesDict)
+    log = readLog(settings)
+    assert getPasses(log, "ImageCount") == [3]
+    thresholds = getPasses(log, "ReconstructionUncertainty")
+    assert len(thresholds) == 2
+    assert thresholds[0] > 50
+    assert thresholds[1] == 50
+    assert "not reached" not in log
+    # after ImageCount (50 % removed) and once at the end (13.9 % removed)
+    assert recorder.labels("optimizeCameras") == ["Original", "Original"]
+
+
+def test_adaptive_filter_warns_when_iterations_run_out(settings):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    settings.update(filter_mode="adaptive", filter_max_iterations=1)
+    assert FacaCalc(**settings).main(imagesDict)
+    log = readLog(settings)
+    assert len(getPasses(log, "ReconstructionUncertainty")) == 1
+    match = re.search(
+        r"Warning: Original ReconstructionUncertainty reached (\S+) after 1 passes, "
+        r"target 50 not reached",
+        log,
+    )
+    assert match and float(match.group(1)) > 50
@@ -0,0 +1,75 @@
+import os
+
+import faca_sim
+from conftest import makeSurveys
+from faca_calc import FacaCalc
+
+SURVEYS = ["s1", "s2", "s3"]
+
+
+def test_images_are_added_with_one_call_and_grouped(settings, recorder):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS, imageCount=5)
+    chunk = faca_sim.Document().addChunk()
+    recorder.record("addPhotos")
+    FacaCalc(**settings).addImagesByChunkName(chunk, imagesDict)
+    assert len(recorder.labels("addPhotos")) == 1
+    assert [g.label for g in chunk.camera_groups] == SURVEYS
+    assert len(chunk.cameras) == 15
+    for camera in chunk.cameras:
+        survey = os.path.basename(os.path.dirname(camera.photo.path))
+        assert camera.group.label == survey
+
+
+def test_images_skipped_by_add_photos_keep_their_groups(settings, monkeypatch):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS, imageCount=5)
+    addPhotos = faca_sim.Chunk.addPhotos
+
+    def skipEverySecond(chunk, filenames, **kwargs):
+        addPhotos(chunk, filenames[::2], **kwargs)
+
+    monkeypatch.setattr(faca_sim.Chunk, "addPhotos", skipEverySecond)
+    chunk = faca_sim.Document().addChunk()
+    FacaCalc(**settings).addImagesByChunkName(chunk, imagesDict)
+    assert len(chunk.cameras) == 8
+    for camera in chunk.cameras:
+        survey = os.path.basename(os.path.dirname(camera.photo.path))
+        assert camera.group.label == survey
+
+
+def test_pruning_removes_foreign_groups_in_one_call(settings, monkeypatch):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    f = FacaCalc(**settings)
+    original = faca_sim.Document().addChunk()
+    f.addImagesByChunkName(original, imagesDict)
+    original.matchPhotos(keep_keypoints=True)
+    original.alignCameras()
+    chunks = f.CloneChunkNewLabels(original, SURVEYS)
+
+    removeCalls = []
+    remove = faca_sim.Chunk.remove
+
+    def recordedRemove(chunk, items):
+        removeCalls.append(chunk.label)
+        remove(chunk, items)
+
+    monkeypatch.setattr(faca_sim.Chunk, "remove", recordedRemove)
+    f.removeCameraGroupsUnequalChunkName(chunks)
+    assert removeCalls == SURVEYS
+    for chunk in chunks:
+        assert [g.label for g in chunk.camera_groups] == [chunk.label]
+        assert {c.group.label for c in chunk.cameras} == {chunk.label}
+        assert len(chunk.cameras) == 4
+    assert len(original.cameras) == 12
+
+
+def test_clones_are_made_without_key_points(settings):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    f = FacaCalc(**settings)
+    original = faca_sim.Document().addChunk()
+    f.addImagesByChunkName(original, imagesDict)
+    original.matchPhotos(keep_keypoints=True)
+    original.alignCameras()
+    chunks = f.CloneChunkNewLabels(original, SURVEYS)
+    assert [c.label for c in chunks] == SURVEYS
+    assert [c.keypoints for c in chunks] == [False] * 3
+    assert original.keypoints is True
@@ -0,0 +1,39 @@
+import os
+
+from conftest import makeSurveys
+from faca_calc import FacaCalc
+from faca_index import ImageIndex, imageIndex
+
+
+def test_hidden_entries_and_symlinks(tmp_path, settings):
+    root = tmp_path / "images"
+    makeSurveys(str(root), ["s1", ".hidden"], imageCount=2)
+    makeSurveys(str(tmp_path / "elsewhere"), ["s2"], imageCount=3)
+    os.symlink(tmp_path / "elsewhere" / "s2", root / "s2")
+    open(root / "s1" / ".thumb.jpg", "w").close()
+    os.symlink(root / "s1", root / "s1" / "loop")  # a cycle
+
+    index = ImageIndex()
+    assert index.getSubdirNames(str(root)) == ["s1", "s2"]
+    images = index.getSubdirImages(str(root))
+    assert {name: len(paths) for name, paths in images.items()} == {"s1": 2, "s2": 3}
+    assert index.getSubdirAndImageCounts(str(root)) == (5, 2)
+    # FacaCalc and the UI use the same rule
+    assert FacaCalc(**settings).getChunkNames(str(root)) == ["s1", "s2"]
+    assert imageIndex.getSubdirNames(str(root)) == ["s1", "s2"]
+
+
+def test_listing_is_cached_until_the_directory_changes(tmp_path, monkeypatch):
+    root = tmp_path / "images"
+    makeSurveys(str(root), ["s1", "s2"], imageCount=2)
+    index = ImageIndex()
+    assert index.getSubdirAndImageCounts(str(root)) == (4, 2)
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or scandir(path))
+    assert index.getSubdirAndImageCounts(str(root)) == (4, 2)
+    assert scans == []
+    open(root / "s2" / "new.JPG", "w").close()
+    os.utime(root / "s2", ns=(0, os.stat(root / "s2").st_mtime_ns + 10**9))
+    assert index.getSubdirAndImageCounts(str(root)) == (5, 2)
+    assert scans == [str(root / "s2")]
@@ -0,0 +1,111 @@
+import os
+import struct
+
+import faca_metadata
+from faca_metadata import MetadataCache, parseJpegMetadata, summarize
+
+
+def makeIfd(entries: list[tuple], offset: int) -> bytes:
+    """Returns a little endian TIFF IFD at offset, entries are (tag, type, count, data)."""
+    dataOffset = offset + 2 + 12 * len(entries) + 4
+    head = struct.pack("<H", len(entries))
+    data = b""
+    for tag, fieldType, count, raw in entries:
+        head += struct.pack("<HHI", tag, fieldType, count)
+        if len(raw) <= 4:
+            head += raw.ljust(4, b"\0")
+        else:
+            head += struct.pack("<I", dataOffset + len(data))
+            data += raw
+    return head + struct.pack("<I", 0) + data
+
+
+def rationals(*values) -> bytes:
+    return b"".join(struct.pack("<II", round(v * 100), 100) for v in values)
+
+
+def writeJpeg(path: str, latitude: tuple, longitude: tuple, altitude: float) -> None:
+    """Writes a JPEG header with EXIF (time, GPS, make) and XMP (accuracy), no image."""
+    gps = [
+        (1, 2, 2, b"N\0"),
+        (2, 5, 3, rationals(*latitude)),
+        (3, 2, 2, b"E\0"),
+        (4, 5, 3, rationals(*longitude)),
+        (6, 5, 1, rationals(altitude)),
+    ]
+    exif = [(0x9003, 2, 20, b"2023:05:01 10:00:00\0")]
+    ifd0Size = len(makeIfd([(0, 4, 1, b"")] * 3, 8))
+    exifSize = len(makeIfd(exif, 0))
+    ifd0 = [
+        (0x010F, 2, 4, b"DJI\0"),
+        (0x8769, 4, 1, struct.pack("<I", 8 + ifd0Size)),
+        (0x8825, 4, 1, struct.pack("<I", 8 + ifd0Size + exifSize)),
+    ]
+    tiff = b"II*\0" + struct.pack("<I", 8) + makeIfd(ifd0, 8)
+    tiff += makeIfd(exif, 8 + ifd0Size)
+    tiff += makeIfd(gps, 8 + ifd0Size + exifSize)
+    xmp = b'<x:xmpmeta><rdf:Description Camera:GPSXYAccuracy="0.05" Camera:GPSZAccuracy="0.1"/></x:xmpmeta>'
+    with open(path, "wb") as f:
+        f.write(b"\xff\xd8")
+        for segment in (b"Exif\0\0" + tiff, b"http://ns.adobe.com/xap/1.0/\0" + xmp):
+            f.write(b"\xff\xe1" + struct.pack(">H", len(segment) + 2) + segment)
+        f.write(b"\xff\xda\0\2\xff\xd9")
+
+
+def test_exif_and_xmp_are_parsed(tmp_path):
+    path = str(tmp_path / "a.jpg")
+    writeJpeg(path, (47, 30, 0), (11, 15, 36), 612.5)
+    metadata = parseJpegMetadata(path)
+    assert metadata["timestamp"] == "2023:05:01 10:00:00"
+    assert metadata["make"] == "DJI"
+    assert metadata["latitude"] == 47.5
+    assert metadata["longitude"] == 11.26
+    assert metadata["altitude"] == 612.5
+    assert metadata["xy_accuracy"] == 0.05
+    assert metadata["z_accuracy"] == 0.1
+
+
+def test_images_are_only_parsed_when_new_or_changed(tmp_path, monkeypatch):
+    images = []
+    for i in range(3):
+        images.append(str(tmp_path / f"{i}.jpg"))
+        writeJpeg(images[-1], (47, 30, i), (11, 15, 0), 600)
+    parsed = []
+
+    def countedParse(path):
+        parsed.append(path)
+        return parseJpegMetadata(path)
+
+    monkeypatch.setattr(faca_metadata, "parseJpegMetadata", countedParse)
+    cache = MetadataCache(str(tmp_path / "cache" / "metadata.sqlite"), maxWorkers=2)
+    assert cache.query(images) == {}
+    first = cache.get(images)
+    assert sorted(parsed) == sorted(images)
+
+    parsed.clear()
+    assert cache.get(images) == first
+    assert parsed == []
+
+    stat = os.stat(images[1])
+    os.utime(images[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.get(images) == first
+    assert parsed == [images[1]]
+    cache.close()
+
+    # another process reads what this one cached
+    reopened = MetadataCache(str(tmp_path / "cache" / "metadata.sqlite"))
+    assert reopened.query(images + [str(tmp_path / "missing.jpg")]) == first
+    reopened.close()
+
+
+def test_summary_counts_gps_and_accuracy(tmp_path):
+    path = str(tmp_path / "a.jpg")
+    writeJpeg(path, (47, 30, 0), (11, 15, 0), 600)
+    empty = str(tmp_path / "b.jpg")
+    open(empty, "w").close()
+    summary = summarize([parseJpegMetadata(path), parseJpegMetadata(empty)])
+    assert summary["images"] == 2
+    assert summary["withGps"] == 1
+    assert summary["withAccuracy"] == 1
+    assert summary["first"] == summary["last"] == "2023:05:01 10:00:00"
+    assert summary["cameras"] == ["DJI"]
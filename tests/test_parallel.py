@@ -0,0 +1,38 @@
+import os
+
+import faca_sim
+from conftest import makeSurveys
+from faca_calc import FacaCalc
+
+SURVEYS = ["s1", "s2", "s3"]
+
+
+def readPointCounts(settings: dict) -> dict[str, int]:
+    """Returns the point count of every chunk with a point cloud in the project."""
+    doc = faca_sim.Document()
+    doc.open(os.path.join(settings["output_dir"], settings["project_name"]))
+    return {c.label: c.point_cloud.count for c in doc.chunks if c.point_cloud}
+
+
+def test_parallel_chunks_build_the_same_point_clouds(settings, recorder, tmp_path):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    assert FacaCalc(**settings).main(imagesDict)
+    sequential = readPointCounts(settings)
+
+    recorder.record("buildPointCloud")
+    settings.update(output_dir=str(tmp_path / "parallel"), parallel_chunks=2)
+    assert FacaCalc(**settings).main(imagesDict)
+    assert list(readPointCounts(settings)) == SURVEYS
+    assert readPointCounts(settings) == sequential
+    # built in the worker processes, not in this one
+    assert recorder.labels("buildPointCloud") == []
+    for survey in SURVEYS:
+        assert os.path.isfile(os.path.join(settings["output_dir"], survey + ".las"))
+        chunkProject = os.path.join(settings["output_dir"], "faca_chunks", survey)
+        assert os.path.isfile(chunkProject + ".psx")
+
+    with open(os.path.join(settings["output_dir"], "faca.psx.log")) as f:
+        log = f.read()
+    assert "Building 3 Point Clouds in 2 processes." in log
+    positions = [log.index(f"{survey} Point Cloud build") for survey in SURVEYS]
+    assert positions == sorted(positions)
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+import faca_prescreen
+from faca_calc import FacaCalc
+from faca_prescreen import ImagePrescreener
+
+
+def writeImages(directory) -> dict[str, str]:
+    """Writes a sharp, a blurred and an overexposed JPEG, returns their paths."""
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(4)
+    pixels = {
+        "sharp": rng.integers(30, 220, size=(256, 256), dtype=np.uint8),
+        "blurred": np.full((256, 256), 128, dtype=np.uint8),
+        "overexposed": np.full((256, 256), 255, dtype=np.uint8),
+    }
+    paths = {}
+    for name, grey in pixels.items():
+        paths[name] = os.path.join(directory, name + ".jpg")
+        Image.fromarray(grey).save(paths[name], quality=95)
+    return paths
+
+
+def test_scores_are_cached_outside_the_image_directory(tmp_path, monkeypatch):
+    paths = writeImages(tmp_path / "images" / "s1")
+    broken = tmp_path / "images" / "s1" / "broken.jpg"
+    broken.write_bytes(b"no jpeg")
+    images = sorted(paths.values()) + [str(broken)]
+    mtime = os.stat(tmp_path / "images" / "s1").st_mtime_ns
+    cachePath = str(tmp_path / "cache" / "prescreen.sqlite")
+
+    prescreener = ImagePrescreener(cachePath, maxWorkers=1)
+    scores = prescreener.score(images)
+    prescreener.close()
+    assert scores[paths["sharp"]]["sharpness"] > scores[paths["blurred"]]["sharpness"]
+    assert scores[paths["overexposed"]]["clipped"] == 100.0
+    assert scores[str(broken)] is None
+    assert len(os.listdir(tmp_path / "images" / "s1")) == 4
+    assert os.stat(tmp_path / "images" / "s1").st_mtime_ns == mtime
+
+    scored = []
+    scoreImage = faca_prescreen.scoreImage
+    monkeypatch.setattr(
+        faca_prescreen,
+        "scoreImage",
+        lambda path, size: scored.append(path) or scoreImage(path, size),
+    )
+    prescreener = ImagePrescreener(cachePath, maxWorkers=1)
+    assert prescreener.score(images) == scores
+    assert scored == []
+    Image.fromarray(np.zeros((64, 64), dtype=np.uint8)).save(paths["blurred"])
+    assert prescreener.score(images)[paths["blurred"]]["clipped"] == 100.0
+    assert scored == [paths["blurred"]]
+    prescreener.close()
+
+
+@pytest.mark.parametrize("mode", ["exclude", "disable"])
+def test_prescreen_modes(settings, mode):
+    surveys = {}
+    for survey in ("s1", "s2"):
+        paths = writeImages(os.path.join(settings["input_image_dir"], survey))
+        surveys[survey] = sorted(paths.values())
+    f = FacaCalc(**dict(settings, prescreen=mode))
+    assert f.main(surveys)
+    assert len(f.rejectedImages) == 4  # blurred and overexposed of both surveys
+    assert all("sharp" not in os.path.basename(i) for i in f.rejectedImages)
+    doc = f.ms.Document()
+    doc.open(os.path.join(settings["output_dir"], settings["project_name"]))
+    cameras = f.getChunkByLabel(doc, "Original").cameras
+    if mode == "exclude":
+        assert len(cameras) == 2
+    else:
+        assert len(cameras) == 6
+        assert sorted(c.label for c in cameras if not c.enabled) == [
+            "blurred",
+            "blurred",
+            "overexposed",
+            "overexposed",
+        ]
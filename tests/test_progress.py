@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from faca_progress import FacaCancelled, ProgressReporter
+
+
+class CancelEvent:
+    def is_set(self) -> bool:
+        return True
+
+
+def test_finish_records_completed_operations(tmp_path):
+    path = tmp_path / "shared" / "history.json"
+    progress = ProgressReporter(str(path), interval=0)
+    progress.callback("matchPhotos", 10)(100)
+    progress.finish()
+    assert list(json.loads(path.read_text())) == ["matchPhotos"]
+    assert "matchPhotos" in ProgressReporter(str(path)).history
+
+
+def test_cancelled_operation_is_not_recorded(tmp_path):
+    path = tmp_path / "history.json"
+    progress = ProgressReporter(str(path), interval=0)
+    callback = progress.callback("buildDepthMaps", 10)
+    progress.cancelEvent = CancelEvent()
+    with pytest.raises(FacaCancelled):
+        callback(50)
+    progress.finish()
+    assert progress.history == {}
+    assert not path.exists()
+
+
+def test_failed_stage_is_not_recorded(settings, recorder):
+    from conftest import makeSurveys
+    from faca_calc import FacaCalc
+
+    imagesDict = makeSurveys(settings["input_image_dir"], ["s1", "s2"])
+    recorder.record("buildPointCloud", fail=lambda label: label == "s1")
+    f = FacaCalc(**settings)
+    with pytest.raises(RuntimeError):
+        f.main(imagesDict)
+    f.progress.finish()
+    assert "buildDepthMaps" in f.progress.history
+    assert "buildPointCloud" not in f.progress.history
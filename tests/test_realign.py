@@ -0,0 +1,41 @@
+import json
+import os
+
+import pytest
+
+from conftest import makeSurveys
+from faca_calc import FacaCalc
+
+SURVEYS = ["s1", "s2", "s3"]
+
+
+@pytest.mark.parametrize(
+    "policy, alignCalls, optimizeCalls",
+    [
+        # the first alignCameras call is the alignment itself
+        ("after_each", 3, 0),
+        ("once_at_end", 2, 0),
+        ("optimize", 1, 2),
+    ],
+)
+def test_realign_policy_call_counts(
+    settings, recorder, policy, alignCalls, optimizeCalls
+):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    recorder.record("alignCameras")
+    recorder.record("optimizeCameras")
+    assert FacaCalc(**dict(settings, realign_policy=policy)).main(imagesDict)
+    assert recorder.labels("alignCameras") == ["Original"] * alignCalls
+    assert recorder.labels("optimizeCameras") == ["Original"] * optimizeCalls
+
+    path = os.path.join(settings["output_dir"], "faca.psx.timeline.jsonl")
+    with open(path) as f:
+        timeline = [json.loads(line) for line in f]
+    passes = [r for r in timeline if r.get("event") == "filterPass"]
+    assert [p["criterion"] for p in passes] == [
+        "ImageCount",
+        "ReconstructionUncertainty",
+    ]
+    assert all(p["policy"] == policy for p in passes)
+    realigns = [r for r in timeline if r.get("event") == "realign"]
+    assert len(realigns) == (policy == "once_at_end")
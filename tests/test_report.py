@@ -0,0 +1,83 @@
+import csv
+import json
+import math
+import os
+
+import pytest
+
+import faca_sim
+from conftest import makeSurveys
+from faca_calc import FacaCalc
+
+np = pytest.importorskip("numpy")
+from faca_report import CoalignmentReport
+
+SURVEYS = ["s1", "s2", "s3"]
+
+
+def makeAlignedChunk(settings: dict, disabled: int = None):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    chunk = faca_sim.Document().addChunk()
+    FacaCalc(**settings).addImagesByChunkName(chunk, imagesDict)
+    if disabled is not None:
+        chunk.cameras[disabled].enabled = False
+    chunk.matchPhotos()
+    chunk.alignCameras()
+    return chunk
+
+
+def test_report_matches_brute_force(settings):
+    chunk = makeAlignedChunk(settings, disabled=5)
+    surveys = CoalignmentReport(faca_sim).compute(chunk)
+
+    filter = faca_sim.TiePoints.Filter()
+    filter.init(chunk, faca_sim.TiePoints.Filter.ReprojectionError)
+    pointErrors = filter.values
+    tracksBySurvey = {s: set() for s in SURVEYS}
+    errorsBySurvey = {s: [] for s in SURVEYS}
+    for camera in chunk.cameras:
+        if camera.transform is None:
+            continue
+        tracks = [p.track_id for p in chunk.tie_points.projections[camera]]
+        tracksBySurvey[camera.group.label].update(tracks)
+        location = camera.reference.location
+        errorsBySurvey[camera.group.label].append(
+            [c - r for c, r in zip(camera.center, location)]
+        )
+    for survey in SURVEYS:
+        summary = surveys[survey]
+        assert summary["cameras"] == 4
+        assert summary["aligned"] == (3 if survey == "s2" else 4)
+        assert summary["tiePoints"] == len(tracksBySurvey[survey])
+        shared = {
+            t
+            for t in tracksBySurvey[survey]
+            if sum(t in tracksBySurvey[other] for other in SURVEYS) > 1
+        }
+        assert summary["sharedTiePoints"] == len(shared)
+        errors = errorsBySurvey[survey]
+        rms = math.sqrt(sum(e * e for row in errors for e in row) / len(errors))
+        assert summary["referenceError"]["count"] == len(errors)
+        assert summary["referenceError"]["rms"] == pytest.approx(rms)
+
+    camera = chunk.cameras[0]
+    tracks = [p.track_id for p in chunk.tie_points.projections[camera]]
+    expected = math.sqrt(sum(pointErrors[t] ** 2 for t in tracks) / len(tracks))
+    report = CoalignmentReport(faca_sim)
+    report.compute(chunk)
+    row = report.cameraRows[0]
+    assert row["tie_points"] == len(tracks)
+    assert row["reprojection_rms"] == pytest.approx(expected)
+    assert report.cameraRows[5]["aligned"] is False
+
+
+def test_run_writes_the_report(settings):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    assert FacaCalc(**dict(settings, coalignment_report=True)).main(imagesDict)
+    basePath = os.path.join(settings["output_dir"], "faca_coalignment")
+    with open(basePath + ".json") as f:
+        assert sorted(json.load(f)) == SURVEYS
+    with open(basePath + "_cameras.csv") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 12
+    assert {r["survey"] for r in rows} == set(SURVEYS)
@@ -0,0 +1,97 @@
+import os
+import time
+
+from faca_progress import ProgressReporter
+from faca_ui import RunManager
+
+
+class StubRoot:
+    """Stands in for the Tk root, after() only queues the callback."""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, ms: int, callback) -> None:
+        self.callbacks.append(callback)
+
+    def runUntilIdle(self, timeout: float = 10.0) -> None:
+        end = time.monotonic() + timeout
+        while self.callbacks:
+            assert time.monotonic() < end, "run did not finish"
+            self.callbacks.pop(0)()
+            time.sleep(0.01)
+
+
+class StubLogger:
+    def l(self, message: str) -> None:
+        pass
+
+    def lwt(self, message: str) -> None:
+        pass
+
+
+class StubCalc:
+    """Reports progress like FacaCalc, mode decides how main ends."""
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.l = StubLogger()
+        self.progress = ProgressReporter(interval=0)
+        self.stageTimes = {}
+
+    def main(self) -> bool:
+        self.progress.startStage("matchedAndAligned")
+        progress = self.progress.callback("matchPhotos", 10)
+        progress(50.0)
+        if self.mode == "error":
+            raise RuntimeError("Metashape failed")
+        if self.mode == "crash":
+            os._exit(3)
+        if self.mode == "cancel":
+            end = time.monotonic() + 10
+            while time.monotonic() < end:
+                progress(50.0)
+                time.sleep(0.05)
+        self.stageTimes["matchedAndAligned"] = 1.0
+        return True
+
+
+def runStub(mode: str, cancel: bool = False) -> list[dict]:
+    root = StubRoot()
+    messages = []
+    manager = RunManager(root, StubCalc, messages.append, poll_ms=10)
+    assert manager.start({"mode": mode})
+    assert manager.is_running()
+    assert not manager.start({"mode": mode})
+    if cancel:
+        manager.cancel()
+    root.runUntilIdle()
+    assert not manager.is_running()
+    return messages
+
+
+def test_done():
+    messages = runStub("done")
+    assert [m["event"] for m in messages] == ["stage", "progress", "done"]
+    assert messages[1]["percent"] == 50.0
+    assert messages[-1]["ok"] is True
+    assert messages[-1]["stageTimes"] == {"matchedAndAligned": 1.0}
+
+
+def test_cancel():
+    messages = runStub("cancel", cancel=True)
+    assert messages[-1] == {"event": "cancelled"}
+    assert "done" not in [m["event"] for m in messages]
+
+
+def test_error():
+    messages = runStub("error")
+    assert messages[-1]["event"] == "error"
+    assert "Metashape failed" in messages[-1]["error"]
+    assert "RuntimeError" in messages[-1]["traceback"]
+
+
+def test_worker_exits_without_message():
+    messages = runStub("crash")
+    assert messages[-1]["event"] == "error"
+    assert messages[-1]["error"] == "Worker exited with code 3."
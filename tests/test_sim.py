@@ -0,0 +1,19 @@
+import faca_sim
+
+
+def matchedCameraCount(chunk, **kwargs) -> float:
+    before = faca_sim.simulatedSeconds.get("matchPhotos", 0.0)
+    chunk.matchPhotos(**kwargs)
+    seconds = faca_sim.simulatedSeconds["matchPhotos"] - before
+    return round(seconds / faca_sim.SECONDS_PER_IMAGE["matchPhotos"])
+
+
+def test_incremental_matching_needs_kept_keypoints():
+    for keep, expected in ((True, 2), (False, 6)):
+        chunk = faca_sim.Document().addChunk()
+        chunk.addPhotos([f"a/{i}.jpg" for i in range(4)])
+        chunk.matchPhotos(keep_keypoints=keep)
+        assert chunk.keypoints is keep
+        chunk.addPhotos(["b/0.jpg", "b/1.jpg"])
+        assert matchedCameraCount(chunk, keep_keypoints=True) == expected
+        assert chunk.keypoints is True
@@ -0,0 +1,69 @@
+import itertools
+import math
+
+import pytest
+
+import faca_sim
+from conftest import makeSurveys
+from faca_calc import FacaCalc
+
+np = pytest.importorskip("numpy")
+from faca_spatial import estimateSpacing, getCandidatePairs
+
+SURVEYS = ["s1", "s2", "s3"]
+
+
+def bruteForcePairs(positions, radius: float) -> set:
+    return {
+        (i, j)
+        for i, j in itertools.combinations(range(len(positions)), 2)
+        if math.dist(positions[i], positions[j]) <= radius
+    }
+
+
+@pytest.mark.parametrize("radius", [0.5, 3.0, 25.0])
+def test_candidate_pairs_match_brute_force(radius):
+    rng = np.random.default_rng(1)
+    positions = rng.uniform(-20, 20, (300, 2))
+    positions[10] = positions[11]  # same position
+    pairs = getCandidatePairs(positions, radius)
+    assert len(pairs) == len({tuple(p) for p in pairs.tolist()})
+    assert {tuple(p) for p in pairs.tolist()} == bruteForcePairs(positions, radius)
+
+
+def test_candidate_pairs_of_too_few_positions():
+    assert getCandidatePairs(np.zeros((1, 2)), 1.0).shape == (0, 2)
+
+
+def test_spacing_of_a_grid():
+    x, y = np.meshgrid(np.arange(10) * 30.0, np.arange(8) * 30.0)
+    assert estimateSpacing(np.column_stack([x.ravel(), y.ravel()])) == 30.0
+
+
+def test_spatial_pairs_within_and_across_surveys(settings):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS, imageCount=16)
+    f = FacaCalc(**dict(settings, preselection="spatial", preselection_radius=35))
+    chunk = faca_sim.Document().addChunk()
+    f.addImagesByChunkName(chunk, imagesDict)
+    cameras = chunk.cameras
+    cameras[7].reference.location = None
+    pairs = {tuple(sorted(p)) for p in f.getSpatialPairs(chunk)}
+
+    located = [c for c in cameras if c.reference.location is not None]
+    expected = {
+        tuple(sorted((located[i].key, located[j].key)))
+        for i, j in bruteForcePairs(
+            [tuple(c.reference.location)[:2] for c in located], 35
+        )
+    }
+    # the camera without position is paired with every other camera
+    expected |= {tuple(sorted((cameras[7].key, c.key))) for c in located}
+    assert pairs == expected
+    assert len(pairs) < len(cameras) * (len(cameras) - 1) // 2
+
+    # appending a survey only pairs its cameras
+    newPairs = f.getSpatialPairs(chunk, newGroup="s3")
+    newKeys = {c.key for c in cameras if c.group.label == "s3"}
+    assert {tuple(sorted(p)) for p in newPairs} == {
+        p for p in expected if newKeys & set(p)
+    }
@@ -0,0 +1,94 @@
+import json
+import os
+
+import pytest
+
+from conftest import makeSurveys
+from faca_calc import FacaCalc
+from faca_stages import StageManifest
+
+SURVEYS = ["s1", "s2", "s3"]
+OPERATIONS = ["addPhotos", "matchPhotos", "alignCameras", "buildDepthMaps"]
+
+
+def readStages(settings: dict) -> list[str]:
+    path = os.path.join(settings["output_dir"], settings["project_name"])
+    with open(path + ".stages.json") as f:
+        return json.load(f)["stages"]
+
+
+def test_manifest_survives_reload(tmp_path):
+    stages = StageManifest(str(tmp_path / "faca.psx"))
+    stages.setDone("imagesAdded")
+    stages.setDone("filtered")
+    stages.setNotDone(["filtered"])
+    reloaded = StageManifest(str(tmp_path / "faca.psx"))
+    reloaded.load()
+    assert reloaded.stages == ["imagesAdded"]
+    reloaded.reset()
+    assert StageManifest(str(tmp_path / "faca.psx")).isDone("imagesAdded") is False
+
+
+def test_full_run_records_every_stage(settings, recorder):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    recorder.record("buildDepthMaps")
+    assert FacaCalc(**settings).main(imagesDict)
+    assert readStages(settings) == [
+        "imagesAdded",
+        "accuracySet",
+        "matchedAndAligned",
+        "filtered",
+        "chunksCloned",
+        *[f"pointCloud:{s}" for s in SURVEYS],
+        *[f"exported:{s}" for s in SURVEYS],
+    ]
+    assert recorder.labels("buildDepthMaps") == SURVEYS
+    for survey in SURVEYS:
+        assert os.path.isfile(os.path.join(settings["output_dir"], survey + ".las"))
+
+
+def test_resume_skips_finished_stages(settings, recorder):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    assert FacaCalc(**settings).main(imagesDict)
+    for operation in OPERATIONS:
+        recorder.record(operation)
+    assert FacaCalc(**dict(settings, resume=True)).main(imagesDict)
+    assert recorder.calls == []
+
+
+def test_run_without_resume_starts_over(settings, recorder):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    assert FacaCalc(**settings).main(imagesDict)
+    recorder.record("matchPhotos")
+    assert FacaCalc(**settings).main(imagesDict)
+    assert recorder.labels("matchPhotos") == ["Original"]
+
+
+def test_crash_in_build_point_clouds_resumes_at_the_chunk(settings, recorder):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    recorder.record("buildPointCloud", fail=lambda label: label == "s2")
+    with pytest.raises(RuntimeError, match="simulated crash"):
+        FacaCalc(**settings).main(imagesDict)
+    stages = readStages(settings)
+    assert "pointCloud:s1" in stages
+    assert "pointCloud:s2" not in stages
+
+    recorder.monkeypatch.undo()
+    for operation in ("matchPhotos", "buildDepthMaps", "exportPointCloud"):
+        recorder.record(operation)
+    assert FacaCalc(**dict(settings, resume=True)).main(imagesDict)
+    assert recorder.labels("matchPhotos") == []
+    assert recorder.labels("buildDepthMaps") == ["s2", "s3"]
+    assert recorder.labels("exportPointCloud") == SURVEYS
+
+
+def test_parallel_stages_are_not_logged_as_skipped(settings):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    settings.update(parallel_chunks=2, export_workers=3)
+    logPath = os.path.join(settings["output_dir"], settings["project_name"] + ".log")
+    assert FacaCalc(**settings).main(imagesDict)
+    with open(logPath) as f:
+        assert "Skipped" not in f.read()
+    assert FacaCalc(**dict(settings, resume=True)).main(imagesDict)
+    with open(logPath) as f:
+        assert "Skipped exported:s3, already finished." in f.read()
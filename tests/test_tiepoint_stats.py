@@ -0,0 +1,67 @@
+import json
+import os
+
+import pytest
+
+import faca_sim
+from conftest import makeSurveys
+from faca_calc import FacaCalc
+
+np = pytest.importorskip("numpy")
+from faca_tiepoint_stats import CRITERIONS, TiePointStats
+
+SURVEYS = ["s1", "s2", "s3"]
+
+
+def makeAlignedChunk(settings: dict):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    chunk = faca_sim.Document().addChunk()
+    FacaCalc(**settings).addImagesByChunkName(chunk, imagesDict)
+    chunk.matchPhotos()
+    chunk.alignCameras()
+    return chunk
+
+
+def test_pass_statistics_match_the_filter_values(settings, tmp_path):
+    chunk = makeAlignedChunk(settings)
+    stats = TiePointStats(faca_sim, bins=10)
+    record = stats.addPass(chunk, "unfiltered")
+    assert record["tiePoints"] == len(chunk.tie_points.points)
+    for criterionStr in CRITERIONS:
+        filter = faca_sim.TiePoints.Filter()
+        filter.init(chunk, getattr(faca_sim.TiePoints.Filter, criterionStr))
+        values = np.asarray(filter.values)
+        summary = record["criterions"][criterionStr]
+        assert summary["count"] == values.size
+        assert summary["max"] == values.max()
+        assert summary["percentiles"]["50"] == pytest.approx(np.median(values))
+        assert stats.arrays[f"p1_{criterionStr}_hist"].sum() == values.size
+        assert len(stats.arrays[f"p1_{criterionStr}_edges"]) == 11
+
+    surveys = record["surveys"]
+    assert list(surveys) == SURVEYS
+    # every tie point is seen by one or more surveys
+    assert sum(s["tiePoints"] for s in surveys.values()) >= record["tiePoints"]
+    assert all(0 < s["tiePoints"] <= record["tiePoints"] for s in surveys.values())
+
+    stats.save(str(tmp_path / "stats"))
+    with open(tmp_path / "stats.json") as f:
+        assert json.load(f) == stats.passes
+    with np.load(tmp_path / "stats.npz") as arrays:
+        assert sorted(arrays.files) == sorted(stats.arrays)
+
+
+def test_run_writes_one_pass_per_filter_criterion(settings):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    assert FacaCalc(**dict(settings, tiepoint_stats=True)).main(imagesDict)
+    path = os.path.join(settings["output_dir"], "faca_tiepoint_stats.json")
+    with open(path) as f:
+        passes = json.load(f)
+    assert [p["name"] for p in passes] == [
+        "unfiltered",
+        "ImageCount 3",
+        "ReconstructionUncertainty 50",
+    ]
+    counts = [p["tiePoints"] for p in passes]
+    assert counts == sorted(counts, reverse=True)
+    assert passes[-1]["criterions"]["ReconstructionUncertainty"]["max"] <= 50
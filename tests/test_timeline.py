@@ -0,0 +1,66 @@
+import json
+import os
+
+import pytest
+
+from conftest import makeSurveys
+from faca_calc import FacaCalc
+from faca_log import Logger
+
+SURVEYS = ["s1", "s2", "s3"]
+
+
+def readTimeline(settings: dict) -> list[dict]:
+    path = os.path.join(settings["output_dir"], settings["project_name"])
+    with open(path + ".timeline.jsonl") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_stage_records_only_finished_blocks(tmp_path):
+    logger = Logger()
+    logger.setupLogger(str(tmp_path), "faca.psx")
+    with logger.stage("counted", counts=lambda: {"cameras": 3}) as record:
+        pass
+    with pytest.raises(RuntimeError):
+        with logger.stage("crashed"):
+            raise RuntimeError("crash")
+    logger.close()
+    with open(tmp_path / "faca.psx.timeline.jsonl") as f:
+        records = [json.loads(line) for line in f]
+    assert records == [record]
+    assert record["stage"] == "counted"
+    assert record["counts"] == {"cameras": 3}
+    assert record["seconds"] >= 0 and record["cpuSeconds"] >= 0
+
+
+def test_run_records_every_stage_with_counts(settings):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    f = FacaCalc(**settings)
+    assert f.main(imagesDict)
+    timeline = readTimeline(settings)
+    assert timeline[0]["event"] == "run"
+    stages = [r["stage"] for r in timeline if "stage" in r]
+    assert stages[:5] == [
+        "imageDiscovery",
+        "imagesAdded",
+        "accuracySet",
+        "matchedAndAligned",
+        "filtered",
+    ]
+    assert {f"exported:{s}" for s in SURVEYS} <= set(stages)
+    aligned = next(r for r in timeline if r.get("stage") == "matchedAndAligned")
+    assert aligned["counts"]["Original"]["cameras"] == 12
+    assert aligned["counts"]["Original"]["tiePoints"] > 0
+    assert set(f.stageTimes) >= set(stages) - {"imageDiscovery"}
+
+
+def test_resumed_run_appends_without_finished_stages(settings):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    assert FacaCalc(**settings).main(imagesDict)
+    before = readTimeline(settings)
+    assert FacaCalc(**dict(settings, resume=True)).main(imagesDict)
+    timeline = readTimeline(settings)
+    assert timeline[: len(before)] == before
+    added = [r.get("stage") for r in timeline[len(before) :] if "stage" in r]
+    assert "matchedAndAligned" not in added
+    assert not any(s.startswith("exported:") for s in added)
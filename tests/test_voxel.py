@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from faca_las import LasReader, writeLas
+from faca_voxel import VoxelDownsampler
+
+ORIGIN = np.array([500000.0, 5500000.0, 300.0])
+
+
+def voxelCount(xyz, voxelSize: float) -> int:
+    return len(np.unique(np.floor(xyz / voxelSize).astype(np.int64), axis=0))
+
+
+def writeTiles(directory, tiles) -> list[str]:
+    paths = []
+    for i, xyz in enumerate(tiles):
+        paths.append(os.path.join(directory, f"tile_{i}.las"))
+        writeLas(paths[-1], xyz)
+    return paths
+
+
+def test_keeps_one_point_per_voxel_across_chunks_and_tiles(tmp_path):
+    rng = np.random.default_rng(3)
+    xyz = np.round(ORIGIN + rng.uniform(0, [20, 20, 4], size=(5000, 3)), 3)
+    paths = writeTiles(tmp_path, [xyz[:2000], np.zeros((0, 3)), xyz[2000:]])
+    inputCount, outputCount = VoxelDownsampler(1.0, chunkSize=300).run(
+        paths, str(tmp_path / "out.las")
+    )
+    assert inputCount == 5000
+    assert outputCount == voxelCount(xyz, 1.0)
+    out = LasReader(str(tmp_path / "out.las"))
+    kept = np.concatenate([out.xyz(records) for records in out.chunks(1000)])
+    assert voxelCount(kept, 1.0) == outputCount
+
+
+def test_empty_tiles_do_not_widen_the_grid(tmp_path):
+    xyz = ORIGIN + np.array([[0, 0, 0], [99.99, 99.99, 0.5]])
+    downsampler = VoxelDownsampler(0.01)
+    headers = [LasReader(p).header for p in writeTiles(tmp_path, [xyz])]
+    gridShape = downsampler._getGrid(headers)[1]
+    paths = writeTiles(tmp_path, [xyz, np.zeros((0, 3))])
+    headers = [LasReader(p).header for p in paths]
+    assert list(downsampler._getGrid(headers)[1]) == list(gridShape)
+    assert downsampler.run(paths, str(tmp_path / "out.las")) == (2, 2)
+
+
+def test_only_empty_inputs(tmp_path):
+    paths = writeTiles(tmp_path, [np.zeros((0, 3))] * 2)
+    assert VoxelDownsampler(0.5).run(paths, str(tmp_path / "out.las")) == (0, 0)
+
+
+def test_runs_stay_few():
+    runs = []
+    for start in range(0, 1000, 10):
+        VoxelDownsampler._addRun(runs, np.arange(start, start + 10))
+    assert len(runs) <= 10
+    assert np.array_equal(np.sort(np.concatenate(runs)), np.arange(1000))
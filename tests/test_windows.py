@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from conftest import makeSurveys
+from faca_calc import FacaCalc
+
+np = pytest.importorskip("numpy")
+from faca_window import describeTransform, estimateHelmert, getWindows
+
+SURVEYS = ["s1", "s2", "s3", "s4", "s5"]
+
+
+def test_windowed_plan_covers_every_window(settings, monkeypatch):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS, imageCount=2)
+    settings.update(window_size=3, window_overlap=1)
+    f = FacaCalc(**settings)
+    plans = []
+    setPlan = f.progress.setPlan
+    monkeypatch.setattr(
+        f.progress, "setPlan", lambda plan: plans.append(plan) or setPlan(plan)
+    )
+    assert f.main(imagesDict)
+    # windows s1-s3 and s3-s5 with 6 images each, then every survey
+    assert plans[0][:2] == [("matchPhotos", 6), ("alignCameras", 6)]
+    assert [p for p in plans[0] if p[0] == "matchPhotos"] == [("matchPhotos", 6)] * 2
+    assert plans[0][-5:] == [("exportPointCloud", 2)] * 5
+    assert f.progress.plan == []
+
+
+def test_parallel_windows_are_not_logged_as_skipped(settings):
+    imagesDict = makeSurveys(settings["input_image_dir"], SURVEYS)
+    settings.update(window_size=3, window_overlap=1, window_workers=2)
+    assert FacaCalc(**settings).main(imagesDict)
+    logPath = os.path.join(settings["output_dir"], settings["project_name"] + ".log")
+    with open(logPath) as f:
+        log = f.read()
+    assert "Window 2 matched and aligned." in log
+    assert "Skipped" not in log
+
+
+def test_windows_share_the_overlap():
+    assert getWindows(SURVEYS, 3, 1) == [["s1", "s2", "s3"], ["s3", "s4", "s5"]]
+    assert getWindows(SURVEYS, 2, 1) == [
+        ["s1", "s2"],
+        ["s2", "s3"],
+        ["s3", "s4"],
+        ["s4", "s5"],
+    ]
+    assert getWindows(SURVEYS, 4, 2) == [SURVEYS[:4], SURVEYS[2:]]
+    assert getWindows(SURVEYS, 6, 1) == [SURVEYS]
+
+
+def test_helmert_recovers_a_known_transform():
+    rng = np.random.default_rng(3)
+    source = rng.uniform(-100, 100, (20, 3))
+    axis = np.array([1.0, 2.0, 3.0]) / np.sqrt(14)
+    angle = np.radians(2.0)
+    k = np.array(
+        [[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]]
+    )
+    rotation = np.eye(3) + np.sin(angle) * k + (1 - np.cos(angle)) * k @ k
+    known = np.eye(4)
+    known[:3, :3] = 1.001 * rotation
+    known[:3, 3] = [0.5, -1.2, 0.3]
+    target = source @ known[:3, :3].T + known[:3, 3]
+
+    matrix, residuals = estimateHelmert(source, target)
+    assert np.allclose(matrix, known, atol=1e-9)
+    assert residuals.max() < 1e-9
+    description = describeTransform(matrix, source)
+    assert description["scale"] == pytest.approx(1.001)
+    assert description["rotation"] == pytest.approx(2.0)
+
+    noisy = target + rng.normal(0, 0.01, target.shape)
+    matrix, residuals = estimateHelmert(source, noisy)
+    assert np.allclose(matrix[:3, 3], known[:3, 3], atol=0.05)
+    assert residuals.max() < 0.05
+
+
+def test_helmert_of_collinear_points_is_a_translation():
+    source = np.column_stack([np.arange(10.0), np.zeros(10), np.zeros(10)])
+    matrix, residuals = estimateHelmert(source, source + [1.0, 2.0, 0.5])
+    assert np.allclose(matrix[:3, :3], np.eye(3))
+    assert np.allclose(matrix[:3, 3], [1.0, 2.0, 0.5])
+    assert residuals.max() < 1e-12